@@ -0,0 +1,51 @@
+"""
+Float32 vs float64 pattern generation.
+
+Large grid, many reflections (small cubic cell, wide 2θ range).
+Reports wall time per pattern and the worst deviation of the float32
+path relative to the strongest peak.
+
+    python benchmarks/bench_precision.py
+"""
+import time
+
+import numpy as np
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+
+
+def bench(model, x, repeat=5):
+    model.pattern(x)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        y = model.pattern(x)
+    return (time.perf_counter() - t0) / repeat, y
+
+
+def main():
+    x = np.linspace(5, 90, 200_000)
+
+    for U, W in [(0.01, 0.01), (0.001, 0.0004)]:
+        model = PhaseModel(lattice=CubicLattice(a=5.43))
+        model.params.update({"U": U, "W": W})
+
+        n_refl = len(model.lattice.generate_hkl_list(model.wavelength)[0])
+
+        model.precision = "float64"
+        t64, y64 = bench(model, x)
+
+        model.precision = "float32"
+        t32, y32 = bench(model, x)
+
+        peak_max = np.max(y64 - model.params["bkg_intercept"])
+        err = np.max(np.abs(y32 - y64)) / peak_max
+
+        print(f"U={U:<6} W={W:<6} N={x.size} reflections~{n_refl}")
+        print(f"  float64: {t64 * 1e3:8.1f} ms")
+        print(f"  float32: {t32 * 1e3:8.1f} ms  (x{t64 / t32:.2f})")
+        print(f"  max |y32 - y64| / peak max: {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
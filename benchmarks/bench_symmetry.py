@@ -0,0 +1,51 @@
+"""
+Structure factors from the asymmetric unit vs the expanded P1 cell.
+
+NaCl (special positions only) and a general-position site in Fm-3m,
+for the reflections of a wide 2θ range. The symmetric evaluation
+should never be slower than the expanded cell.
+
+    python benchmarks/bench_symmetry.py
+"""
+import time
+
+import numpy as np
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.structure import Atom, CrystalStructure
+
+
+def bench(structure, hkls, s, repeat=50):
+    structure.structure_factors(hkls, s, 1.5406)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        structure.structure_factors(hkls, s, 1.5406)
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    lattice = CubicLattice(a=5.64)
+    cases = {
+        "NaCl (4a + 4b)": [Atom("Na", 0, 0, 0), Atom("Cl", 0.5, 0.5, 0.5)],
+        "general (192l)": [Atom("O", 0.13, 0.27, 0.41)],
+    }
+
+    r = np.arange(-12, 13)
+    hkls = np.stack(np.meshgrid(r, r, r, indexing="ij"), -1).reshape(-1, 3)
+    hkls = hkls[np.any(hkls != 0, axis=1)][:1727]
+    s = np.linalg.norm(hkls, axis=1) / (2 * lattice.a)
+
+    for name, atoms in cases.items():
+        structure = CrystalStructure(lattice, atoms, space_group="Fm-3m")
+        full = structure.expanded()
+
+        t_sym = bench(structure, hkls, s)
+        t_p1 = bench(full, hkls, s)
+
+        print(f"{name}: {len(structure)} sites, {len(full)} atoms, {len(hkls)} reflections")
+        print(f"  symmetry: {t_sym * 1e3:8.2f} ms")
+        print(f"  expanded: {t_p1 * 1e3:8.2f} ms  (x{t_p1 / t_sym:.2f})")
+
+
+if __name__ == "__main__":
+    main()
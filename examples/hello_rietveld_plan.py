@@ -0,0 +1,47 @@
+import powerxrd as xrd
+import powerxrd.refine as rr
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.strategy import RefinementPlan, RefinementStage
+
+# ----------------------------
+# 1️⃣ Model + data
+# ----------------------------
+
+model = PhaseModel(lattice=CubicLattice(a=4.0))
+
+x_exp, y_exp = rr.load_data()
+
+model.params.update({
+    "U": 0.005,
+    "W": 0.005,
+    "scale": 1000.0,
+    "bkg_slope": 0.0,
+    "bkg_intercept": 0.0
+})
+
+# ----------------------------
+# 2️⃣ Plan (same passes as hello_rietveld_long.py)
+# ----------------------------
+
+plan = RefinementPlan([
+    RefinementStage(['scale']),
+    RefinementStage(['bkg_intercept', 'bkg_slope']),
+    RefinementStage(['a'], repeat=2, repeat_tol=0.05),
+    RefinementStage(['U', 'W'], skip_if_rwp_below=1.0),
+    RefinementStage(['scale', 'a', 'U', 'W', 'bkg_intercept', 'bkg_slope'], max_nfev=200),
+], stall_tol=0.01, patience=2)
+
+plan.to_json('my_rietveld_plan.json')
+
+# ----------------------------
+# 3️⃣ Run
+# ----------------------------
+
+rw = xrd.RefinementWorkflow(model, x_exp, y_exp)
+
+for record in rw.run_plan(plan):
+    print(record)
+
+rw.plot_fit()
+rw.save_log('my_rietveld_stages.json')
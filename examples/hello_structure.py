@@ -1,26 +1,24 @@
+import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib.pyplot as plt 
 
 from powerxrd.lattice import CubicLattice
-from powerxrd.structure import Atom, CrystalStructure
 from powerxrd.model import PhaseModel
-
+from powerxrd.structure import Atom, CrystalStructure
 
 # -----------------------------
 # Define structure
 # -----------------------------
 
-# Atomic positions for Perovskite
+# Asymmetric unit of cubic perovskite SrTiO3 (Pm-3m);
+# the O at (1/2, 1/2, 0) generates all three O sites
 atoms = [
     Atom("Sr", 0.0, 0.0, 0.0),
     Atom("Ti", 0.5, 0.5, 0.5),
     Atom("O", 0.5, 0.5, 0.0),
-    Atom("O", 0.5, 0.0, 0.5),
-    Atom("O", 0.0, 0.5, 0.5),
 ]
 
 lattice = CubicLattice(a=3.9)
-structure = CrystalStructure(lattice, atoms)
+structure = CrystalStructure(lattice, atoms, space_group="Pm-3m")
 
 model = PhaseModel(lattice=lattice, structure=structure)
 
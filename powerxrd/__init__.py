@@ -1,4 +1,4 @@
 from .chart import Chart
 from .data import Data
-from .utilities import braggs, funcgauss, scherrer
+from .utilities import braggs, emission_twotheta, funcgauss, scherrer
 from .workflow import RefinementWorkflow
@@ -0,0 +1,321 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas
+
+from . import kernels
+from .chart import Chart
+from .data import Data
+from .lattice import create_lattice
+from .model import PhaseModel
+from .sharedstore import DatasetHandle, attach
+from .strategy import RefinementPlan
+from .workflow import RefinementWorkflow
+
+SCAN_EXTENSIONS = (".xy", ".csv")
+
+
+# ---------------------------------
+# Inputs and recipes
+# ---------------------------------
+def find_scans(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of .xy/.csv
+    scan files (duplicates removed).
+    """
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            candidates = glob.glob(item)
+        paths.update(p for p in candidates
+                     if os.path.isfile(p) and os.path.splitext(p)[1].lower() in SCAN_EXTENSIONS)
+
+    return sorted(paths)
+
+
+def load_recipe(source):
+    """
+    Load a batch recipe from a dict, JSON string or JSON file.
+
+    Two kinds of recipe are understood:
+
+        refinement: {"model": {...}, "plan": {...}, "preprocess": {...}}
+                    A bare RefinementPlan dict (with "stages") is also
+                    accepted and refines the default cubic model.
+        chart:      {"chart": {"backsub": {...}, "mav": {...},
+                               "allpeaks": {...}, "size_strain": {...}}}
+
+    "model" may hold "lattice" (registry name, default "cubic"),
+    "lattice_params", "wavelength" and "params". "preprocess" holds
+    Chart steps (backsub, mav) applied before refinement.
+    """
+    if isinstance(source, dict):
+        recipe = dict(source)
+    elif isinstance(source, str) and not os.path.isfile(source) and source.lstrip().startswith("{"):
+        recipe = json.loads(source)
+    else:
+        with open(source) as f:
+            recipe = json.load(f)
+
+    if "stages" in recipe:
+        recipe = {"plan": recipe}
+
+    if "plan" not in recipe and "chart" not in recipe:
+        raise ValueError("Recipe needs a refinement 'plan' or a 'chart' section.")
+
+    return recipe
+
+
+def build_model(spec):
+    spec = spec or {}
+
+    lattice = create_lattice(spec.get("lattice", "cubic"),
+                             **spec.get("lattice_params", {"a": 4.0}))
+    model = PhaseModel(lattice=lattice, wavelength=spec.get("wavelength", 1.5406))
+    model.params.update(spec.get("params", {}))
+    return model
+
+
+def recipe_setup(recipe):
+    """
+    The parts of a recipe that build the model and data, which a plan
+    checkpoint must have been written for (see RefinementWorkflow.setup_hash).
+    """
+    return {"model": recipe.get("model"), "preprocess": recipe.get("preprocess")}
+
+
+def preprocess(chart, steps):
+    """
+    Apply a recipe's "preprocess" steps to `chart` in place, in recipe
+    order, and return it. Only backsub and mav (which change the data)
+    are accepted, e.g. {"backsub": {"tol": 1.0}, "mav": {"n": 3}}.
+    """
+    for name, kwargs in (steps or {}).items():
+        if name not in ("backsub", "mav"):
+            raise ValueError(f"Unknown preprocessing step: {name}")
+        getattr(chart, name)(inplace=True, **(kwargs or {}))
+    return chart
+
+
+# ---------------------------------
+# One scan
+# ---------------------------------
+def process_file(path, recipe, checkpoint_dir=None):
+    """
+    Run a recipe on one scan and return a flat summary row.
+
+    `path` is a scan file or a DatasetHandle of a SharedDatasetStore; a
+    handle is mapped without copying and reported under its key.
+
+    Never raises: failures are reported in the "status" and "error"
+    columns so one bad file does not stop a batch. Nothing is plotted
+    or printed (sys.stdout is left alone, so threads can share it).
+
+    With `checkpoint_dir`, refinements checkpoint after every stage and a
+    restarted worker continues the plan from the last finished stage.
+    """
+    is_handle = isinstance(path, DatasetHandle)
+    name = path.key if is_handle else os.path.abspath(path)
+    row = {"file": name, "status": "ok", "error": ""}
+
+    try:
+        x, y = attach(path) if is_handle else Data(path).importfile()
+        chart = Chart(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+        if "plan" in recipe:
+            row.update(_run_refinement(chart, recipe, _checkpoint_path(name, checkpoint_dir)))
+        else:
+            row.update(_run_chart(chart, recipe["chart"]))
+
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = f"{type(e).__name__}: {e}"
+
+    return row
+
+
+def _checkpoint_path(path, checkpoint_dir):
+    if checkpoint_dir is None:
+        return None
+    # Same file name in different directories must not collide
+    tag = hashlib.sha1(path.encode()).hexdigest()[:12]
+    return os.path.join(checkpoint_dir, f"{os.path.basename(path)}.{tag}.npz")
+
+
+def _run_refinement(chart, recipe, checkpoint=None):
+    preprocess(chart, recipe.get("preprocess"))
+
+    model = build_model(recipe.get("model"))
+    rw = RefinementWorkflow(model, chart.x, chart.y, setup=recipe_setup(recipe))
+    records = rw.run_plan(RefinementPlan.from_dict(recipe["plan"]), print_stage=False,
+                          checkpoint=checkpoint)
+
+    out = {"Rwp": rw.rwp(), "stage_runs": sum(not r["skipped"] for r in records)}
+    out.update({k: float(v) for k, v in model.param_dict().items()})
+    out.update({f"esd_{k}": v for k, v in model.esd_dict().items()})
+    return out
+
+
+def _run_chart(chart, steps):
+    steps = dict(steps)
+    preprocess(chart, {k: steps.pop(k) for k in ("backsub", "mav") if k in steps})
+
+    out = {}
+    if "allpeaks" in steps or "size_strain" in steps:
+        peaks = chart.allpeaks(**{**(steps.get("allpeaks") or {}), "show": False, "quiet": True})
+        out["n_peaks"] = len(peaks)
+
+        if "size_strain" in steps:
+            res = chart.size_strain(peaks, **(steps.get("size_strain") or {}))
+            out.update({k: v[0] for k, v in res.to_dict().items() if k != "method"})
+
+    return out
+
+
+# ---------------------------------
+# Batch driver
+# ---------------------------------
+def journal_path(output):
+    return output + ".jsonl"
+
+
+def completed_files(output):
+    """
+    Files already processed successfully according to the progress
+    journal of `output`; failed files are retried.
+    """
+    path = journal_path(output)
+    if not os.path.exists(path):
+        return set()
+
+    done = set()
+    with open(path) as f:
+        for line in f:
+            # A run killed mid-write can leave a truncated last line
+            with contextlib.suppress(json.JSONDecodeError):
+                row = json.loads(line)
+                if row.get("status") == "ok":
+                    done.add(row["file"])
+    return done
+
+
+def write_summary(output):
+    """
+    Write the journal of `output` as one table: Parquet when `output`
+    ends in .parquet (needs pyarrow or fastparquet), CSV otherwise.
+    """
+    rows = []
+    with open(journal_path(output)) as f:
+        for line in f:
+            with contextlib.suppress(json.JSONDecodeError):
+                rows.append(json.loads(line))
+
+    df = pandas.DataFrame(rows)
+    if len(df):
+        # A retried file keeps only its latest row
+        df = df.drop_duplicates("file", keep="last").sort_values("file", kind="stable")
+
+    if output.endswith(".parquet"):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+    return df
+
+
+def run_batch(inputs, recipe, output="powerxrd_summary.csv", workers=1, resume=True,
+              progress=None):
+    """
+    Run a recipe over many scans.
+
+    Each finished scan is appended to a JSON-lines journal next to the
+    output (`<output>.jsonl`) as soon as it completes, so an interrupted
+    run restarted with resume=True only processes the remaining and the
+    failed files. The summary table is (re)written from the journal at
+    the end. Refinements also checkpoint per stage under `<output>.ckpt/`,
+    so a scan interrupted mid-plan restarts from its last finished stage;
+    a checkpoint is deleted once its scan's result is journaled.
+
+    Parameters
+    ----------
+    inputs : str, DatasetHandle or list of them
+        Directories and/or glob patterns of .xy/.csv files, and/or
+        handles of scans already in a SharedDatasetStore (workers map
+        those instead of receiving pickled arrays).
+    recipe : dict or str
+        See load_recipe.
+    output : str
+        Summary path (.csv or .parquet).
+    workers : int
+        Worker processes (1 = run in this process).
+    resume : bool
+        Skip files already processed successfully; False starts a fresh
+        journal.
+    progress : callable, optional
+        Called with each summary row as it completes.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The full summary, including rows from earlier runs.
+    """
+    recipe = load_recipe(recipe)
+
+    if isinstance(inputs, (str, DatasetHandle)):
+        inputs = [inputs]
+    handles = [i for i in inputs if isinstance(i, DatasetHandle)]
+    patterns = [i for i in inputs if not isinstance(i, DatasetHandle)]
+
+    # The summary itself may live in a scanned directory
+    outputs = {os.path.abspath(output), os.path.abspath(journal_path(output))}
+    files = [f for f in find_scans(patterns) if os.path.abspath(f) not in outputs]
+
+    checkpoint_dir = output + ".ckpt" if "plan" in recipe else None
+
+    if not resume:
+        if os.path.exists(journal_path(output)):
+            os.remove(journal_path(output))
+        if checkpoint_dir is not None:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    done = completed_files(output)
+    todo = [f for f in files if os.path.abspath(f) not in done] + \
+        [h for h in handles if h.key not in done]
+
+    with open(journal_path(output), "a") as journal:
+
+        def record(row):
+            journal.write(json.dumps(row, default=float) + "\n")
+            journal.flush()
+            if row["status"] == "ok" and checkpoint_dir is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(_checkpoint_path(row["file"], checkpoint_dir))
+            if progress is not None:
+                progress(row)
+
+        if workers <= 1:
+            for path in todo:
+                record(process_file(path, recipe, checkpoint_dir))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=kernels.pool_context()) as pool:
+                futures = [pool.submit(process_file, path, recipe, checkpoint_dir) for path in todo]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    if checkpoint_dir is not None:
+        with contextlib.suppress(OSError):
+            os.rmdir(checkpoint_dir)   # only when no scan is left to resume
+
+    return write_summary(output)
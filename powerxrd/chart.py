@@ -2,12 +2,14 @@ import matplotlib.pyplot as plt
 import numpy as np
 import scipy.optimize as optimize
 
-from .utilities import funcgauss, scherrer
+from .grid import Grid
+from .sizestrain import size_strain
+from .utilities import emission_twotheta, funcgauss, scherrer
 
 
 class Chart:
 
-    def __init__(self,x,y):
+    def __init__(self,x,y,K=0.9,lambdaKa=0.15406,lambdaKi=0.139):
         '''
         Chart structure. Constructs x-y XRD data to manipulate and analyze. 
 
@@ -26,11 +28,23 @@ class Chart:
         '''
         self.x          = x          # x values
         self.y          = y          # y values
-        self.K          = 0.9       
-        self.lambdaKa   = 0.15406
-        self.lambdaKi   = 0.139
+        self.K          = K
+        self.lambdaKa   = lambdaKa
+        self.lambdaKi   = lambdaKi
         self.background_points = None  # New attribute to store background points
 
+    def _like(self, x, y):
+        '''New Chart on x-y data with the same shape factor and wavelengths'''
+        return Chart(x, y, self.K, self.lambdaKa, self.lambdaKi)
+
+    @property
+    def grid(self):
+        '''Grid view of x (uniformity, step, index lookup), rebuilt when x is replaced'''
+        if getattr(self, '_grid_src', None) is not self.x:
+            self._grid = Grid(self.x)
+            self._grid_src = self.x
+        return self._grid
+
     def set_background_points(self, background_points):
         self.background_points = background_points
 
@@ -43,28 +57,29 @@ class Chart:
             self.y -= interpolated_bg  # Subtract the interpolated background from the y data
 
 
-    def local_max(self,xrange=[12,13]):
+    def local_max(self,xrange=[12,13], verbose=True):
         '''Maximum finder in specified xrange
 
         Parameters
         ----------
         xrange_Ka : [](float)
             range of x to find globalmax
+        verbose: bool
+            print the maximum found
         '''
 
-        i_l = self.x.searchsorted(xrange[0], 'left')
-        i_r = self.x.searchsorted(xrange[1], 'right')
-
         'segments of x-y data within specified xrange'
-        xseg = self.x[i_l:i_r]
-        yseg = self.y[i_l:i_r]
+        seg = self.grid.select(xrange[0], xrange[1])
+        xseg = self.grid.x[seg]
+        yseg = np.asarray(self.y)[seg]
         
         'find maximum y value within specified range and corresponding x loc.'
         imax = np.argmax(yseg)
         max_x = xseg[imax]
         max_y = yseg[imax]
 
-        print(f'local_max -- max x: {max_x} max y: {max_y}')
+        if verbose:
+            print(f'local_max -- max x: {max_x} max y: {max_y}')
         return max_x, max_y
 
     def emission_lines(self, xrange_Ka=[10,20], show = True):
@@ -78,11 +93,8 @@ class Chart:
         xrange_Ka : [](float)
             range of x-axis (2-theta) for K_alpha radiation
         '''
-        twothet_Ka_deg, int_Ka = Chart(self.x, self.y).local_max(xrange=xrange_Ka)
-        twothet_Ka=twothet_Ka_deg*np.pi/180
-
-        twothet_Ki = 2*np.arcsin((self.lambdaKi/self.lambdaKa)*np.sin(twothet_Ka/2))
-        twothet_Ki_deg = twothet_Ki*180/np.pi
+        twothet_Ka_deg, int_Ka = self._like(self.x, self.y).local_max(xrange=xrange_Ka)
+        twothet_Ki_deg = float(emission_twotheta(twothet_Ka_deg, self.lambdaKa, self.lambdaKi))
 
         # return twothet_Ka_deg, int_Ka, twothet_Ki_deg
 
@@ -97,6 +109,27 @@ class Chart:
             return twothet_Ki_deg
 
 
+    def emission_lines_batch(self, twothetas, lambdas=None):
+        '''Positions of other emission lines for many K-alpha peaks at once
+
+        Parameters
+        ----------
+        twothetas : [](float)
+            2-theta (deg) of K-alpha peaks, e.g. the first column of allpeaks
+        lambdas : [](float)
+            wavelengths of the other lines, in the units of lambdaKa (default [lambdaKi])
+
+        Returns
+        -------
+        np.array(float)
+            (n_peaks, n_lines) 2-theta positions; NaN where a line cannot diffract
+        '''
+        if lambdas is None:
+            lambdas = [self.lambdaKi]
+        return emission_twotheta(np.asarray(twothetas, dtype=float)[:, None],
+                                 self.lambdaKa, np.asarray(lambdas, dtype=float)[None, :])
+
+
     def gaussfit(self, verbose=True):
         '''Fit of a Gaussian curve ("bell curve") to raw x-y data'''
         meanest = self.x[list(self.y).index(max(self.y))]
@@ -128,14 +161,12 @@ class Chart:
         # print('\nSchPeak: Scherrer width calc. for peak in range of [{},{}]'.format(*xrange))
 
         'xseg and yseg:x and y segments of data in selected xrange'
-        xseg,yseg = [],[]
-        for n, j in zip(self.x,self.y):
-            if n >= xrange[0] and n <= xrange[1]:
-                xseg.append(n)
-                yseg.append(j) 
+        seg = self.grid.select(xrange[0], xrange[1])
+        xseg = self.grid.x[seg]
+        yseg = np.asarray(self.y)[seg]
 
         
-        y0,a,mean,sigma = Chart(xseg,yseg).gaussfit(verbose)
+        y0,a,mean,sigma = self._like(xseg,yseg).gaussfit(verbose)
         ysegfit = funcgauss(np.array(xseg),y0,a,mean,sigma)
 
         'FULL WIDTH AT HALF MAXIMUM'
@@ -187,24 +218,24 @@ class Chart:
 
 
 
-    def allpeaks_recur(self,left=0, right=1, tols_=(2e5,0.8),schpeaks=[],verbose = False, show = True):
+    def allpeaks_recur(self,left=0, right=1, tols_=(2e5,0.8),schpeaks=[],verbose = False, show = True, quiet = False):
         '''recursion component function for main allpeaks function below'''
         # print('left right',left,right)
-        max_x, max_y = Chart(self.x, self.y).local_max(xrange=[left,right])
+        max_x, max_y = self._like(self.x, self.y).local_max(xrange=[left,right], verbose=not quiet)
         maxpeak_height, peaktrough_d = tols_ 
         peak_max = max_y     
 
         if peak_max > maxpeak_height:
             xrange = [ max_x - peaktrough_d, max_x + peaktrough_d ]
-            Sch_x, Sch_y, Sch, l,r = Chart(self.x, self.y).\
-                        SchPeak(xrange,verbose,show)
-            schpeaks.append([Sch_x,Sch_y,Sch])
+            peak = self._like(self.x, self.y)
+            Sch_x, Sch_y, Sch, l,r = peak.SchPeak(xrange,verbose,show)
+            schpeaks.append([Sch_x,Sch_y,Sch,peak.FWHM_deg])
 
-            Chart(self.x, self.y).allpeaks_recur(left, l,tols_,schpeaks,verbose,show)
-            Chart(self.x, self.y).allpeaks_recur(r, right,tols_,schpeaks,verbose,show)
+            self._like(self.x, self.y).allpeaks_recur(left, l,tols_,schpeaks,verbose,show,quiet)
+            self._like(self.x, self.y).allpeaks_recur(r, right,tols_,schpeaks,verbose,show,quiet)
 
 
-    def allpeaks(self, tols=(0.2,0.8), verbose=False, show = True):
+    def allpeaks(self, tols=(0.2,0.8), verbose=False, show = True, quiet = False):
         '''Driver code for allpeaks recursion : Automated Scherrer width calculation of all peaks
         
         Parameters
@@ -215,40 +246,77 @@ class Chart:
             tol[1]: Average distance from peak (top) to trough (bottom) of all peak (default=0.8)
         show: bool
             show plot of XRD chart
+        quiet: bool
+            print nothing (overrides verbose), e.g. in batch workers
+
+        Returns
+        -------
+        np.array(float)
+            (n_peaks, 4) rows of [2-theta, intensity, Sch width, FWHM (deg)], sorted by 2-theta
         '''
-        print('\n-------------------------------------------\nALLPEAKS: '+\
-            'Automated Scherrer width calculations with a recursive search of local maxima\n')
+        verbose = verbose and not quiet
+        if not quiet:
+            print('\n-------------------------------------------\nALLPEAKS: '+\
+                'Automated Scherrer width calculations with a recursive search of local maxima\n')
 
         #init xrange [left, right]
         left = min(self.x)
         right = max(self.x)
         schpeaks_ = []
 
-        max_x, max_y = Chart(self.x, self.y).local_max(xrange=[left,right])
-        print('\n')
+        max_x, max_y = self._like(self.x, self.y).local_max(xrange=[left,right], verbose=not quiet)
+        if not quiet:
+            print('\n')
         maxpeak_height = max_y*tols[0]
         peaktrough_d = tols[1]
 
         tols_ = (maxpeak_height, peaktrough_d)
-        Chart(self.x, self.y).allpeaks_recur(left, right, tols_, schpeaks_,verbose,show)
+        self._like(self.x, self.y).allpeaks_recur(left, right, tols_, schpeaks_,verbose,show,quiet)
 
 
-        print('\nSUMMARY (.csv format):')
-        print('2-theta / deg, \t Intensity, \t Sch width / nm')
+        sortidcs = np.argsort(np.array(schpeaks_).T[0])
+        if not quiet:
+            print('\nSUMMARY (.csv format):')
+            print('2-theta / deg, \t Intensity, \t Sch width / nm')
 
-        # for i in schpeaks_:
-        #     print('2-theta: {} deg - Sch width: {} nm'.format(*i))
+            # for i in schpeaks_:
+            #     print('2-theta: {} deg - Sch width: {} nm'.format(*i))
 
-        sortidcs = np.argsort(np.array(schpeaks_).T[0])
-        # print(sortidcs)
-        for i in sortidcs:
-            print('{}, \t  {}, \t  {} '.format(*schpeaks_[i]))
+            # print(sortidcs)
+            for i in sortidcs:
+                print('{}, \t  {}, \t  {} '.format(*schpeaks_[i]))
+
+        return np.array(schpeaks_, dtype=float).reshape(-1, 4)[sortidcs]
+
+
+    def size_strain(self, peaks, standard=None, method='wh', correction='quadratic'):
+        '''Crystallite size and microstrain from all peaks at once (Williamson-Hall or size-strain plot)
+
+        Parameters
+        ----------
+        peaks : np.array(float)
+            output of allpeaks, or any (n_peaks, >=4) array with 2-theta in column 0 and FWHM (deg) in column 3
+        standard : float, (U, V, W) or (twotheta_std, fwhm_std)
+            instrumental broadening from a line-width standard (default None: no correction)
+        method : str
+            'wh' (Williamson-Hall) or 'ssp' (size-strain plot)
+        correction : str
+            'quadratic' (Gaussian) or 'linear' (Lorentzian) instrumental correction
+
+        Returns
+        -------
+        SizeStrainResult
+            size in nm (units of lambdaKa) and strain, without printing
+        '''
+        peaks = np.asarray(peaks, dtype=float)
+        return size_strain(peaks[:, 0], peaks[:, 3], wavelength=self.lambdaKa, K=self.K,
+                           standard=standard, correction=correction, method=method)
 
 
     def XRD_int_ratio(self,xR1=[8.88,9.6],xR2=[10.81,11.52]):
         '''Calculate relative peak intensity (i.e. comparing one peak to another)'''
         # 'XRD b/t two intensities ratio'
-        return Chart(self.x, self.y).local_max(xR2)[1]/Chart(self.x, self.y).local_max(xR1)[1]
+        return self._like(self.x, self.y).local_max(xR2)[1]/self._like(self.x, self.y).local_max(xR1)[1]
 
 
     def mav(self, n=1, inplace=False, show=False, return_x=True):
@@ -280,8 +348,9 @@ class Chart:
         kernel = np.ones(n) / n
         newy = np.convolve(self.y, kernel, mode='valid')
 
-        # Match x length (drop n//2 points from start and end)
-        newx = self.x[:len(newy)]  # Simplified assumption: evenly spaced
+        # Each smoothed point sits at the mean x of its window
+        # (the window center on uniform grids, correct on variable-step grids too)
+        newx = np.convolve(self.grid.x, kernel, mode='valid')
 
         if show:
             plt.plot(newx, newy)
@@ -323,17 +392,30 @@ class Chart:
             (self.x, backsub_y) if inplace is False, otherwise returns self.
         """
 
-        L=len(self.y)
+        y = np.asarray(self.y, dtype=float)
+        L=len(y)
         # Approximate half-width in index space (reverse-sorted check)
         lmda = int(0.50*L/(self.x[0]-self.x[L-1]))         
 
+        'partner point of each point: 0.5 deg away (lmda points on a uniform grid)'
+        i = np.arange(L)
+        j = (i+lmda)%L
+        grid = self.grid
+        if grid.is_sorted and not grid.is_uniform:
+            target = grid.x + 0.5*np.sign(lmda)*grid.sign
+            inside = (target >= grid.x.min()) & (target <= grid.x.max())
+            j = np.where(inside, np.minimum(grid.nearest(target), L-1), j)
+
+        'tolerance tol: keep the rise above the partner, zero otherwise'
+        rise = y[j] > tol*y
+        write = rise | (y[j] < y)
+        value = np.where(rise, y[j] - y, 0.0)
+
+        'later points win when several share a partner (non-uniform grids)'
+        src = np.flatnonzero(write)[::-1]
+        targets, first = np.unique(j[src], return_index=True)
         backsub_y=np.zeros(L)
-        for i in range(L):
-            if self.y[(i+lmda)%L] > tol*self.y[i]:          #tolerance 'tol'
-                backsub_y[(i+lmda)%L] = self.y[(i+lmda)%L] - self.y[i]
-            else:
-                if self.y[(i+lmda)%L] < self.y[i]:
-                    backsub_y[(i+lmda)%L] = 0
+        backsub_y[targets] = value[src[first]]
         
         if show:
             plt.plot(self.x,self.y)
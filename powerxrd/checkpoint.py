@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class Checkpoint:
+    """
+    Snapshot of a refinement: model parameters and ESDs, the last solver
+    solution, and the workflow position/statistics needed to resume.
+
+    Stored as one compressed .npz file: numeric values as float64 arrays
+    and everything else (names, stage index, records, history) as a JSON
+    metadata blob. Writes are atomic: the file is written next to its
+    destination and moved into place with os.replace, so a crash leaves
+    either the previous checkpoint or the new one, never a partial file.
+
+    Example:
+
+        ckpt = Checkpoint.from_model(model, state={"stage": 2})
+        ckpt.save("run.ckpt.npz")
+        Checkpoint.load("run.ckpt.npz").apply(model)
+    """
+    params: dict
+    esd: dict = field(default_factory=dict)
+    state: dict = field(default_factory=dict)
+    solver: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_model(cls, model, state=None, result=None):
+        """
+        Capture `model` and, optionally, the last least_squares result
+        (solution vector, cost, evaluations and covariance).
+        """
+        solver = {}
+        if result is not None:
+            solver = {
+                "x": np.asarray(result.x, dtype=float),
+                "cost": float(result.cost),
+                "nfev": int(result.nfev),
+                "status": int(result.status),
+            }
+            if getattr(result, "covariance", None) is not None:
+                solver["covariance"] = np.asarray(result.covariance, dtype=float)
+
+        return cls(
+            params={k: float(v) for k, v in model.param_dict().items()},
+            esd={k: float(v) for k, v in model.esd.items()},
+            state=dict(state or {}),
+            solver=solver,
+        )
+
+    def apply(self, model):
+        """
+        Restore parameter values and ESDs into `model`.
+        """
+        for key, value in self.params.items():
+            model.set_param(key, value)
+        model.esd = dict(self.esd)
+        model.invalidate_cache()
+
+    # ---------------------------------
+    # Serialization
+    # ---------------------------------
+    def save(self, path):
+        solver_arrays = {k: v for k, v in self.solver.items() if isinstance(v, np.ndarray)}
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "param_names": list(self.params),
+            "esd_names": list(self.esd),
+            "state": self.state,
+            "solver": {k: v for k, v in self.solver.items() if k not in solver_arrays},
+        }
+        blob = json.dumps(meta, default=float).encode()
+
+        buf = io.BytesIO()
+        np.savez_compressed(
+            buf,
+            params=np.array(list(self.params.values()), dtype=float),
+            esd=np.array(list(self.esd.values()), dtype=float),
+            meta=np.frombuffer(blob, dtype=np.uint8),
+            **{f"solver_{k}": v for k, v in solver_arrays.items()},
+        )
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".ckpt-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(buf.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode())
+            if meta.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version: {meta.get('version')}")
+
+            solver = dict(meta["solver"])
+            for name in data.files:
+                if name.startswith("solver_"):
+                    solver[name[len("solver_"):]] = data[name]
+
+            return cls(
+                params=dict(zip(meta["param_names"], map(float, data["params"]))),
+                esd=dict(zip(meta["esd_names"], map(float, data["esd"]))),
+                state=meta["state"],
+                solver=solver,
+            )
@@ -0,0 +1,48 @@
+import argparse
+import sys
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="powerxrd",
+        description="Headless batch processing of powder XRD scans.",
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="directories and/or glob patterns of .xy/.csv scans")
+    parser.add_argument("-r", "--recipe", required=True,
+                        help="JSON refinement plan or Chart-analysis recipe (file or string)")
+    parser.add_argument("-o", "--output", default="powerxrd_summary.csv",
+                        help="summary table, .csv or .parquet (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes (default: %(default)s)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="reprocess files already recorded in the progress journal")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report each finished file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Never open windows, also in worker processes
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from .batch import run_batch
+
+    def progress(row):
+        if not args.quiet:
+            status = row["status"] if row["status"] == "ok" else f"{row['status']} ({row['error']})"
+            print(f"{row['file']}: {status}", flush=True)
+
+    df = run_batch(args.inputs, args.recipe, output=args.output, workers=args.workers,
+                   resume=args.resume, progress=progress)
+
+    n_failed = int((df["status"] != "ok").sum()) if len(df) else 0
+    print(f"{len(df)} scans in {args.output} ({n_failed} failed)")
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
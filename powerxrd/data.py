@@ -1,6 +1,9 @@
+import os
+
 import numpy as np
 import pandas
 
+
 class Data:
     def __init__(self,file):
         '''
@@ -28,11 +31,28 @@ class Data:
 
     def importfile(self):
 
-        if self.file.split(".")[1]=='xy':
-            df = pandas.read_csv(self.file, sep=r'\s+', header=None)   #'https://www.statology.org/pandas-read-text-file/'
+        ext = os.path.splitext(self.file)[1].lower()
 
-        if self.file.split(".")[1]=='csv':
+        if ext=='.xy':
+            df = pandas.read_csv(self.file, sep=r'\s+', header=None)   #'https://www.statology.org/pandas-read-text-file/'
+        elif ext=='.csv':
             df = pandas.read_csv(self.file, header=None)   
+        else:
+            raise ValueError(f"Unsupported file extension {ext!r} (expected .xy or .csv): {self.file}")
 
         x,y = np.array(df).T
-        return x,y 
\ No newline at end of file
+        return x,y 
+
+    def load_into(self, store, key=None):
+        '''
+        Read the file once into a SharedDatasetStore and return its handle.
+
+        Parameters
+        ----------
+        store : SharedDatasetStore
+            shared-memory store (see powerxrd.sharedstore)
+        key : str
+            dataset key (default: absolute file path)
+        '''
+        x, y = self.importfile()
+        return store.put(x, y, key=key if key is not None else os.path.abspath(self.file))
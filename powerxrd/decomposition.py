@@ -0,0 +1,339 @@
+import copy
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .model import PhaseModel
+from .refine import fit_statistics, refine
+
+
+class DecompositionModel(PhaseModel):
+    """
+    Structure-free whole-pattern model for Le Bail / Pawley decomposition.
+
+    Peak positions come from the lattice and widths from caglioti_fwhm, as
+    in PhaseModel, but every distinct peak (reflections grouped by
+    d-spacing) carries its own free intensity instead of |F|^2.
+
+    Peak intensities are exposed as parameters "I_0", "I_1", ... (in order
+    of increasing 2θ), so they can be refined like any other key. Profiles
+    are truncated at ±peak_cutoff × FWHM, which makes the Jacobian of the
+    intensity columns sparse. `wavelength` may be an XraySource, in which
+    case each intensity drives the peaks of all emission lines.
+
+    Example:
+
+        model = DecompositionModel(lattice=CubicLattice(a=4.0))
+        le_bail(model, x_exp, y_exp, ['a', 'U', 'W'])
+        pawley(model, x_exp, y_exp, ['a', 'U', 'W'])
+    """
+
+    def __init__(self, lattice=None, wavelength=1.5406, precision="float64",
+                 max_2theta=90, hkl_max=8, peak_cutoff=50.0):
+
+        super().__init__(lattice=lattice, structure=None,
+                         wavelength=wavelength, precision=precision)
+
+        self.params["scale"] = 1.0
+        self.peak_cutoff = peak_cutoff
+
+        self.setup_reflections(max_2theta, hkl_max)
+
+    # ---------------------------------
+    # Reflection groups
+    # ---------------------------------
+    def setup_reflections(self, max_2theta=90, hkl_max=8, d_tol=1e-6):
+        """
+        Group the current reflection list into distinct peaks.
+
+        Reflections whose d-spacings agree to within d_tol (relative) form
+        one peak. The grouping is fixed afterwards, so refining the lattice
+        moves peaks but never adds or drops intensity parameters.
+        """
+        hkls, d_hkls, twothetas = \
+            self.lattice.generate_hkl_list(self.wavelength, max_2theta, hkl_max)
+
+        order = np.argsort(twothetas)
+        d_sorted = d_hkls[order]
+        new_group = np.r_[True, np.abs(np.diff(d_sorted)) > d_tol * d_sorted[1:]]
+        group_id = np.cumsum(new_group) - 1
+
+        self.hkl_groups = [[] for _ in range(group_id[-1] + 1 if len(group_id) else 0)]
+        for g, i in zip(group_id, order):
+            self.hkl_groups[g].append(hkls[i])
+
+        self.peak_hkl = np.array([group[0] for group in self.hkl_groups]).reshape(-1, 3)
+        self.multiplicity = np.array([len(group) for group in self.hkl_groups])
+        self.intensities = np.ones(len(self.hkl_groups))
+
+        self.invalidate_cache()
+
+    def reflections(self):
+        """
+        One reflection per peak group, with the free intensities.
+
+        Only the peak positions are cached (until the lattice or
+        wavelength changes); the intensities are the current ones, so
+        changing them never invalidates the cached profiles.
+        """
+        key = (tuple(self.lattice.get_params()), self.wavelength)
+
+        if self._cache.get("refl_key") != key:
+            d_hkls = self.lattice.d_spacings(self.peak_hkl)
+            twothetas = np.degrees(2 * np.arcsin(np.clip(self.wavelength / (2 * d_hkls), -1, 1)))
+            hkls = [tuple(int(i) for i in row) for row in self.peak_hkl]
+
+            self._cache = {
+                "refl_key": key,
+                "reflections": (hkls, d_hkls, twothetas),
+            }
+
+        return (*self._cache["reflections"], self.intensities.copy())
+
+    def pattern(self, x):
+        """
+        Calculated pattern on the 2θ grid x.
+
+        Cached in layers like PhaseModel.pattern, except that the peak
+        layer is the unit-intensity profile matrix: the intensities are
+        applied together with the scale, so a Pawley step that only
+        changes I_k costs one sparse product instead of rebuilding every
+        profile. With a `profile` set the intensities enter the FFT peak
+        shapes, and the PhaseModel layers are used.
+        """
+        self.reflections()
+        cache = self._cache
+
+        if self.profile is not None:
+            intensity_key = self.intensities.tobytes()
+            if cache.get("intensity_key") != intensity_key:
+                cache.pop("peaks_key", None)
+                cache["intensity_key"] = intensity_key
+            return super().pattern(x)
+
+        P = self._profiles(x)
+
+        # Intensities and scale
+        scale = self.params["scale"]
+        scaled_key = (scale, self.intensities.tobytes())
+
+        if cache.get("scaled_key") != scaled_key:
+            cache["scaled"] = scale * (P.T @ self.intensities)
+            cache["scaled_key"] = scaled_key
+
+        # Linear background
+        bkg_key = (self.params["bkg_slope"], self.params["bkg_intercept"])
+
+        if cache.get("bkg_key") != bkg_key:
+            cache["bkg"] = self.params["bkg_slope"] * cache["x"] + self.params["bkg_intercept"]
+            cache["bkg_key"] = bkg_key
+
+        return cache["scaled"] + cache["bkg"]
+
+    def pattern_batch(self, x, param_matrix, max_bytes=None, max_2theta=None, hkl_max=None):
+        """
+        Patterns for many parameter vectors (get_param_array() layout),
+        all with the current peak intensities I_k.
+
+        Rows are evaluated with pattern() on a copy of the model, so rows
+        that differ only in scale or background share one profile
+        matrix. The peak groups are fixed (see setup_reflections), so
+        max_2theta and hkl_max do not apply; they and max_bytes are
+        accepted for compatibility with PhaseModel.pattern_batch.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        P = np.atleast_2d(np.asarray(param_matrix, dtype=np.float64))
+
+        model = copy.deepcopy(self)
+        out = np.empty((P.shape[0], x.size))
+        for i, row in enumerate(P):
+            model.set_param_array(row)
+            out[i] = model.pattern(x)
+        return out
+
+    def _profiles(self, x):
+        # Cached profile_matrix on x, rebuilt on a lattice, wavelength,
+        # U/W, precision, cutoff or source change
+        x = np.asarray(x, dtype=np.float64)
+        self.reflections()
+        cache = self._cache
+
+        if "x" not in cache or not np.array_equal(cache["x"], x):
+            cache.pop("profiles_key", None)
+            cache.pop("bkg_key", None)
+            cache["x"] = x.copy()
+
+        source_key = None if self.source is None else self.source.key()
+        profiles_key = (self.params["U"], self.params["W"], self.precision, self.peak_cutoff, source_key)
+
+        if cache.get("profiles_key") != profiles_key:
+            cache["profiles"] = self.profile_matrix(x)
+            cache["profiles_key"] = profiles_key
+            cache.pop("scaled_key", None)
+
+        return cache["profiles"]
+
+    # ---------------------------------
+    # Intensity parameters
+    # ---------------------------------
+    def param_copy(self):
+        new = super().param_copy()
+        new.intensities = self.intensities.copy()
+        return new
+
+    def intensity_keys(self):
+        return [f"I_{i}" for i in range(len(self.intensities))]
+
+    def _peak_index(self, key):
+        if isinstance(key, str) and key.startswith("I_") and key[2:].isdigit():
+            return int(key[2:])
+        return None
+
+    def get_param(self, key):
+        i = self._peak_index(key)
+        if i is not None:
+            return self.intensities[i]
+        return super().get_param(key)
+
+    def set_param(self, key, value):
+        i = self._peak_index(key)
+        if i is not None:
+            self.intensities[i] = value
+        else:
+            super().set_param(key, value)
+
+    def param_bounds(self, key):
+        if self._peak_index(key) is not None:
+            return (0.0, np.inf)
+        return super().param_bounds(key)
+
+    def param_dict(self):
+        d = super().param_dict()
+        d.update(zip(self.intensity_keys(), map(float, self.intensities)))
+        return d
+
+    def param_support(self, key, x, pad=0.0):
+        i = self._peak_index(key)
+        if i is None:
+            return super().param_support(key, x, pad)
+
+        centers, weights, index = self.line_peaks()
+        centers = centers[index == i]
+        lo, hi = self.peak_windows(x, centers, (1 + pad) * self.caglioti_fwhm(centers))
+
+        mask = np.zeros(len(x), dtype=bool)
+        for start, stop in zip(lo, hi):
+            mask[start:stop] = True
+        return mask
+
+    # ---------------------------------
+    # Profile matrix
+    # ---------------------------------
+    def profile_matrix(self, x):
+        """
+        Sparse (n_peaks, N) matrix of unit-intensity peak profiles on x,
+        built in one vectorized pass over all peak windows. With a
+        multi-line source each row sums the peak's lines.
+        """
+        x = np.asarray(x, dtype=np.float64)
+
+        centers, weights, index = self.line_peaks()
+        fwhms = self.caglioti_fwhm(centers)
+        lo, hi = self.peak_windows(x, centers, fwhms)
+
+        counts = hi - lo
+        entry = np.repeat(np.arange(len(counts)), counts)
+        starts = np.repeat(lo - np.r_[0, np.cumsum(counts)[:-1]], counts)
+        cols = np.arange(counts.sum()) + starts
+
+        values = weights[entry] * self.pseudo_voigt(x[cols], centers[entry], fwhms[entry],
+                                                    dtype=self.profile_dtype())
+
+        # Duplicate (row, col) pairs from overlapping lines are summed
+        return csr_matrix((values.astype(np.float64), (index[entry], cols)),
+                          shape=(len(self.intensities), len(x)))
+
+    # ---------------------------------
+    # Le Bail intensity extraction
+    # ---------------------------------
+    def extract_intensities(self, x_exp, y_exp, n_iter=10):
+        """
+        Le Bail partitioning of the observed intensity among the peaks.
+
+        Each iteration apportions the background-subtracted observation at
+        every point to the peaks in proportion to their current calculated
+        contribution:
+
+            I_k <- I_k * sum_i P_ki (y_obs_i - b_i) / (y_calc_i - b_i) / sum_i P_ki
+
+        for all peaks at once with sparse matrix products.
+        """
+        x_exp = np.asarray(x_exp, dtype=np.float64)
+
+        P = self._profiles(x_exp)
+        weight = np.asarray(P.sum(axis=1)).ravel()
+        weight[weight == 0] = 1.0
+
+        scale = self.params["scale"]
+        bkg = self.params["bkg_slope"] * x_exp + self.params["bkg_intercept"]
+        y_net = np.clip(y_exp - bkg, 0.0, None)
+
+        I = np.where(self.intensities > 0, self.intensities, 1.0)
+
+        for _ in range(n_iter):
+            y_peaks = scale * (P.T @ I)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = np.where(y_peaks > 0, y_net / y_peaks, 0.0)
+            I = I * (P @ ratio) / weight
+
+        self.intensities = I
+        return I
+
+
+# ---------------------------------
+# Drivers
+# ---------------------------------
+def le_bail(model, x_exp, y_exp, refine_keys, n_cycles=5, n_extract=10,
+            print_stage=True, save_params=None, **refine_kwargs):
+    """
+    Le Bail fit: alternate intensity extraction and least-squares
+    refinement of cell/profile/background parameters (intensities fixed).
+
+    Returns the OptimizeResult of the last refinement cycle.
+    """
+    result = None
+
+    for cycle in range(n_cycles):
+        model.extract_intensities(x_exp, y_exp, n_extract)
+        result = refine(model, x_exp, y_exp, refine_keys, print_stage=False,
+                        save_params=save_params, **refine_kwargs)
+
+        if print_stage:
+            Rwp = fit_statistics(y_exp, y_exp - result.fun)[0]
+            print(f"Le Bail cycle {cycle + 1}: Rwp = {Rwp:.2f}%  ",
+                  {k: float(model.get_param(k)) for k in refine_keys})
+
+    model.extract_intensities(x_exp, y_exp, n_extract)
+    return result
+
+
+def pawley(model, x_exp, y_exp, refine_keys=(), print_stage=True, save_params=None,
+           **refine_kwargs):
+    """
+    Pawley fit: refine all peak intensities together with `refine_keys`
+    in one least-squares problem. The intensity columns only touch their
+    own peak windows, so the solver receives a sparse Jacobian pattern.
+
+    Unset intensities are seeded with a Le Bail extraction first.
+    Parameters are scaled by the Jacobian column norms by default
+    (x_scale="jac"): peak intensities span orders of magnitude, and
+    scaling by their starting values converges far more slowly.
+    """
+    if np.all(model.intensities == 1.0):
+        model.extract_intensities(x_exp, y_exp)
+
+    refine_kwargs.setdefault("x_scale", "jac")
+
+    keys = list(refine_keys) + model.intensity_keys()
+    return refine(model, x_exp, y_exp, keys, print_stage=print_stage,
+                  save_params=save_params, **refine_kwargs)
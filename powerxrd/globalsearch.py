@@ -0,0 +1,233 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy.optimize import differential_evolution
+from scipy.stats import qmc
+
+from . import kernels
+from .refine import fit_statistics, refine
+
+
+@dataclass
+class GlobalResult:
+    """
+    Outcome of a global refinement.
+
+    best : dict
+        Parameter dictionary of the lowest-cost fit.
+    cost : float
+        0.5 * sum(residual**2) of the best fit.
+    Rwp : float
+        Rwp (%) of the best fit.
+    minima : list of dict
+        Distinct local minima ranked by cost, each with
+        "params", "esd", "cost", "Rwp" and the "start" it was reached from.
+    n_starts : int
+        Number of local refinements that were run.
+    """
+    best: dict
+    cost: float
+    Rwp: float
+    minima: list = field(default_factory=list)
+    n_starts: int = 0
+
+
+# ---------------------------------
+# Worker functions (module level so process pools can pickle them)
+# ---------------------------------
+def _local_fit(task):
+    """
+    Run one local refinement from a start point on a private copy of the
+    model's parameters (cached reflections and peaks are shared).
+    """
+    model, x_exp, y_exp, keys, start, refine_kwargs = task
+
+    model = model.param_copy()
+    for key, value in start.items():
+        model.set_param(key, value)
+
+    result = refine(model, x_exp, y_exp, keys, print_stage=False, **refine_kwargs)
+
+    return {
+        "params": model.param_dict(),
+        "esd": dict(model.esd),
+        "cost": float(result.cost),
+        "Rwp": fit_statistics(y_exp, y_exp - result.fun)[0],
+        "start": start,
+    }
+
+
+class _Cost:
+    """
+    Picklable chi-square objective for differential evolution.
+    Each thread (or process) evaluates on its own parameter copy of the
+    model (see PhaseModel.param_copy).
+    """
+
+    def __init__(self, model, keys, x_exp, y_exp):
+        self.model = model
+        self.keys = keys
+        self.x_exp = x_exp
+        self.y_exp = y_exp
+        self._local = threading.local()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def __call__(self, x):
+        model = getattr(self._local, "model", None)
+        if model is None:
+            model = self._local.model = self.model.param_copy()
+
+        for key, value in zip(self.keys, x):
+            model.set_param(key, value)
+
+        residual = self.y_exp - model.pattern(self.x_exp)
+        return 0.5 * float(residual @ residual)
+
+
+def _make_pool(executor, workers):
+    if workers is None or workers <= 1:
+        return None
+    if executor == "process":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=kernels.pool_context())
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor: {executor}")
+
+
+def _distinct_minima(fits, keys, ranges, tol):
+    """
+    Rank fits by cost and merge those that converged to the same point
+    (all parameters within `tol` of the sampled range width).
+    """
+    fits = sorted(fits, key=lambda f: f["cost"])
+
+    width = np.array([ranges[k][1] - ranges[k][0] if k in ranges else 1.0 for k in keys])
+    width = np.where(width > 0, width, 1.0)
+
+    minima, points = [], []
+    for fit in fits:
+        p = np.array([fit["params"][k] for k in keys]) / width
+        if any(np.all(np.abs(p - q) <= tol) for q in points):
+            continue
+        minima.append(fit)
+        points.append(p)
+
+    return minima
+
+
+# ---------------------------------
+# Global refinement driver
+# ---------------------------------
+def global_refine(model, x_exp, y_exp, refine_keys, ranges, n_starts=16, method="lhs",
+                  workers=1, executor="thread", seed=None, dedup_tol=1e-3,
+                  print_stage=True, **refine_kwargs):
+    """
+    Global search over parameter ranges followed by local least-squares.
+
+    Parameters
+    ----------
+    model : PhaseModel
+        Model to refine. It is updated in place with the best fit and
+        its ESDs.
+    x_exp, y_exp : numpy arrays
+        Experimental 2θ and intensity data.
+    refine_keys : list of str
+        Parameters refined locally from every start.
+    ranges : dict
+        {name: (low, high)} sampling ranges. Parameters in refine_keys
+        without a range start from their current model value.
+    n_starts : int
+        Number of Latin-hypercube starts ("lhs"), or the number of
+        distinct population members polished after differential
+        evolution ("de").
+    method : "lhs" or "de"
+        Multi-start from a Latin hypercube, or scipy differential_evolution
+        on the sampled parameters followed by local polishing.
+    workers : int
+        Size of the worker pool (1 = run serially).
+    executor : "thread" or "process"
+        Pool type. Threads share the cached reflection data directly;
+        processes each build it once.
+    seed : int, optional
+        Seed for reproducible sampling.
+    dedup_tol : float
+        Fits closer than this fraction of each range width are merged.
+    **refine_kwargs
+        Forwarded to powerxrd.refine.refine (bounds, ties, solver options).
+
+    Returns
+    -------
+    GlobalResult
+    """
+
+    refine_keys = list(refine_keys)
+    sampled = [k for k in refine_keys if k in ranges] + \
+        [k for k in ranges if k not in refine_keys]
+    lo = np.array([ranges[k][0] for k in sampled], dtype=float)
+    hi = np.array([ranges[k][1] for k in sampled], dtype=float)
+
+    pool = _make_pool(executor, workers)
+    mapper = map if pool is None else pool.map
+
+    try:
+        if method == "lhs":
+            unit = qmc.LatinHypercube(d=len(sampled), seed=seed).random(n_starts)
+            starts = qmc.scale(unit, lo, hi)
+
+        elif method == "de":
+            de = differential_evolution(
+                _Cost(model, sampled, x_exp, y_exp),
+                list(zip(lo, hi)),
+                seed=seed,
+                polish=False,
+                updating="immediate" if pool is None else "deferred",
+                workers=1 if pool is None else pool.map,
+            )
+            population = getattr(de, "population", np.atleast_2d(de.x))
+            energies = getattr(de, "population_energies", np.array([de.fun]))
+            starts = population[np.argsort(energies)][:n_starts]
+
+        else:
+            raise ValueError(f"Unknown global method: {method}")
+
+        tasks = [
+            (model, x_exp, y_exp, refine_keys, dict(zip(sampled, map(float, s))), refine_kwargs)
+            for s in starts
+        ]
+        fits = list(mapper(_local_fit, tasks))
+
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    minima = _distinct_minima(fits, refine_keys, ranges, dedup_tol)
+    best = minima[0]
+
+    for key in refine_keys + sampled:
+        model.set_param(key, best["params"][key])
+    model.esd.update(best["esd"])
+
+    if print_stage:
+        print(f"\nGlobal search ({method}, {len(fits)} starts): "
+              f"{len(minima)} distinct minima")
+        for rank, m in enumerate(minima[:5]):
+            print(f"  #{rank + 1}: Rwp = {m['Rwp']:.2f}%  ",
+                  {k: float(m["params"][k]) for k in refine_keys})
+
+    return GlobalResult(
+        best=best["params"],
+        cost=best["cost"],
+        Rwp=best["Rwp"],
+        minima=minima,
+        n_starts=len(fits),
+    )
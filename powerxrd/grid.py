@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class Grid:
+    """
+    Sorted 2θ grid with fast index lookup.
+
+    Records whether the grid is uniform and its step. Value → index
+    lookups use O(1) index arithmetic on uniform grids and `searchsorted`
+    on non-uniform (variable-step) grids, so windowed operations work on
+    either without interpolating the data onto a fine uniform grid.
+
+    Ascending and descending grids are both accepted; unsorted data can be
+    wrapped too but only supports mask-based selection (`select`).
+
+    Parameters
+    ----------
+    x : array-like
+        Grid values.
+    rtol : float
+        Relative step variation still treated as uniform.
+    """
+
+    def __init__(self, x, rtol=1e-6):
+
+        self.x = np.asarray(x, dtype=np.float64)
+        n = self.x.size
+
+        diffs = np.diff(self.x)
+        self.ascending = bool(n < 2 or self.x[-1] >= self.x[0])
+        self.sign = 1.0 if self.ascending else -1.0
+
+        # Ascending copy used for lookups
+        self._xs = self.sign * self.x
+        self.is_sorted = bool(np.all(self.sign * diffs >= 0))
+
+        if n > 1 and self.is_sorted:
+            step = (self._xs[-1] - self._xs[0]) / (n - 1)
+            self.is_uniform = bool(step > 0 and np.allclose(self.sign * diffs, step, rtol=rtol, atol=0))
+        else:
+            step = np.nan
+            self.is_uniform = False
+
+        self.step = step if self.is_uniform else None
+
+    @classmethod
+    def of(cls, x):
+        """
+        Return x unchanged if it already is a Grid, else wrap it.
+        """
+        return x if isinstance(x, cls) else cls(x)
+
+    def __len__(self):
+        return self.x.size
+
+    # ---------------------------------
+    # Value → index lookup
+    # ---------------------------------
+    def searchsorted(self, values, side="left"):
+        """
+        Insertion indices of `values`, like np.searchsorted on an ascending
+        grid. On a descending grid the lookup runs on -x, so indices still
+        refer to positions in x.
+        """
+        if not self.is_sorted:
+            raise ValueError("Index lookup needs a sorted grid.")
+
+        v = self.sign * np.asarray(values, dtype=np.float64)
+
+        if not self.is_uniform:
+            return np.searchsorted(self._xs, v, side=side)
+
+        # O(1) arithmetic, then a one-step correction for rounding
+        n = self._xs.size
+        pos = (v - self._xs[0]) / self.step
+
+        if side == "left":
+            i = np.clip(np.ceil(pos), 0, n).astype(np.intp)
+            i = i - ((i > 0) & (self._xs[np.maximum(i - 1, 0)] >= v))
+            i = i + ((i < n) & (self._xs[np.minimum(i, n - 1)] < v))
+        else:
+            i = np.clip(np.floor(pos) + 1, 0, n).astype(np.intp)
+            i = i - ((i > 0) & (self._xs[np.maximum(i - 1, 0)] > v))
+            i = i + ((i < n) & (self._xs[np.minimum(i, n - 1)] <= v))
+
+        return i
+
+    def index_range(self, lo, hi):
+        """
+        [start, stop) index bounds of the points with lo <= x <= hi.
+        Works elementwise on arrays of windows.
+        """
+        if self.ascending:
+            return self.searchsorted(lo, "left"), self.searchsorted(hi, "right")
+        return self.searchsorted(hi, "left"), self.searchsorted(lo, "right")
+
+    def select(self, lo, hi):
+        """
+        Indexer for the points with lo <= x <= hi: a slice on sorted
+        grids, a boolean mask otherwise.
+        """
+        if not self.is_sorted:
+            return (self.x >= lo) & (self.x <= hi)
+
+        start, stop = self.index_range(lo, hi)
+        return slice(int(start), int(stop))
+
+    def nearest(self, values):
+        """
+        Index of the grid point closest to each value.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = self.x.size
+
+        i = np.clip(self.searchsorted(values), 1, n - 1)
+        left_closer = np.abs(values - self.x[i - 1]) <= np.abs(self.x[i] - values)
+        return i - left_closer
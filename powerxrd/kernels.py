@@ -0,0 +1,346 @@
+import contextlib
+import multiprocessing
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:     # optional: pip install powerxrd[numba]
+    numba = None
+
+# -----------------------------
+# Compute kernels
+#
+# Hot loops of pattern and structure-factor evaluation, each with a
+# NumPy implementation and, when Numba is installed, a compiled one
+# with the loops fused (no (reflections × atoms) or per-peak
+# temporaries) and reflections or pattern blocks spread over threads
+# with prange.
+#
+# The backend is chosen at runtime: "auto" (default) uses Numba when it
+# can be imported and NumPy otherwise. Override with set_backend(),
+# the `backend(...)` context manager or the POWERXRD_BACKEND
+# environment variable.
+#
+# Numba's thread pool does not survive fork. When the backend came from
+# "auto", forked children (e.g. ProcessPoolExecutor workers on Linux)
+# switch to NumPy; an explicit set_backend("numba") is kept. The pools
+# powerxrd creates use pool_context(), which avoids fork altogether
+# once the thread pool has started. Numba's own configuration
+# (threading layer etc.) is left untouched.
+# -----------------------------
+
+BACKENDS = ("numpy", "numba")
+
+_backend = None
+_auto = False
+
+
+def available_backends():
+    return ["numpy", "numba"] if numba is not None else ["numpy"]
+
+
+def set_backend(name):
+    """
+    Select "numpy", "numba" or "auto" for all kernels.
+    """
+    global _backend, _auto
+    auto = name == "auto"
+    if auto:
+        name = "numba" if numba is not None else "numpy"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    if name == "numba" and numba is None:
+        raise ImportError("The numba backend needs Numba (pip install powerxrd[numba]).")
+    _backend, _auto = name, auto
+
+
+def get_backend():
+    if _backend is None:
+        set_backend(os.environ.get("POWERXRD_BACKEND", "auto"))
+    return _backend
+
+
+def _after_fork():
+    global _backend, _auto
+    if _auto:
+        _backend, _auto = "numpy", False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+@contextlib.contextmanager
+def backend(name):
+    """
+    Temporarily select a backend:
+
+        with kernels.backend("numpy"):
+            y = model.pattern(x)
+    """
+    previous = get_backend()
+    previous = "auto" if _auto else previous
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous)
+
+
+def pool_context():
+    """
+    multiprocessing context for process pools: "forkserver" when this
+    process would fork with Numba's thread pool running, otherwise None
+    (the platform default).
+    """
+    # Without an explicit choice the default is the first method listed
+    method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+    if numba is None or method != "fork":
+        return None
+    try:
+        numba.threading_layer()
+    except ValueError:      # thread pool not started
+        return None
+    return multiprocessing.get_context("forkserver")
+
+
+# ---------------------------------
+# Pseudo-Voigt accumulation
+# ---------------------------------
+FWHM_TO_SIGMA = 1 / (2 * np.sqrt(2 * np.log(2)))
+
+
+def pseudo_voigt(x, center, fwhm, eta=0.5, dtype=np.float64):
+    """
+    Unit-height pseudo-Voigt eta·L + (1 - eta)·G.
+
+    The offset from the peak center is formed in float64 (x itself may
+    not be representable in float32 to within a small FWHM) and stored
+    straight into a `dtype` buffer; everything after that runs in `dtype`.
+    """
+    # The ufunc casts chunk by chunk, so no float64 array of offsets is made
+    dx = np.empty(np.broadcast_shapes(np.shape(x), np.shape(center)), dtype=dtype)
+    np.subtract(x, center, out=dx, casting="same_kind")
+    eta = dtype(eta)
+
+    sigma = dtype(fwhm * FWHM_TO_SIGMA)
+    gamma = dtype(fwhm / 2)
+
+    # In place on three buffers: dx², L and G
+    dx2 = np.square(dx, out=dx)
+    L = np.reciprocal(1 + dx2 / gamma ** 2)
+    G = np.exp(dx2 / (-2 * sigma ** 2), out=dx2)
+
+    L *= eta
+    G *= 1 - eta
+    L += G
+    return L
+
+
+def accumulate_pseudo_voigt(x, centers, fwhms, amplitudes, lo, hi, eta=0.5,
+                            dtype=np.float64, profile=None):
+    """
+    Sum of pseudo-Voigt peaks on x, peak i covering x[lo[i]:hi[i]].
+
+    Profiles are evaluated in `dtype` and accumulated in float64. The
+    NumPy backend evaluates `profile` (default pseudo_voigt) once per
+    peak window; the Numba backend runs the pseudo_voigt formula fused,
+    in parallel over blocks of x. A custom `profile` is always evaluated
+    with NumPy.
+    """
+    x = np.asarray(x, dtype=np.float64)
+
+    if profile is None and get_backend() == "numba":
+        order = np.argsort(lo, kind="stable")
+        return _pseudo_voigt_numba(
+            x, np.ascontiguousarray(centers, dtype=np.float64)[order],
+            np.ascontiguousarray(fwhms, dtype=np.float64)[order],
+            np.ascontiguousarray(amplitudes, dtype=np.float64)[order],
+            np.ascontiguousarray(lo, dtype=np.int64)[order],
+            np.ascontiguousarray(hi, dtype=np.int64)[order],
+            float(eta), dtype == np.float32, _n_blocks(x.size),
+        )
+
+    profile = pseudo_voigt if profile is None else profile
+    peaks = np.zeros(x.shape, dtype=np.float64)
+    for i in range(len(centers)):
+        w = slice(lo[i], hi[i])
+        # float32 profiles are upcast on accumulation
+        peaks[w] += amplitudes[i] * profile(x[w], centers[i], fwhms[i], eta, dtype=dtype)
+    return peaks
+
+
+def _n_blocks(n):
+    threads = numba.get_num_threads() if numba is not None else 1
+    return max(1, min(4 * threads, n // 256 + 1))
+
+
+# ---------------------------------
+# Structure factors
+# ---------------------------------
+def _f64(a):
+    return np.ascontiguousarray(a, dtype=np.float64)
+
+
+def structure_factors_p1(hkls, s, positions, element_ids, occupancies, B_iso, f_elem, block=256):
+    """
+    F(h) = Σ_n occ_n f_n(s) exp(-B_n s²) exp(2πi h·x_n) over all atoms.
+
+    f_elem: (n_elements, R) form factors, indexed by element_ids.
+    The NumPy backend works in blocks of `block` reflections.
+    """
+    if get_backend() == "numba":
+        return _sf_p1_numba(_f64(hkls), _f64(s), _f64(positions), element_ids.astype(np.int64),
+                            _f64(occupancies), _f64(B_iso), np.ascontiguousarray(f_elem, dtype=np.complex128))
+
+    F = np.zeros(len(hkls), dtype=complex)
+    for r0 in range(0, len(hkls), block):
+        rows = slice(r0, r0 + block)
+
+        phase = np.exp(2j * np.pi * (hkls[rows] @ positions.T))                      # (R, N)
+        f = f_elem[:, rows][element_ids].T                                            # (R, N)
+        DW = np.exp(-np.outer(s[rows] ** 2, B_iso))                                   # (R, N)
+
+        F[rows] = (phase * (occupancies * f * DW)).sum(axis=1)
+    return F
+
+
+def structure_factors_sym(hkls, s, positions, element_ids, site, B_iso, f_elem,
+                          rotations, translations, centric, block=256):
+    """
+    Σ_n site_n f_n(s) exp(-B_n s²) Σ_ops exp(2πi h·(R x_n + t)), the
+    symmetry sum of CrystalStructure without the centering factor.
+
+    With `centric`, the operators are the proper-rotation half of a
+    group with inversion at the origin and each term is 2 cos(...).
+    """
+    if get_backend() == "numba":
+        return _sf_sym_numba(_f64(hkls), _f64(s), _f64(positions), element_ids.astype(np.int64),
+                             _f64(site), _f64(B_iso), np.ascontiguousarray(f_elem, dtype=np.complex128),
+                             _f64(rotations), _f64(translations), bool(centric))
+
+    F = np.zeros(len(hkls), dtype=complex)
+    for r0 in range(0, len(hkls), block):
+        rows = slice(r0, r0 + block)
+        h = hkls[rows]
+
+        hR = np.einsum("rk,okj->roj", h, rotations)                                   # (R, O, 3)
+        arg = 2 * np.pi * (hR @ positions.T + (h @ translations.T)[:, :, None])       # (R, O, N)
+        if centric:
+            geometric = 2 * np.cos(arg).sum(axis=1)                                    # (R, N)
+        else:
+            geometric = np.exp(1j * arg).sum(axis=1)                                   # (R, N)
+
+        f = f_elem[:, rows][element_ids].T                                            # (R, N)
+        DW = np.exp(-np.outer(s[rows] ** 2, B_iso))                                   # (R, N)
+
+        F[rows] = (geometric * (site * f * DW)).sum(axis=1)
+    return F
+
+
+# ---------------------------------
+# Numba implementations
+# ---------------------------------
+if numba is not None:
+
+    @numba.njit(parallel=True, cache=True)
+    def _pseudo_voigt_numba(x, centers, fwhms, amps, lo, hi, eta, single, n_blocks):
+        n = x.size
+        out = np.zeros(n)
+
+        max_width = 0
+        for p in range(centers.size):
+            max_width = max(max_width, hi[p] - lo[p])
+
+        size = (n + n_blocks - 1) // n_blocks
+
+        # Each thread owns a block of x and adds every peak overlapping it,
+        # so no two threads write the same point (peaks sorted by lo)
+        for b in numba.prange(n_blocks):
+            start = b * size
+            stop = min(n, start + size)
+
+            first = np.searchsorted(lo, start - max_width)
+            last = np.searchsorted(lo, stop)
+
+            for p in range(first, last):
+                a = max(lo[p], start)
+                z = min(hi[p], stop)
+                sigma = fwhms[p] * FWHM_TO_SIGMA
+                gamma = fwhms[p] / 2
+
+                if single:
+                    e32 = np.float32(eta)
+                    s32 = np.float32(sigma)
+                    g32 = np.float32(gamma)
+                    for i in range(a, z):
+                        dx = np.float32(x[i] - centers[p])
+                        G = np.exp(-(dx * dx) / (np.float32(2) * s32 * s32))
+                        t = dx / g32
+                        L = np.float32(1) / (np.float32(1) + t * t)
+                        out[i] += amps[p] * np.float64(e32 * L + (np.float32(1) - e32) * G)
+                else:
+                    for i in range(a, z):
+                        dx = x[i] - centers[p]
+                        G = np.exp(-(dx * dx) / (2 * sigma * sigma))
+                        t = dx / gamma
+                        L = 1 / (1 + t * t)
+                        out[i] += amps[p] * (eta * L + (1 - eta) * G)
+
+        return out
+
+    @numba.njit(parallel=True, cache=True)
+    def _sf_p1_numba(hkls, s, positions, element_ids, occ, B, f_elem):
+        R = hkls.shape[0]
+        N = positions.shape[0]
+        F = np.zeros(R, dtype=np.complex128)
+
+        for r in numba.prange(R):
+            s2 = s[r] * s[r]
+            acc = 0j
+            for n in range(N):
+                arg = 2 * np.pi * (hkls[r, 0] * positions[n, 0]
+                                   + hkls[r, 1] * positions[n, 1]
+                                   + hkls[r, 2] * positions[n, 2])
+                w = occ[n] * np.exp(-B[n] * s2)
+                acc += w * f_elem[element_ids[n], r] * complex(np.cos(arg), np.sin(arg))
+            F[r] = acc
+
+        return F
+
+    @numba.njit(parallel=True, cache=True)
+    def _sf_sym_numba(hkls, s, positions, element_ids, site, B, f_elem,
+                      rotations, translations, centric):
+        R = hkls.shape[0]
+        N = positions.shape[0]
+        O = rotations.shape[0]
+        F = np.zeros(R, dtype=np.complex128)
+
+        for r in numba.prange(R):
+            h0, h1, h2 = hkls[r, 0], hkls[r, 1], hkls[r, 2]
+            s2 = s[r] * s[r]
+            acc = 0j
+
+            for n in range(N):
+                re = 0.0
+                im = 0.0
+                for o in range(O):
+                    arg = h0 * translations[o, 0] + h1 * translations[o, 1] + h2 * translations[o, 2]
+                    for j in range(3):
+                        hr = h0 * rotations[o, 0, j] + h1 * rotations[o, 1, j] + h2 * rotations[o, 2, j]
+                        arg += hr * positions[n, j]
+                    arg *= 2 * np.pi
+
+                    if centric:
+                        re += 2 * np.cos(arg)
+                    else:
+                        re += np.cos(arg)
+                        im += np.sin(arg)
+
+                w = site[n] * np.exp(-B[n] * s2)
+                acc += w * f_elem[element_ids[n], r] * complex(re, im)
+            F[r] = acc
+
+        return F
@@ -1,8 +1,22 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
 
 import numpy as np
 
 
+@lru_cache(maxsize=None)
+def hkl_candidates(hkl_max):
+    """
+    All (h, k, l) with 0 <= h, k, l < hkl_max except (0, 0, 0), as a
+    read-only (K, 3) int array in h-major order. Cached per process, so
+    every lattice, model copy and worker thread shares one array.
+    """
+    hkl = np.indices((hkl_max, hkl_max, hkl_max)).reshape(3, -1).T[1:]
+    hkl = np.ascontiguousarray(hkl)
+    hkl.setflags(write=False)
+    return hkl
+
+
 class BaseLattice(ABC):
     """
     Abstract lattice class.
@@ -35,35 +49,31 @@ class BaseLattice(ABC):
         """
         pass
 
-    def generate_hkl_list(self, wavelength, max_2theta=90, hkl_max=8):
+    def d_spacings(self, hkl):
+        """
+        Vectorized d-spacings for a (K, 3) array of Miller indices.
+        Forbidden/undefined reflections are returned as NaN.
+        Subclasses may override this with a closed-form expression.
+        """
+        d = [self.d_spacing(h, k, l) for h, k, l in hkl]
+        return np.array([np.nan if v is None else v for v in d], dtype=float)
 
-        hkls = []
-        d_hkls = []
-        twothetas = []
+    def generate_hkl_list(self, wavelength, max_2theta=90, hkl_max=8):
 
-        for h in range(hkl_max):
-            for k in range(hkl_max):
-                for l in range(hkl_max):
+        hkl = hkl_candidates(hkl_max)
+        d = self.d_spacings(hkl)
 
-                    if (h, k, l) == (0, 0, 0):
-                        continue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            argument = wavelength / (2 * d)
 
-                    d = self.d_spacing(h, k, l)
-                    if d is None:
-                        continue
+        valid = argument <= 1
+        twotheta = np.full(d.shape, np.nan)
+        twotheta[valid] = np.degrees(2 * np.arcsin(argument[valid]))
 
-                    argument = wavelength / (2 * d)
-                    if argument > 1:
-                        continue
+        keep = valid & (twotheta > 5) & (twotheta < max_2theta)
 
-                    theta = np.arcsin(argument)
-                    twotheta = np.degrees(2 * theta)
+        hkls = [tuple(int(i) for i in row) for row in hkl[keep]]
 
-                    if 5 < twotheta < max_2theta:
-                        hkls.append((h, k, l))
-                        d_hkls.append(d)
-                        twothetas.append(twotheta)
+        return hkls, d[keep], twotheta[keep]
 
-        return hkls, np.array(d_hkls), np.array(twothetas)
-    
 
@@ -14,6 +14,12 @@ class CubicLattice(BaseLattice):
             return None
         return self.a / np.sqrt(denom)
 
+    def d_spacings(self, hkl):
+        hkl = np.asarray(hkl)
+        denom = np.sum(hkl * hkl, axis=-1).astype(float)
+        with np.errstate(divide="ignore"):
+            return np.where(denom > 0, self.a / np.sqrt(denom), np.nan)
+
     def param_names(self):
         return ["a"]
 
@@ -0,0 +1,291 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class PhaseMatch:
+    """
+    Score of one library phase against an observed peak list.
+
+    fom_sticks is the fraction of the phase's stick intensity (inside
+    the observed range) that lands on an observed peak, fom_observed the
+    fraction of observed intensity explained by the phase; score is their
+    geometric mean. shift is the mean 2θ offset (observed − stick, deg)
+    of the matched sticks, a hint of a lattice-parameter mismatch.
+    """
+    name: str
+    score: float
+    fom_sticks: float
+    fom_observed: float
+    shift: float
+    n_matched: int
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def merge_reflections(d_hkls, intensities, decimals=5):
+    """
+    Stick pattern of a reflection list: reflections with equal d-spacing
+    (e.g. symmetry-equivalent hkls) merged into one stick with summed
+    intensity. Returns (d, intensity) sorted by increasing 2θ.
+    """
+    d_hkls = np.asarray(d_hkls, dtype=float)
+    if d_hkls.size == 0:
+        return np.zeros(0), np.zeros(0)
+
+    keys, inverse = np.unique(np.round(d_hkls, decimals), return_inverse=True)
+    summed = np.bincount(inverse.ravel(), weights=np.asarray(intensities, dtype=float))
+    order = np.argsort(-keys)
+    return keys[order], summed[order]
+
+
+class PhaseLibrary:
+    """
+    Precomputed stick patterns of candidate phases for search/match.
+
+    All phases are stored in flat arrays, phase p occupying
+    [offsets[p], offsets[p+1]):
+
+        d          (M,) float32   d-spacings (Å)
+        twotheta   (M,) float32   stick positions at `wavelength`
+        intensity  (M,) float32   normalized to 100 per phase
+
+    `save` writes each array as .npy plus an index.json of names and
+    metadata; `load` memory-maps them, so a library of many thousand
+    phases is opened instantly and only the pages touched by a search
+    are read.
+
+    Example:
+
+        library = PhaseLibrary.from_models({"SrTiO3": sto, "Si": si})
+        library.save("phases")
+
+        library = PhaseLibrary.load("phases")
+        peaks = Chart(x, y).allpeaks(show=False)
+        for match in library.search(peaks, tol=0.15):
+            print(match.name, match.score)
+    """
+
+    # Sticks scored per block in search, bounding the temporaries
+    BLOCK = 1 << 18
+
+    def __init__(self, names, offsets, d, twotheta, intensity, wavelength=1.5406):
+        self.names = list(names)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.d = d
+        self.twotheta = twotheta
+        self.intensity = intensity
+        self.wavelength = float(wavelength)
+
+        if len(self.offsets) != len(self.names) + 1:
+            raise ValueError("offsets must have one entry per phase plus one.")
+
+    @classmethod
+    def from_models(cls, models, min_intensity=0.5):
+        """
+        Build a library from {name: PhaseModel}. Each model's cached
+        reflection list (positions at its wavelength, |F|² intensities)
+        is reduced to a stick pattern; sticks weaker than `min_intensity`
+        (on the 0–100 scale) are dropped.
+        """
+        names, ds, intensities = [], [], []
+        wavelength = None
+
+        for name, model in models.items():
+            if wavelength is None:
+                wavelength = model.wavelength
+            elif model.wavelength != wavelength:
+                raise ValueError("All models of a library must share one wavelength.")
+
+            _, d_hkls, _, I = model.reflections()
+            d, I = merge_reflections(d_hkls, I)
+            if I.size and I.max() > 0:
+                I = 100.0 * I / I.max()
+            keep = I >= min_intensity
+
+            names.append(name)
+            ds.append(d[keep])
+            intensities.append(I[keep])
+
+        offsets = np.concatenate([[0], np.cumsum([len(d) for d in ds])])
+        d = np.concatenate(ds).astype(np.float32) if ds else np.zeros(0, np.float32)
+        wavelength = 1.5406 if wavelength is None else wavelength
+
+        return cls(
+            names, offsets, d,
+            _twotheta(d, wavelength).astype(np.float32),
+            np.concatenate(intensities).astype(np.float32) if ds else np.zeros(0, np.float32),
+            wavelength,
+        )
+
+    # ---------------------------------
+    # Storage
+    # ---------------------------------
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ("offsets", "d", "twotheta", "intensity"):
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name)))
+
+        with open(os.path.join(directory, "index.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "wavelength": self.wavelength, "names": self.names}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported library version: {index.get('version')}")
+
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+            for name in ("offsets", "d", "twotheta", "intensity")
+        }
+        return cls(index["names"], np.asarray(arrays.pop("offsets")), wavelength=index["wavelength"], **arrays)
+
+    # ---------------------------------
+    # Access
+    # ---------------------------------
+    def __len__(self):
+        return len(self.names)
+
+    def sticks(self, name, wavelength=None):
+        """
+        (twotheta, intensity) stick pattern of one phase.
+        """
+        p = self.names.index(name)
+        rows = slice(self.offsets[p], self.offsets[p + 1])
+        if wavelength is None or wavelength == self.wavelength:
+            return np.asarray(self.twotheta[rows], dtype=float), np.asarray(self.intensity[rows], dtype=float)
+        return _twotheta(self.d[rows], wavelength), np.asarray(self.intensity[rows], dtype=float)
+
+    # ---------------------------------
+    # Search/match
+    # ---------------------------------
+    def search(self, peaks, tol=0.1, top=10, twotheta_range=None, wavelength=None):
+        """
+        Rank all phases against an observed peak list.
+
+        Parameters
+        ----------
+        peaks : array
+            Observed peaks as rows [2θ, intensity, ...] (e.g. the output
+            of Chart.allpeaks) or a (positions, intensities) pair.
+        tol : float
+            Largest |2θ_obs − 2θ_stick| (deg) counted as a match.
+        top : int or None
+            Number of best matches returned (None = all phases).
+        twotheta_range : (float, float), optional
+            Measured range; sticks outside are ignored. Defaults to the
+            span of the observed peaks widened by `tol`.
+        wavelength : float, optional
+            Wavelength of the observation when it differs from the
+            library's; stick positions are recomputed from d.
+
+        Returns
+        -------
+        list of PhaseMatch, best first
+        """
+        obs_tt, obs_I = _observed(peaks)
+        order = np.argsort(obs_tt)
+        obs_tt, obs_I = obs_tt[order], obs_I[order]
+        n_obs = len(obs_tt)
+
+        if twotheta_range is None:
+            twotheta_range = (obs_tt[0] - tol, obs_tt[-1] + tol) if n_obs else (0.0, 0.0)
+        lo, hi = twotheta_range
+
+        n_phases = len(self)
+        total = np.zeros(n_phases)
+        matched_I = np.zeros(n_phases)
+        shift_sum = np.zeros(n_phases)
+        n_matched = np.zeros(n_phases, dtype=np.int64)
+        explained = np.zeros(n_phases)
+
+        # Phases are scored in blocks of about BLOCK sticks
+        for p0, p1 in _phase_blocks(self.offsets, self.BLOCK):
+            rows = slice(self.offsets[p0], self.offsets[p1])
+            if wavelength is None or wavelength == self.wavelength:
+                tt = np.asarray(self.twotheta[rows], dtype=float)
+            else:
+                tt = _twotheta(self.d[rows], wavelength)
+            I = np.asarray(self.intensity[rows], dtype=float)
+            phase = np.repeat(np.arange(p0, p1), np.diff(self.offsets[p0:p1 + 1]))
+
+            inside = (tt >= lo) & (tt <= hi)
+            total += np.bincount(phase, weights=I * inside, minlength=n_phases)
+            if n_obs == 0:
+                continue
+
+            # Nearest observed peak of every stick
+            j = np.clip(np.searchsorted(obs_tt, tt), 1, max(n_obs - 1, 1))
+            left = np.abs(tt - obs_tt[j - 1])
+            right = np.abs(tt - obs_tt[np.minimum(j, n_obs - 1)])
+            nearest = np.where(left <= right, j - 1, np.minimum(j, n_obs - 1))
+            offset = obs_tt[nearest] - tt
+
+            hit = inside & (np.abs(offset) <= tol)
+            matched_I += np.bincount(phase[hit], weights=I[hit], minlength=n_phases)
+            shift_sum += np.bincount(phase[hit], weights=offset[hit], minlength=n_phases)
+            n_matched += np.bincount(phase[hit], minlength=n_phases)
+
+            # Observed peaks hit by at least one stick of each phase
+            local = phase[hit] - p0
+            covered = np.zeros((p1 - p0) * n_obs, dtype=bool)
+            covered[local * n_obs + nearest[hit]] = True
+            explained[p0:p1] += covered.reshape(p1 - p0, n_obs) @ obs_I
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fom_sticks = np.where(total > 0, matched_I / total, 0.0)
+            fom_observed = explained / obs_I.sum() if n_obs and obs_I.sum() > 0 else np.zeros(n_phases)
+            shift = np.where(n_matched > 0, shift_sum / np.maximum(n_matched, 1), np.nan)
+        score = np.sqrt(fom_sticks * fom_observed)
+
+        ranking = np.argsort(-score, kind="stable")
+        if top is not None:
+            ranking = ranking[:top]
+
+        return [
+            PhaseMatch(self.names[p], float(score[p]), float(fom_sticks[p]),
+                       float(fom_observed[p]), float(shift[p]), int(n_matched[p]))
+            for p in ranking
+        ]
+
+
+def _twotheta(d, wavelength):
+    d = np.asarray(d, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.degrees(2 * np.arcsin(wavelength / (2 * d)))
+
+
+def _observed(peaks):
+    """
+    (positions, intensities) of an observed peak list.
+    """
+    if isinstance(peaks, tuple) and len(peaks) == 2:
+        tt, I = peaks
+    else:
+        peaks = np.atleast_2d(np.asarray(peaks, dtype=float))
+        if peaks.size == 0:
+            return np.zeros(0), np.zeros(0)
+        tt, I = peaks[:, 0], peaks[:, 1]
+    return np.asarray(tt, dtype=float).ravel(), np.asarray(I, dtype=float).ravel()
+
+
+def _phase_blocks(offsets, block):
+    """
+    Consecutive phase ranges (p0, p1) holding about `block` sticks each.
+    """
+    n = len(offsets) - 1
+    p0 = 0
+    while p0 < n:
+        p1 = int(np.searchsorted(offsets, offsets[p0] + block, side="right")) - 1
+        p1 = min(max(p1, p0 + 1), n)
+        yield p0, p1
+        p0 = p1
@@ -1,18 +1,42 @@
+import copy
+
 import numpy as np
+from scipy.sparse import csc_matrix
 
+from powerxrd import kernels
+from powerxrd.grid import Grid
 from powerxrd.lattice import CubicLattice
+from powerxrd.lattice.base import hkl_candidates
+from powerxrd.source import XraySource
 
 
 class PhaseModel:
 
-    def __init__(self, lattice=None, structure=None, wavelength=1.5406):
+    # Non-lattice entries of the parameter vector, in order
+    PROFILE_KEYS = ["U", "W", "scale", "bkg_slope", "bkg_intercept"]
+
+    def __init__(self, lattice=None, structure=None, wavelength=1.5406, precision="float64",
+                 profile=None):
 
         if lattice is None:
             lattice = CubicLattice(a=3.905)
 
         self.lattice = lattice
         self.structure = structure
-        self.wavelength = wavelength
+        self.precision = precision
+
+        # A float is a single line; an XraySource adds e.g. the Kα2 line.
+        # self.wavelength is always the primary line.
+        if isinstance(wavelength, XraySource):
+            self.source = wavelength
+            self.wavelength = wavelength.primary
+        else:
+            self.source = None
+            self.wavelength = wavelength
+
+        # Truncate each profile at ±peak_cutoff × FWHM (None = full range).
+        # Truncation makes the Jacobian sparse, see jac_sparsity().
+        self.peak_cutoff = None
 
         self.params = {
             "U": 0.01,
@@ -22,6 +46,31 @@ class PhaseModel:
             "bkg_intercept": 100.0
         }
 
+        # Per-parameter (lower, upper) limits used by refine.
+        # Keeps the Caglioti width real and the intensities positive.
+        self.bounds = {
+            "U": (0.0, np.inf),
+            "W": (1e-6, np.inf),
+            "scale": (0.0, np.inf),
+        }
+
+        # Peak shape: None = pseudo-Voigt with Caglioti width; a
+        # FundamentalParameters profile adds "size" (nm) and "strain".
+        self.profile = profile
+        if profile is not None:
+            self.params.update({"size": 100.0, "strain": 0.0})
+            self.bounds.update({"size": (1e-3, np.inf), "strain": (0.0, np.inf)})
+
+        # Linear ties {name: spec}, see powerxrd.parameters
+        self.ties = {}
+
+        # Estimated standard deviations from the last refinement
+        self.esd = {}
+
+        # Cached pattern components, see pattern()
+        self._cache = {}
+        self._grid = None
+
     # ---------------------------------
     # Structure Intensity |F|^2
     # ---------------------------------
@@ -40,9 +89,25 @@ class PhaseModel:
         else:
             s = 0.0
 
-        F = self.structure.structure_factor(hkl, s)
+        F = self.structure.structure_factor(hkl, s, wavelength=self.wavelength)
         return abs(F) ** 2
 
+    def reflection_intensities(self, hkls, twothetas):
+        """
+        |F|^2 for a list of reflections, as an array.
+        """
+        if self.structure is None:
+            return np.full(len(hkls), 100.0)
+
+        if not hasattr(self.structure, "structure_factors"):
+            return np.array([self.f_squared(hkl, tt) for hkl, tt in zip(hkls, twothetas)], dtype=float)
+
+        # All reflections in one bulk evaluation
+        s = np.sin(np.radians(np.asarray(twothetas, dtype=float) / 2)) / self.wavelength
+        F = self.structure.structure_factors(np.asarray(hkls).reshape(-1, 3), s,
+                                             wavelength=self.wavelength)
+        return np.abs(F) ** 2
+
     # ---------------------------------
     # Caglioti peak width
     # ---------------------------------
@@ -59,41 +124,395 @@ class PhaseModel:
     # ---------------------------------
     # Pseudo-Voigt
     # ---------------------------------
-    def pseudo_voigt(self, x, center, fwhm, eta=0.5):
-
-        sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
-        gamma = fwhm / 2
-
-        G = np.exp(-((x - center) ** 2) / (2 * sigma ** 2))
-        L = 1 / (1 + ((x - center) / gamma) ** 2)
+    def pseudo_voigt(self, x, center, fwhm, eta=0.5, dtype=np.float64):
+        return kernels.pseudo_voigt(x, center, fwhm, eta, dtype=dtype)
 
-        return eta * L + (1 - eta) * G
+    def _custom_profile(self):
+        """
+        pseudo_voigt when overridden (subclass or instance attribute),
+        else None so the accumulation may use the compiled kernel.
+        """
+        profile = self.pseudo_voigt
+        return None if getattr(profile, "__func__", None) is PhaseModel.pseudo_voigt else profile
 
     # ---------------------------------
     # Pattern generation
     # ---------------------------------
-    def pattern(self, x):
+    def profile_dtype(self):
+        """
+        dtype used to evaluate peak profiles.
+
+        precision="float64" (default) evaluates everything in double
+        precision. precision="float32" evaluates the profiles in single
+        precision and accumulates them into a float64 pattern, halving the
+        memory traffic of the profile arithmetic. Offsets from each peak
+        center are formed in float64 before the cast, so the error relative
+        to the float64 path stays below 1e-6 of the strongest peak
+        (see benchmarks/bench_precision.py).
+        """
+        if self.precision in ("float64", np.float64):
+            return np.float64
+        if self.precision in ("float32", np.float32):
+            return np.float32
+        raise ValueError(f"Unknown precision: {self.precision}")
+
+    def param_copy(self):
+        """
+        Copy with its own parameters (lattice, params, ESDs) that shares
+        everything else by reference, including the cached reflections
+        and pattern components. Cache entries are replaced, never changed
+        in place, so copies can be refined independently, e.g. one per
+        start of a multi-start search.
+        """
+        new = copy.copy(self)
+        new.lattice = copy.deepcopy(self.lattice)
+        new.params = dict(self.params)
+        new.esd = dict(self.esd)
+        new._cache = dict(self._cache)
+        return new
+
+    def invalidate_cache(self):
+        """
+        Drop cached reflections and pattern components.
+
+        Parameter changes are detected automatically; call this after
+        mutating the structure (atoms, occupancies, ...) in place.
+        """
+        self._cache = {}
+
+    def reflections(self):
+        """
+        Reflection list (hkls, d_hkls, twothetas, intensities).
+
+        Cached until the lattice parameters, wavelength or structure
+        (identity or CrystalStructure.version) change.
+        Positions are those of the primary emission line.
+        """
+        key = (tuple(self.lattice.get_params()), self.wavelength, id(self.structure),
+               getattr(self.structure, "version", None))
+
+        if self._cache.get("refl_key") != key:
+            hkls, d_hkls, twothetas = \
+                self.lattice.generate_hkl_list(self.wavelength)
+            intensities = self.reflection_intensities(hkls, twothetas)
+
+            self._cache = {
+                "refl_key": key,
+                "reflections": (hkls, d_hkls, twothetas, intensities),
+            }
+
+        return self._cache["reflections"]
+
+    def emission_lines(self):
+        """
+        (wavelengths, ratios) of the source lines, primary line first.
+        """
+        if self.source is None:
+            return np.array([self.wavelength]), np.array([1.0])
+        return self.source.wavelengths, self.source.ratios
+
+    def line_peaks(self):
+        """
+        Peaks of all emission lines: (centers, weights, index).
+
+        Every line's positions come from the cached d-spacings in one
+        vectorized step; `weights` holds the line intensity ratio and
+        `index` the reflection each peak belongs to. With a single line
+        this is just the reflection list.
+        """
+        hkls, d_hkls, twothetas, intensities = self.reflections()
+        wavelengths, ratios = self.emission_lines()
+        n = len(twothetas)
+
+        if len(wavelengths) == 1:
+            return twothetas, np.full(n, ratios[0]), np.arange(n)
+
+        source = self.source if self.source is not None else XraySource(wavelengths, ratios)
+        centers = source.line_twothetas(d_hkls)
+        centers[0] = twothetas
+
+        weights = np.broadcast_to(ratios[:, None], centers.shape)
+        index = np.broadcast_to(np.arange(n), centers.shape)
+
+        ok = np.isfinite(centers)
+        return centers[ok], weights[ok], index[ok]
+
+    def peak_windows(self, x, twothetas, fwhms):
+        """
+        Index ranges [lo, hi) of x covered by each peak.
 
-        y = np.zeros_like(x)
+        With peak_cutoff set, a peak spans center ± peak_cutoff × FWHM
+        (x must be sorted; uniform and variable-step grids are both
+        handled by Grid); otherwise every peak spans all of x.
+        """
+        n = len(twothetas)
+
+        if self.peak_cutoff is None:
+            return np.zeros(n, dtype=int), np.full(n, len(x), dtype=int)
 
-        hkls, d_hkls, twothetas = \
-            self.lattice.generate_hkl_list(self.wavelength)
+        half = self.peak_cutoff * np.asarray(fwhms)
+        return self.grid(x).index_range(twothetas - half, twothetas + half)
 
-        for i, hkl in enumerate(hkls):
+    def grid(self, x):
+        """
+        Grid for x, reused for as long as the same x is passed in.
+        """
+        if isinstance(x, Grid):
+            return x
 
-            twotheta = twothetas[i]
-            fwhm = self.caglioti_fwhm(twotheta)
+        cached = self._grid
+        if cached is not None and cached.x.shape == np.shape(x) and np.array_equal(cached.x, x):
+            return cached
 
-            intensity = self.f_squared(hkl, twotheta)
+        self._grid = Grid(x)
+        return self._grid
+
+    def pattern(self, x):
+        """
+        Calculated pattern on the 2θ grid x.
 
-            amp = self.params["scale"] * intensity
+        The pattern is kept as cached components
 
-            y += amp * self.pseudo_voigt(x, twotheta, fwhm)
+            y = scale * peaks + background
+
+        where `peaks` is the unit-scale peak sum. Only the components whose
+        parameters changed since the last call are rebuilt: a background
+        change re-adds the background, a scale change rescales the cached
+        peak sum, a U/W change rebuilds profiles on the cached reflection
+        list, and only a lattice/wavelength change regenerates reflections.
+
+        With a multi-line source every reflection contributes one peak
+        per emission line, scaled by the line's intensity ratio. With a
+        `profile` set, peak shapes come from its FFT convolution instead
+        of the pseudo-Voigt.
+        """
+        x = np.asarray(x, dtype=np.float64)
+
+        hkls, d_hkls, twothetas, intensities = self.reflections()
+        cache = self._cache
+
+        if "x" not in cache or not np.array_equal(cache["x"], x):
+            cache.pop("peaks_key", None)
+            cache.pop("bkg_key", None)
+            cache["x"] = x.copy()
+
+        # Unit-scale peak sum
+        source_key = None if self.source is None else self.source.key()
+        peaks_key = (self.params["U"], self.params["W"], self.precision, self.peak_cutoff, source_key)
+        if self.profile is not None:
+            peaks_key = (self.profile.key(), self.params["size"], self.params["strain"],
+                         self.precision, source_key)
+
+        if cache.get("peaks_key") != peaks_key and self.profile is not None:
+            centers, weights, index = self.line_peaks()
+            wavelengths = 2 * d_hkls[index] * np.sin(np.radians(centers / 2))
+
+            cache["peaks"] = self.profile.peaks(
+                self.grid(x), centers, weights * intensities[index], wavelengths,
+                self.params["size"], self.params["strain"], dtype=self.profile_dtype())
+            cache["peaks_key"] = peaks_key
+            cache.pop("scaled_key", None)
+
+        if cache.get("peaks_key") != peaks_key:
+            # All lines of all reflections in one pass
+            centers, weights, index = self.line_peaks()
+            amps = weights * intensities[index]
+
+            fwhms = self.caglioti_fwhm(centers)
+            lo, hi = self.peak_windows(x, centers, fwhms)
+
+            # NumPy or Numba backend, see powerxrd.kernels; an overridden
+            # pseudo_voigt always runs (on the NumPy path)
+            cache["peaks"] = kernels.accumulate_pseudo_voigt(
+                x, centers, fwhms, amps, lo, hi, dtype=self.profile_dtype(), profile=self._custom_profile())
+            cache["peaks_key"] = peaks_key
+            cache.pop("scaled_key", None)
+
+        # Scaled peaks
+        scale = self.params["scale"]
+
+        if cache.get("scaled_key") != scale:
+            cache["scaled"] = scale * cache["peaks"]
+            cache["scaled_key"] = scale
 
         # Linear background
-        y += self.params["bkg_slope"] * x + self.params["bkg_intercept"]
+        bkg_key = (self.params["bkg_slope"], self.params["bkg_intercept"])
+
+        if cache.get("bkg_key") != bkg_key:
+            cache["bkg"] = self.params["bkg_slope"] * x + self.params["bkg_intercept"]
+            cache["bkg_key"] = bkg_key
+
+        return cache["scaled"] + cache["bkg"]
+
+    # ---------------------------------
+    # Jacobian structure
+    # ---------------------------------
+    def param_support(self, key, x, pad=0.0):
+        """
+        Boolean mask of the points of x that parameter `key` can change.
+
+        Background terms touch every point; all other built-in parameters
+        touch the union of the peak windows. `pad` widens every window by
+        that fraction of its half-width, so the mask still covers peaks
+        that shift or broaden while the parameters change. Models with
+        peak-local parameters override this.
+        """
+        if key in ("bkg_slope", "bkg_intercept"):
+            return np.ones(len(x), dtype=bool)
+
+        centers, weights, index = self.line_peaks()
+        if self.profile is not None:
+            half = self.profile.window * (1 + pad)
+            lo, hi = self.grid(x).index_range(centers - half, centers + half)
+        else:
+            lo, hi = self.peak_windows(x, centers, (1 + pad) * self.caglioti_fwhm(centers))
+
+        # Union of [lo, hi) intervals via a difference array
+        edges = np.zeros(len(x) + 1, dtype=int)
+        np.add.at(edges, lo, 1)
+        np.add.at(edges, hi, -1)
+        return np.cumsum(edges[:-1]) > 0
+
+    def jac_sparsity(self, x, keys, pad=0.0):
+        """
+        (N, P) sparsity pattern of d(pattern)/d(params) for `keys`,
+        or None when profiles are not truncated (the Jacobian is dense).
+        FFT profiles are always truncated at ±profile.window. `pad` is
+        passed to param_support.
+        """
+        if self.peak_cutoff is None and self.profile is None:
+            return None
+
+        x = np.asarray(x, dtype=np.float64)
+        mask = np.column_stack([self.param_support(k, x, pad) for k in keys])
+        return csc_matrix(mask.astype(np.int8))
 
-        return y
+    # ---------------------------------
+    # Batched pattern generation
+    # ---------------------------------
+    def pattern_batch(self, x, param_matrix, max_bytes=2 * 2**20,
+                      max_2theta=90, hkl_max=8):
+        """
+        Patterns for many parameter vectors at once.
+
+        Parameters
+        ----------
+        x : numpy array (N,)
+            2θ grid shared by all patterns.
+        param_matrix : numpy array (M, P)
+            Parameter vectors in get_param_array() layout.
+        max_bytes : int
+            Budget for the (rows × reflections × points) profile
+            temporaries. Rows and reflections are processed in blocks that
+            fit the budget, so memory does not grow with M.
+
+        Returns
+        -------
+        numpy array (M, N)
+
+        The HKL candidates, the grid and the reflection union are set up
+        once, and peak profiles are computed once per distinct
+        (lattice, U, W) combination; rows that differ only in scale or
+        background reuse them. The model itself is left unchanged.
+
+        With a `profile` set, rows are evaluated one by one with pattern()
+        on a copy of the model (size and strain taken from the model).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        P = np.atleast_2d(np.asarray(param_matrix, dtype=np.float64))
+        N = x.size
+
+        if self.profile is not None:
+            model = copy.deepcopy(self)
+            out = np.empty((P.shape[0], N))
+            for i, row in enumerate(P):
+                model.set_param_array(row)
+                out[i] = model.pattern(x)
+            return out
+
+        n_lat = len(self.lattice.param_names())
+        scale, slope, intercept = P[:, n_lat + 2:n_lat + 5].T
+
+        # Peak shapes depend only on lattice + U, W. Rows that differ only
+        # in scale/background (e.g. most finite-difference columns) share
+        # one unit-scale peak sum.
+        shapes, inverse = np.unique(P[:, :n_lat + 2], axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        G = shapes.shape[0]
+        U, W = shapes[:, n_lat], shapes[:, n_lat + 1]
+
+        # Reflection positions for every shape over the shared candidates
+        hkl = hkl_candidates(hkl_max)
+        lattice = copy.deepcopy(self.lattice)
+
+        d_hkls = np.empty((G, len(hkl)))
+        for g in range(G):
+            lattice.set_params(list(shapes[g, :n_lat]))
+            d_hkls[g] = lattice.d_spacings(hkl)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            twotheta = np.degrees(2 * np.arcsin(self.wavelength / (2 * d_hkls)))
+
+        valid = (twotheta > 5) & (twotheta < max_2theta)
+
+        # Only reflections that are in range for at least one shape
+        used = np.flatnonzero(valid.any(axis=0))
+        twotheta, valid = twotheta[:, used], valid[:, used]
+        twotheta[~valid] = 0.0
+
+        intensity = np.zeros_like(twotheta)
+        for g in range(G):
+            cols = np.flatnonzero(valid[g])
+            intensity[g, cols] = self.reflection_intensities(
+                [tuple(hkl[used[c]]) for c in cols], twotheta[g, cols])
+
+        # Extra emission lines: same d-spacings, scaled intensities,
+        # stacked as additional columns
+        wavelengths, ratios = self.emission_lines()
+        if len(wavelengths) > 1:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                arg = wavelengths[:, None, None] / (2 * d_hkls[None, :, used])
+                lines = np.degrees(2 * np.arcsin(np.where(arg <= 1, arg, np.nan)))
+            lines[0] = twotheta
+            line_valid = np.isfinite(lines) & valid[None]
+
+            twotheta = np.concatenate(lines, axis=1)
+            valid = np.concatenate(line_valid, axis=1)
+            intensity = np.concatenate(ratios[:, None, None] * intensity[None], axis=1)
+            twotheta[~valid] = 0.0
+            intensity[~valid] = 0.0
+
+        fwhm = np.sqrt(U[:, None] * np.tan(np.radians(twotheta / 2)) ** 2 + W[:, None])
+        fwhm[~valid] = 1.0
+
+        # Block sizes from the memory budget (~4 live temporaries)
+        dtype = self.profile_dtype()
+        per_elem = 4 * np.dtype(dtype).itemsize
+        n_cols = twotheta.shape[1]
+        K = max(n_cols, 1)
+        k_block = int(min(K, max(1, max_bytes // (N * per_elem))))
+        g_block = int(max(1, max_bytes // (k_block * N * per_elem)))
+
+        unit = np.zeros((G, N))
+
+        for g0 in range(0, G, g_block):
+            rows = slice(g0, g0 + g_block)
+            for k0 in range(0, n_cols, k_block):
+                cols = slice(k0, k0 + k_block)
+
+                prof = self.pseudo_voigt(
+                    x[None, None, :],
+                    twotheta[rows, cols, None],
+                    fwhm[rows, cols, None],
+                    dtype=dtype,
+                )
+                if self.peak_cutoff is not None:
+                    outside = np.abs(x[None, None, :] - twotheta[rows, cols, None]) > \
+                        self.peak_cutoff * fwhm[rows, cols, None]
+                    prof[outside] = 0.0
+                unit[rows] += np.matmul(intensity[rows, None, cols], prof)[:, 0, :]
+
+        return scale[:, None] * unit[inverse] + slope[:, None] * x[None, :] + intercept[:, None]
 
     # ---------------------------------
     # Parameter vector interface
@@ -102,13 +521,7 @@ class PhaseModel:
 
         lattice_params = self.lattice.get_params()
 
-        profile_params = [
-            self.params["U"],
-            self.params["W"],
-            self.params["scale"],
-            self.params["bkg_slope"],
-            self.params["bkg_intercept"]
-        ]
+        profile_params = [self.params[k] for k in self.PROFILE_KEYS]
 
         return np.array(lattice_params + profile_params)
 
@@ -118,11 +531,45 @@ class PhaseModel:
 
         self.lattice.set_params(arr[:n_lat])
 
-        keys = ["U", "W", "scale", "bkg_slope", "bkg_intercept"]
-
-        for i, k in enumerate(keys):
+        for i, k in enumerate(self.PROFILE_KEYS):
             self.params[k] = arr[n_lat + i]
 
+    # ---------------------------------
+    # Single parameter access by name
+    # ---------------------------------
+    def get_param(self, key):
+
+        lat_names = self.lattice.param_names()
+
+        if key in lat_names:
+            return self.lattice.get_params()[lat_names.index(key)]
+
+        return self.params[key]
+
+    def set_param(self, key, value):
+
+        lat_names = self.lattice.param_names()
+
+        if key in lat_names:
+            lat_vals = list(self.lattice.get_params())
+            lat_vals[lat_names.index(key)] = value
+            self.lattice.set_params(lat_vals)
+        else:
+            self.params[key] = value
+
+    def param_bounds(self, key):
+        """
+        (lower, upper) limits of a parameter. Lattice parameters are
+        positive; other parameters are unbounded unless set in self.bounds.
+        """
+        if key in self.bounds:
+            return self.bounds[key]
+
+        if key in self.lattice.param_names():
+            return (0.0, np.inf)
+
+        return (-np.inf, np.inf)
+
     # ---------------------------------
     # Parameter dictionary
     # ---------------------------------
@@ -136,4 +583,12 @@ class PhaseModel:
                 self.lattice.get_params()):
             d[name] = value
 
-        return d
\ No newline at end of file
+        return d
+
+    def esd_dict(self):
+        """
+        Estimated standard deviations of refined parameters,
+        keyed like param_dict(). Parameters never refined are omitted.
+        """
+        d = self.param_dict()
+        return {k: self.esd[k] for k in d if k in self.esd}
@@ -0,0 +1,162 @@
+import numpy as np
+from scipy.sparse import csc_matrix
+
+
+def _tie_terms(spec):
+    """
+    Normalize a tie specification to ({name: coeff}, const).
+
+    Accepted forms:
+        "U"                      → value = U
+        ("U", 2.0)               → value = 2.0 * U
+        ("U", 2.0, 0.1)          → value = 2.0 * U + 0.1
+        {"U": 1.0, "V": -1.0, "const": 0.5}
+    """
+    if isinstance(spec, str):
+        return {spec: 1.0}, 0.0
+
+    if isinstance(spec, dict):
+        terms = {k: float(v) for k, v in spec.items() if k != "const"}
+        return terms, float(spec.get("const", 0.0))
+
+    name, *rest = spec
+    factor = rest[0] if len(rest) > 0 else 1.0
+    offset = rest[1] if len(rest) > 1 else 0.0
+    return {name: float(factor)}, float(offset)
+
+
+class ParameterSet:
+    """
+    Maps named model parameters onto the free vector seen by least_squares.
+
+    Handles three things the solver itself knows nothing about:
+
+        - bounds   : per-parameter (lower, upper) limits, forwarded to
+                     least_squares. Defaults come from model.param_bounds().
+        - ties     : linear constraints `p = sum(c_i * q_i) + const`.
+                     Tied parameters are removed from the free vector and
+                     recomputed from the others on every evaluation.
+        - x_scale  : characteristic magnitude of each free parameter, so the
+                     trust region treats `scale` (~1e3) and `a` (~4) alike.
+
+    Parameters
+    ----------
+    model : PhaseModel
+    keys : list of str
+        Parameters requested for refinement.
+    bounds : dict, optional
+        {name: (lower, upper)} overriding the model defaults.
+    ties : dict, optional
+        {name: spec} merged over model.ties (see _tie_terms for specs).
+    x_scale : "auto", "jac", float, array or dict
+        "auto" uses |x0| (1.0 for zero-valued parameters).
+    """
+
+    def __init__(self, model, keys, bounds=None, ties=None, x_scale="auto"):
+
+        self.model = model
+
+        all_ties = dict(getattr(model, "ties", {}))
+        all_ties.update(ties or {})
+        self.ties = {k: _tie_terms(v) for k, v in all_ties.items()}
+
+        self.keys = list(keys)
+        self.free_keys = [k for k in self.keys if k not in self.ties]
+
+        self.bounds = {k: model.param_bounds(k) for k in self.free_keys}
+        self.user_bounds = {k: v for k, v in (bounds or {}).items() if k in self.bounds}
+        self.bounds.update(self.user_bounds)
+
+        self._x_scale = x_scale
+
+    # ---------------------------------
+    # Vector interface
+    # ---------------------------------
+    def x0(self):
+        x0 = np.array([self.model.get_param(k) for k in self.free_keys], dtype=float)
+        lb, ub = self.solver_bounds()
+        return np.clip(x0, lb, ub)
+
+    def apply(self, x):
+        """
+        Write free values into the model and refresh tied parameters.
+        """
+        for key, value in zip(self.free_keys, x):
+            self.model.set_param(key, value)
+
+        for key, (terms, const) in self.ties.items():
+            value = const + sum(c * self.model.get_param(q) for q, c in terms.items())
+            self.model.set_param(key, value)
+
+    def solver_bounds(self):
+        lb = np.array([self.bounds[k][0] for k in self.free_keys], dtype=float)
+        ub = np.array([self.bounds[k][1] for k in self.free_keys], dtype=float)
+        return lb, ub
+
+    def check_unbounded(self, method):
+        """
+        Raise if the caller set finite bounds that `method` (e.g. "lm",
+        which has no bound support) would have to ignore. The model's
+        default bounds are dropped silently for such methods.
+        """
+        for key, (lower, upper) in self.user_bounds.items():
+            if np.isfinite(lower) or np.isfinite(upper):
+                raise ValueError(f"method={method!r} does not support bounds, "
+                                 f"but {key} is bounded to ({lower}, {upper}).")
+
+    def x_scale(self, x0):
+        xs = self._x_scale
+
+        if isinstance(xs, str):
+            if xs == "auto":
+                mag = np.abs(np.asarray(x0, dtype=float))
+                return np.where(mag > 0, mag, 1.0)
+            return xs
+
+        if isinstance(xs, dict):
+            return np.array([xs.get(k, 1.0) for k in self.free_keys], dtype=float)
+
+        return xs
+
+    def jac_sparsity(self, x, pad=0.0):
+        """
+        Sparsity pattern of the residual Jacobian over the free parameters,
+        or None if the model's Jacobian is dense. A free parameter also
+        reaches every point its tied dependents touch. `pad` widens the
+        peak windows (see PhaseModel.param_support).
+        """
+        sparsity = self.model.jac_sparsity(x, self.free_keys, pad)
+
+        if sparsity is None or not self.ties:
+            return sparsity
+
+        cols = []
+        for key in self.free_keys:
+            mask = self.model.param_support(key, x, pad)
+            for dep, (terms, _) in self.ties.items():
+                if key in terms:
+                    mask = mask | self.model.param_support(dep, x, pad)
+            cols.append(mask)
+
+        return csc_matrix(np.column_stack(cols).astype(np.int8))
+
+    # ---------------------------------
+    # Uncertainty propagation to ties
+    # ---------------------------------
+    def tied_esd(self, cov):
+        """
+        ESDs of tied parameters that depend only on refined parameters,
+        propagated from the free-parameter covariance.
+        """
+        index = {k: i for i, k in enumerate(self.free_keys)}
+        esd = {}
+
+        for key, (terms, _) in self.ties.items():
+            if not all(q in index for q in terms):
+                continue
+            c = np.zeros(len(self.free_keys))
+            for q, coeff in terms.items():
+                c[index[q]] = coeff
+            esd[key] = float(np.sqrt(max(c @ cov @ c, 0.0)))
+
+        return esd
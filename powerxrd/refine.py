@@ -1,75 +1,274 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from scipy.ndimage import median_filter
 from scipy.optimize import least_squares
 
 from powerxrd.lattice import CubicLattice
 from powerxrd.model import PhaseModel
+from powerxrd.parameters import ParameterSet
 
 
-def selective_objective(x, model, refine_keys, x_exp, y_exp):
+def selective_objective(x, model, refine_keys, x_exp, y_exp, params=None):
     """
     Updates lattice and profile parameters correctly.
+
+    If a ParameterSet is given, x holds its free parameters and
+    tied parameters are refreshed from them.
     """
 
-    lat_names = model.lattice.param_names()
+    if params is not None:
+        params.apply(x)
+    else:
+        for key, value in zip(refine_keys, x):
+            model.set_param(key, value)
 
-    # Current lattice + profile values
-    lat_vals = model.lattice.get_params()
+    y_calc = model.pattern(x_exp)
+    return y_exp - y_calc
 
-    # Update according to refine_keys
-    for i, key in enumerate(refine_keys):
-        if key in lat_names:
-            idx = lat_names.index(key)
-            lat_vals[idx] = x[i]
-        else:
-            model.params[key] = x[i]
 
-    # Apply updated lattice params
-    model.lattice.set_params(lat_vals)
+# Robust losses of least_squares; residuals beyond about f_scale are
+# down-weighted (soft_l1, huber) or strongly suppressed (cauchy, arctan)
+ROBUST_LOSSES = ("linear", "soft_l1", "huber", "cauchy", "arctan")
 
-    y_calc = model.pattern(x_exp)
-    return y_exp - y_calc
+# f_scale="auto" sets f_scale to this many noise standard deviations
+ROBUST_SCALE = 3.0
 
+# The Jacobian sparsity pattern is built from the starting peak windows,
+# widened by this fraction of their half-width on each side so that peaks
+# shifted or broadened during the fit stay inside it
+SPARSITY_PAD = 1.0
 
-def refine(model, x_exp, y_exp, refine_keys, print_stage=True, save_params=None):
 
-    # Build initial parameter vector in correct order
-    x0 = []
+def noise_level(y):
+    """
+    Robust estimate of the point-to-point noise standard deviation of a
+    pattern (or of each row of a stack), from the median absolute
+    deviation of first differences. Peaks and zingers barely affect it.
+    """
+    d = np.diff(np.asarray(y, dtype=float), axis=-1)
+    mad = np.median(np.abs(d - np.median(d, axis=-1, keepdims=True)), axis=-1)
+    return 1.4826 * mad / np.sqrt(2)
+
+
+def spike_mask(y, size=5, threshold=6.0, rel=0.5):
+    """
+    Mask of spikes (zingers, hot or dead pixels) in a pattern or in each
+    row of a (n_scans, n_points) stack.
+
+    A point is a spike when it differs from the running median of `size`
+    points by more than `threshold` noise standard deviations (see
+    noise_level) and by more than `rel` times the median itself. Bragg
+    peaks a few points wide follow the running median closely and are
+    kept; isolated one- or two-point outliers are not.
+
+    Returns
+    -------
+    numpy array of bool
+        True at spikes, same shape as y.
+    """
+    y = np.asarray(y, dtype=float)
+    filt = (1,) * (y.ndim - 1) + (size,)
+    med = median_filter(y, size=filt, mode="nearest")
+
+    r = np.abs(y - med)
+    sigma = noise_level(y)[..., None] if y.ndim > 1 else noise_level(y)
+    return (r > threshold * sigma) & (r > rel * np.abs(med))
+
+
+def estimate_uncertainties(result, refine_keys, corr_threshold=0.9):
+    """
+    Estimated standard deviations and correlations from the solver Jacobian.
+
+    Uses the Jacobian and residuals that least_squares already holds at the
+    solution, so no extra pattern evaluations are needed:
+
+        cov = (J^T J)^-1 * sum(r^2) / (N - P)
+
+    r is the raw residual result.fun. With a robust loss, result.jac is
+    loss-weighted; refine then passes a result holding the raw Jacobian.
+
+    Parameters
+    ----------
+    result : OptimizeResult
+        Result object from scipy.optimize.least_squares.
+    refine_keys : list of str
+        Parameter names in the order of result.x.
+    corr_threshold : float
+        Absolute correlation above which a parameter pair is flagged.
+
+    Returns
+    -------
+    esd : dict
+        Estimated standard deviation per parameter.
+    cov : numpy array
+        (P, P) covariance matrix in refine_keys order.
+    corr : numpy array
+        (P, P) correlation matrix in refine_keys order.
+    flagged : list of (str, str, float)
+        Highly correlated parameter pairs.
+    """
+
+    J = result.jac
+    if hasattr(J, "toarray"):
+        J = J.toarray()
+
+    n_obs, n_par = J.shape
+    dof = max(n_obs - n_par, 1)
+
+    # result.fun holds the raw residuals, also for a robust loss
+    residual = np.asarray(result.fun, dtype=float)
+    chi2_red = float(residual @ residual) / dof
+    cov = np.linalg.pinv(J.T @ J) * chi2_red
+
+    esd_arr = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(esd_arr, esd_arr)
+    np.fill_diagonal(corr, 1.0)
+
+    esd = {key: float(esd_arr[i]) for i, key in enumerate(refine_keys)}
 
-    lat_names = model.lattice.param_names()
+    iu, ju = np.triu_indices(n_par, k=1)
+    hits = np.abs(corr[iu, ju]) >= corr_threshold
+    flagged = [
+        (refine_keys[i], refine_keys[j], float(corr[i, j]))
+        for i, j in zip(iu[hits], ju[hits])
+    ]
 
-    for key in refine_keys:
-        if key in lat_names:
-            idx = lat_names.index(key)
-            x0.append(model.lattice.get_params()[idx])
-        else:
-            x0.append(model.params[key])
+    return esd, cov, corr, flagged
 
-    x0 = np.array(x0)
+
+def refine(model, x_exp, y_exp, refine_keys, print_stage=True, save_params=None,
+           corr_threshold=0.9, bounds=None, ties=None, x_scale="auto", loss="linear",
+           f_scale="auto", exclude=None, **lsq_kwargs):
+    """
+    Least-squares refinement of the selected model parameters.
+
+    Parameters
+    ----------
+    bounds : dict, optional
+        {name: (lower, upper)} overriding model.param_bounds().
+    ties : dict, optional
+        Linear ties {name: spec} added to model.ties, e.g. {"W": "U"}
+        or {"W": ("U", 0.5, 0.001)}. Tied parameters are not free.
+    x_scale : "auto", "jac", float, array or dict
+        Characteristic parameter magnitudes for the trust-region solver.
+    loss : str
+        "linear" (plain least squares) or a robust loss ("soft_l1",
+        "huber", "cauchy", "arctan") that limits the pull of outliers
+        such as impurity peaks.
+    f_scale : float or "auto"
+        Residual scale (intensity units) where the robust loss sets in;
+        "auto" uses ROBUST_SCALE times the noise level of y_exp.
+    exclude : array of bool, optional
+        Points left out of the fit, e.g. from spike_mask.
+
+    A robust refinement is warm-started from the plain least-squares
+    solution within the same call: far from the minimum, where most
+    residuals exceed f_scale, the trust-region solver would otherwise
+    crawl with very short steps. result.nfev counts both solves. Its
+    ESDs come from the raw residuals and Jacobian at the solution, like
+    those of a plain fit, not from the loss-weighted result.jac.
+
+    When the model truncates its peaks (model.peak_cutoff), the Jacobian
+    sparsity pattern from the peak windows (padded by SPARSITY_PAD) is
+    passed to the solver, so finite differences only touch the nonzero
+    entries. method="lm" accepts neither bounds nor a sparsity pattern:
+    it runs without the model's default bounds and with a dense
+    Jacobian, and finite `bounds` given here raise ValueError.
+
+    Extra keyword arguments (ftol, xtol, max_nfev, ...) are forwarded to
+    scipy.optimize.least_squares.
+    """
+
+    if loss not in ROBUST_LOSSES:
+        raise ValueError(f"Unknown loss: {loss}")
+
+    if exclude is not None:
+        keep = ~np.asarray(exclude, dtype=bool)
+        x_exp, y_exp = np.asarray(x_exp)[keep], np.asarray(y_exp)[keep]
+
+    if f_scale == "auto":
+        f_scale = max(ROBUST_SCALE * float(noise_level(y_exp)), np.finfo(float).tiny) \
+            if loss != "linear" else 1.0
+
+    params = ParameterSet(model, refine_keys, bounds=bounds, ties=ties, x_scale=x_scale)
+    free_keys = params.free_keys
+
+    if not free_keys:
+        raise ValueError(f"No free parameters left to refine in {refine_keys} (all are tied).")
+
+    # Build initial parameter vector in correct order
+    x0 = params.x0()
 
     if print_stage:
-        print("\nRefining:", refine_keys)
+        print("\nRefining:", free_keys)
         print("Initial:", x0)
 
-    result = least_squares(
-        selective_objective,
-        x0,
-        args=(model, refine_keys, x_exp, y_exp)
+    solver_kwargs = dict(
+        args=(model, free_keys, x_exp, y_exp, params),
+        x_scale=params.x_scale(x0),
+        **lsq_kwargs
     )
+    if lsq_kwargs.get("method") == "lm":
+        params.check_unbounded("lm")
+    else:
+        solver_kwargs["bounds"] = params.solver_bounds()
+        solver_kwargs["jac_sparsity"] = params.jac_sparsity(x_exp, SPARSITY_PAD)
+
+    nfev = 0
+    if loss != "linear":
+        start = least_squares(selective_objective, x0, **solver_kwargs)
+        x0, nfev = start.x, start.nfev
+
+    result = least_squares(selective_objective, x0, loss=loss, f_scale=f_scale, **solver_kwargs)
+    result.nfev += nfev
+
+    # A robust loss reweights result.jac, so the ESDs would no longer match
+    # the reported residuals: evaluate the raw Jacobian at the solution
+    # (a plain solve stopped after its first evaluation does not step)
+    raw = result
+    if loss != "linear":
+        raw = least_squares(selective_objective, result.x, **{**solver_kwargs, "max_nfev": 1})
 
     # Final update
-    selective_objective(result.x, model, refine_keys, x_exp, y_exp)
+    selective_objective(result.x, model, free_keys, x_exp, y_exp, params)
+
+    esd, cov, corr, flagged = estimate_uncertainties(raw, free_keys, corr_threshold)
+    esd.update(params.tied_esd(cov))
+
+    result.esd = esd
+    result.covariance = cov
+    result.correlation = corr
+    result.correlated_pairs = flagged
+    model.esd.update(esd)
 
     if print_stage:
         print("Refined:", result.x)
+        print("ESD:", esd)
+        for k1, k2, r in flagged:
+            print(f"Warning: {k1} and {k2} are highly correlated (r = {r:+.3f})")
         print("Current params:", model.param_dict())
 
     if save_params is not None:
-        save_params.append(model.param_dict())
+        snapshot = model.param_dict()
+        snapshot["esd"] = dict(esd)
+        snapshot["correlated"] = [list(pair) for pair in flagged]
+        save_params.append(snapshot)
 
     return result
 
 
+def fit_statistics(y_exp, y_fit):
+    """
+    Unweighted profile R-factors (in %) of a fit: returns (Rwp, Rp).
+    """
+    residual = y_exp - y_fit
+    Rwp = 100 * np.sqrt(np.sum(residual**2) / np.sum(y_exp**2))
+    Rp = 100 * np.sum(np.abs(residual)) / np.sum(np.abs(y_exp))
+    return Rwp, Rp
+
+
 def load_data(filepath=None):
 
     if filepath is None:
@@ -93,9 +292,7 @@ def plot_fit(model, x_exp, y_exp, y_fit):
     plt.title('Minimal Rietveld Refinement')
     plt.show()
 
-    residual = y_exp - y_fit
-    Rwp = 100 * np.sqrt(np.sum(residual**2) / np.sum(y_exp**2))
-    Rp = 100 * np.sum(np.abs(residual)) / np.sum(np.abs(y_exp))
+    Rwp, Rp = fit_statistics(y_exp, y_fit)
 
     print(f"Rwp: {Rwp:.2f}%, Rp: {Rp:.2f}%")
     print("Refined parameters:", model.param_dict())
\ No newline at end of file
@@ -0,0 +1,351 @@
+import asyncio
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from . import kernels
+from .batch import build_model, load_recipe, preprocess, recipe_setup
+from .chart import Chart
+from .checkpoint import Checkpoint
+from .sharedstore import DatasetHandle, resolve
+from .workflow import RefinementWorkflow
+
+
+@dataclass
+class RefinementEvent:
+    """
+    Progress notification of a RefinementService job.
+
+    kind is one of "queued", "started", "stage" (one stage run or skip
+    finished; `record` holds its plan record), "done" (`result` holds the
+    final parameters and Rwp), "failed" (`error`) or "cancelled".
+    """
+    job_id: str
+    kind: str
+    record: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class InlineExecutor(Executor):
+    """
+    Executor that runs every task immediately in the calling thread.
+
+    A local stand-in for the process pool in tests and notebooks: same
+    interface, no pickling, no subprocesses (the event loop is blocked
+    while a stage runs).
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+# ---------------------------------
+# Pool tasks (module level, picklable)
+#
+# Tasks may run in threads, so they are quiet by construction
+# (print_stage=False, no plotting) instead of redirecting sys.stdout.
+# ---------------------------------
+
+# Workflows of running jobs in this (worker) process, by job key, least
+# recently used first: consecutive stages of a job that land here reuse
+# the preprocessed scan, the model and its cached reflections. A stage
+# running elsewhere rebuilds the workflow from its checkpoint.
+_RESIDENT: "OrderedDict[str, tuple[RefinementWorkflow, int]]" = OrderedDict()
+_RESIDENT_LOCK = threading.Lock()
+MAX_RESIDENT = 16
+
+
+def _scan(recipe, data):
+    """
+    Preprocessed (x, y) of a job's scan: an (x, y) pair or a DatasetHandle,
+    which is mapped from shared memory instead of being sent by value.
+    """
+    x, y = resolve(data)
+    chart = preprocess(Chart(np.asarray(x, dtype=float), np.asarray(y, dtype=float)),
+                       recipe.get("preprocess"))
+    return chart.x, chart.y
+
+
+def _workflow(recipe, data):
+    return RefinementWorkflow(build_model(recipe.get("model")), *_scan(recipe, data),
+                              setup=recipe_setup(recipe))
+
+
+def _keep(key, rw, step):
+    with _RESIDENT_LOCK:
+        _RESIDENT[key] = (rw, step)
+        _RESIDENT.move_to_end(key)
+        while len(_RESIDENT) > MAX_RESIDENT:
+            _RESIDENT.popitem(last=False)
+
+
+def _start_task(recipe, data, key):
+    """
+    Checkpoint at the start of the plan.
+    """
+    rw = _workflow(recipe, data)
+    state = rw.plan_state(recipe["plan"])
+    _keep(key, rw, 0)
+
+    state["history"] = rw.history
+    return Checkpoint.from_model(rw.model, state=state)
+
+
+def _stage_task(recipe, data, ckpt, key):
+    """
+    Run one stage step of the plan from `ckpt` and return (record, new checkpoint).
+    """
+    state = dict(ckpt.state)
+    history = state.pop("history")
+    step = len(state["records"])
+
+    with _RESIDENT_LOCK:
+        rw, resident_step = _RESIDENT.pop(key, (None, None))
+
+    # The resident workflow is current if it ran the previous step
+    if rw is None or resident_step != step:
+        rw = _workflow(recipe, data)
+        ckpt.apply(rw.model)
+        rw.history = history
+
+    record, result = rw.plan_step(recipe["plan"], state, print_stage=False)
+    if record is not None:
+        _keep(key, rw, step + 1)
+
+    state["history"] = rw.history
+    return record, Checkpoint.from_model(rw.model, state=state, result=result)
+
+
+class RefinementService:
+    """
+    Asyncio front end that refines scans as they arrive.
+
+    Scans are submitted with `await service.submit(x, y)`. At most
+    `max_pending` jobs wait in the queue; further submits wait for room,
+    which applies backpressure to the producer instead of buffering
+    without limit. `workers` jobs run concurrently, each scheduled on the
+    executor one plan stage at a time, so the event loop never blocks on
+    a refinement (unless an InlineExecutor is used), progress is reported
+    per stage and a cancelled job stops at the next stage boundary.
+
+    Example:
+
+        async with RefinementService(recipe, workers=4) as service:
+            job = await service.submit(x, y)
+            async for event in service.events():
+                print(event.job_id, event.kind, event.record)
+
+    Parameters
+    ----------
+    recipe : dict or str
+        Refinement recipe as for the batch runner (see
+        powerxrd.batch.load_recipe): plan plus optional model and
+        preprocessing.
+    workers : int
+        Jobs refined concurrently (and process pool size when no
+        executor is given).
+    max_pending : int
+        Capacity of the job queue.
+    max_events : int
+        Capacity of the event stream. When events are not consumed, the
+        oldest are dropped beyond this (final results stay in `results`).
+    executor : concurrent.futures.Executor, optional
+        Where stage tasks run. Defaults to a ProcessPoolExecutor owned by
+        the service; pass InlineExecutor() or a ThreadPoolExecutor to run
+        in-process.
+    store : SharedDatasetStore, optional
+        Store of submitted DatasetHandles. The service holds a reference
+        to each submitted dataset until its job ends.
+    """
+
+    def __init__(self, recipe, workers=2, max_pending=8, executor=None, store=None,
+                 max_events=1000):
+
+        self.recipe = load_recipe(recipe)
+        if "plan" not in self.recipe:
+            raise ValueError("RefinementService needs a refinement plan recipe.")
+
+        self.workers = workers
+        self.max_pending = max_pending
+
+        self._executor = executor
+        self._owns_executor = executor is None
+        self.store = store
+
+        self._jobs = asyncio.Queue(maxsize=max_pending)
+        self._events = asyncio.Queue(maxsize=max_events)
+        self._tasks = []
+        self._cancelled = set()
+        self._ids = itertools.count()
+        self._closed = False
+
+        # Final {params..., "Rwp": ...} per finished job
+        self.results = {}
+
+    # ---------------------------------
+    # Lifecycle
+    # ---------------------------------
+    async def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=kernels.pool_context())
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def close(self, cancel_pending=False):
+        """
+        Stop accepting scans, finish (or with cancel_pending, cancel) the
+        queued jobs, then end the event stream and release the pool.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        if cancel_pending:
+            while not self._jobs.empty():
+                job_id, data = self._jobs.get_nowait()
+                self._release(data)
+                self._jobs.task_done()
+                self._emit(job_id, "cancelled")
+
+        await self._jobs.join()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        # End of stream marker for events()
+        self._put_event(None)
+
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close(cancel_pending=exc_type is not None)
+
+    # ---------------------------------
+    # Jobs
+    # ---------------------------------
+    async def submit(self, x, y=None, job_id=None):
+        """
+        Queue a scan for refinement and return its job id. Waits while
+        the queue is full.
+
+        The scan is given as x, y arrays, or as a single DatasetHandle
+        (x) so workers map it from shared memory instead of receiving a
+        pickled copy at every stage.
+        """
+        if self._closed:
+            raise RuntimeError("RefinementService is closed.")
+
+        if isinstance(x, DatasetHandle):
+            data = x
+            if self.store is not None:
+                self.store.acquire(x)
+        else:
+            data = (x, y)
+
+        job_id = job_id if job_id is not None else f"job-{next(self._ids)}"
+        try:
+            await self._jobs.put((job_id, data))
+        except BaseException:
+            self._release(data)
+            raise
+        self._emit(job_id, "queued")
+        return job_id
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job is dropped when it reaches a worker; a
+        running job stops after its current stage.
+        """
+        self._cancelled.add(job_id)
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    async def events(self):
+        """
+        Async iterator over RefinementEvents, ending after close().
+        """
+        while True:
+            event = await self._events.get()
+            if event is None:
+                # Leave the marker for any other consumer
+                self._put_event(None)
+                return
+            yield event
+
+    # ---------------------------------
+    # Internals
+    # ---------------------------------
+    def _release(self, data):
+        if isinstance(data, DatasetHandle) and self.store is not None:
+            self.store.release(data)
+
+    def _emit(self, job_id, kind, **fields):
+        self._put_event(RefinementEvent(job_id, kind, **fields))
+
+    def _put_event(self, event):
+        # Drop the oldest event rather than block the workers
+        if self._events.full():
+            self._events.get_nowait()
+        self._events.put_nowait(event)
+
+    async def _run_in_pool(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _worker(self):
+        while True:
+            job_id, data = await self._jobs.get()
+            try:
+                await self._run_job(job_id, data)
+            except asyncio.CancelledError:
+                self._emit(job_id, "cancelled")
+                raise
+            except Exception as e:
+                self._emit(job_id, "failed", error=f"{type(e).__name__}: {e}")
+            finally:
+                self._release(data)
+                self._cancelled.discard(job_id)
+                self._jobs.task_done()
+
+    async def _run_job(self, job_id, data):
+        if job_id in self._cancelled:
+            self._emit(job_id, "cancelled")
+            return
+
+        self._emit(job_id, "started")
+        key = uuid.uuid4().hex
+        ckpt = await self._run_in_pool(_start_task, self.recipe, data, key)
+
+        while True:
+            if job_id in self._cancelled:
+                self._emit(job_id, "cancelled")
+                return
+
+            record, ckpt = await self._run_in_pool(_stage_task, self.recipe, data, ckpt, key)
+            if record is None:
+                break
+            self._emit(job_id, "stage", record=record)
+
+        result = dict(ckpt.params)
+        result["Rwp"] = ckpt.state["rwp"]
+        self.results[job_id] = result
+        self._emit(job_id, "done", result=result)
@@ -0,0 +1,270 @@
+import ctypes
+import os
+import sys
+import uuid
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class DatasetHandle:
+    """
+    Picklable reference to a scan held in a SharedDatasetStore.
+
+    Only the block name, shape and dtype travel to a worker; the data is
+    mapped, not copied (see attach).
+    """
+    key: str
+    name: str
+    n_points: int
+    dtype: str = "float64"
+
+
+# Every block starts with a header whose first byte is 1 while the owning
+# store holds the dataset; the (2, N) data follow at HEADER_BYTES.
+HEADER_BYTES = 64
+
+
+class _Mapping:
+    """
+    A mapped SharedMemory block handing out NumPy views.
+
+    NumPy does not hold a buffer export on memory it wraps, so closing
+    the SharedMemory would unmap it under live arrays. Every array from
+    `array()` therefore references this object (and through it the
+    SharedMemory), and SharedMemory.close() runs once the mapping and
+    the last view are gone.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.address = np.frombuffer(shm.buf, dtype=np.uint8).ctypes.data
+        weakref.finalize(self, shm.close)
+
+    def array(self, shape, dtype, readonly=True):
+        return np.asarray(_View(self, {
+            "shape": tuple(shape),
+            "typestr": np.dtype(dtype).str,
+            "data": (self.address + HEADER_BYTES, readonly),
+            "version": 3,
+        }))
+
+    @property
+    def live(self):
+        return bool(ctypes.c_uint8.from_address(self.address).value)
+
+    @live.setter
+    def live(self, value):
+        ctypes.c_uint8.from_address(self.address).value = int(value)
+
+
+# Mappings of blocks created by stores in this process, by block name.
+# Forked workers inherit these entries together with the mappings, and
+# drop them like _MAPPED entries once the owner releases the block.
+_OWNED: dict[str, _Mapping] = {}
+
+# Mappings of blocks attached by name (e.g. in spawned workers), least
+# recently used first; only the newest MAX_MAPPED are kept referenced,
+# and blocks their owner has released are dropped on the next attach.
+_MAPPED: "OrderedDict[str, _Mapping]" = OrderedDict()
+MAX_MAPPED = 64
+
+
+class _View:
+    # Array-interface owner: the base of arrays from _Mapping.array
+    def __init__(self, mapping, interface):
+        self.mapping = mapping
+        self.__array_interface__ = interface
+
+
+def _attach_block(name):
+    """
+    SharedMemory attached by name without registering it with this
+    process's resource tracker: the creating store owns the block, and a
+    tracked attach would make spawned workers unlink it (or warn about a
+    leak) when they exit.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        resource_tracker.unregister("/" + shm.name, "shared_memory")
+    return shm
+
+
+def _unlink_block(shm):
+    """
+    Unlink a block created by this process.
+
+    Before 3.13, workers sharing this process's resource tracker (spawned
+    or forkserver children) drop its registration when they detach, so
+    it is renewed first and unlink's own unregister stays balanced.
+    """
+    if sys.version_info < (3, 13) and os.name == "posix":
+        resource_tracker.register("/" + shm.name, "shared_memory")
+    shm.unlink()
+
+
+def _open_block(name):
+    # Let go of blocks released by their owner, including entries a forked
+    # worker inherited (views still held keep their own mapping alive)
+    for mappings in (_OWNED, _MAPPED):
+        for other in [n for n, m in mappings.items() if not m.live]:
+            del mappings[other]
+
+    if name in _OWNED:
+        return _OWNED[name]
+
+    if name in _MAPPED:
+        _MAPPED.move_to_end(name)
+        return _MAPPED[name]
+
+    _MAPPED[name] = _Mapping(_attach_block(name))
+    while len(_MAPPED) > MAX_MAPPED:
+        _MAPPED.popitem(last=False)
+
+    return _MAPPED[name]
+
+
+def attach(handle):
+    """
+    Zero-copy read-only (x, y) views of a stored scan.
+
+    Works in the owning process and in any worker process while the
+    dataset is still referenced in the store. The mapping is reused for
+    later calls with the same handle.
+    """
+    data = _open_block(handle.name).array((2, handle.n_points), handle.dtype)
+    return data[0], data[1]
+
+
+def resolve(data):
+    """
+    (x, y) arrays from either a DatasetHandle or an (x, y) pair.
+    """
+    if isinstance(data, DatasetHandle):
+        return attach(data)
+    x, y = data
+    return x, y
+
+
+class SharedDatasetStore:
+    """
+    Scans stored once in shared memory and handed to workers by handle.
+
+    Each dataset lives in its own `multiprocessing.shared_memory` block
+    holding a (2, N) float64 array of x and y. Workers receive a small
+    DatasetHandle instead of pickled arrays and map the block with
+    `attach`, getting NumPy views without copying.
+
+    Datasets are reference counted: `put` (or `Data.load_into`) returns a
+    handle holding one reference, `acquire`/`release` add and drop
+    references (e.g. one per queued job), and the block is unlinked when
+    the count reaches zero. `close()` (or leaving a `with` block) unlinks
+    everything still held.
+
+    Example:
+
+        with SharedDatasetStore() as store:
+            handles = [Data(f).load_into(store) for f in files]
+            run_batch(handles, recipe, workers=8)
+    """
+
+    def __init__(self):
+        self._blocks = {}   # key -> SharedMemory
+        self._handles = {}  # key -> DatasetHandle
+        self._refs = {}     # key -> reference count
+
+    def put(self, x, y, key=None):
+        """
+        Copy a scan into shared memory and return its handle.
+        A key already in the store gains a reference instead.
+        """
+        if key is not None and key in self._handles:
+            return self.acquire(key)
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.shape != y.shape or x.ndim != 1:
+            raise ValueError("x and y must be 1-D arrays of the same length.")
+
+        key = key if key is not None else uuid.uuid4().hex
+        shm = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + 2 * x.nbytes)
+
+        data = np.ndarray((2, x.size), dtype=np.float64, buffer=shm.buf, offset=HEADER_BYTES)
+        data[0] = x
+        data[1] = y
+
+        handle = DatasetHandle(key, shm.name, x.size)
+        self._blocks[key] = shm
+        self._handles[key] = handle
+        self._refs[key] = 1
+        _OWNED[shm.name] = _Mapping(shm)
+        _OWNED[shm.name].live = True
+        return handle
+
+    def handle(self, key):
+        return self._handles[key]
+
+    def get(self, key):
+        """
+        Read-only (x, y) views of a stored scan.
+        """
+        return attach(self._handles[_key(key)])
+
+    def acquire(self, key):
+        key = _key(key)
+        self._refs[key] += 1
+        return self._handles[key]
+
+    def release(self, key):
+        """
+        Drop one reference; the block is freed when none are left.
+        """
+        key = _key(key)
+        self._refs[key] -= 1
+        if self._refs[key] <= 0:
+            self._free(key)
+
+    def refcount(self, key):
+        return self._refs.get(_key(key), 0)
+
+    def keys(self):
+        return list(self._handles)
+
+    def __contains__(self, key):
+        return _key(key) in self._handles
+
+    def __len__(self):
+        return len(self._handles)
+
+    def _free(self, key):
+        shm = self._blocks.pop(key)
+        del self._handles[key], self._refs[key]
+        mapping = _OWNED.pop(shm.name, None)
+        if mapping is not None:
+            # Workers drop their mappings of the block on their next attach
+            mapping.live = False
+
+        # The name is removed now; the mapping is closed with the last
+        # view (arrays still held by callers keep it alive)
+        _unlink_block(shm)
+
+    def close(self):
+        for key in list(self._blocks):
+            self._free(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _key(key_or_handle):
+    return key_or_handle.key if isinstance(key_or_handle, DatasetHandle) else key_or_handle
@@ -0,0 +1,154 @@
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+
+@dataclass
+class SizeStrainResult:
+    """
+    Crystallite size and microstrain from a linearized line-broadening plot.
+
+    Every field is an array with one entry per scan (shape (M,)), so the
+    results of thousands of scans can be tabulated directly, e.g.
+    `pandas.DataFrame(result.to_dict())`.
+    """
+    method: str
+    size: np.ndarray        # crystallite size, units of the wavelength
+    strain: np.ndarray      # microstrain ε (dimensionless)
+    slope: np.ndarray
+    intercept: np.ndarray
+    r2: np.ndarray
+    n_peaks: np.ndarray
+
+    def to_dict(self):
+        d = asdict(self)
+        d["method"] = np.full(len(self.size), self.method)
+        return d
+
+
+def caglioti_fit(twotheta, fwhm):
+    """
+    Least-squares Caglioti coefficients (U, V, W) of a line-width standard,
+    from FWHM² = U tan²θ + V tanθ + W. Angles and widths in degrees.
+    """
+    t = np.tan(np.radians(np.asarray(twotheta, dtype=float) / 2))
+    A = np.column_stack([t ** 2, t, np.ones_like(t)])
+    coeffs, *_ = np.linalg.lstsq(A, np.asarray(fwhm, dtype=float) ** 2, rcond=None)
+    return coeffs
+
+
+def instrument_fwhm(twotheta, standard):
+    """
+    Instrumental FWHM (deg) at `twotheta`.
+
+    `standard` is a scalar width, a (U, V, W) triple, or a pair of arrays
+    (twotheta_std, fwhm_std) measured on a line-width standard such as
+    LaB6, which is fitted with caglioti_fit.
+    """
+    if np.ndim(standard) == 0:
+        return np.full(np.shape(twotheta), float(standard))
+
+    if len(standard) == 2:
+        standard = caglioti_fit(*standard)
+
+    U, V, W = standard
+    t = np.tan(np.radians(np.asarray(twotheta, dtype=float) / 2))
+    return np.sqrt(np.clip(U * t ** 2 + V * t + W, 0.0, None))
+
+
+def sample_broadening(fwhm, fwhm_inst, correction="quadratic"):
+    """
+    Sample contribution to the observed width: "quadratic" for Gaussian
+    peaks (β² = B² − b²), "linear" for Lorentzian peaks (β = B − b).
+    Widths narrower than the instrument give NaN.
+    """
+    fwhm = np.asarray(fwhm, dtype=float)
+
+    if correction == "quadratic":
+        diff = fwhm ** 2 - fwhm_inst ** 2
+        with np.errstate(invalid="ignore"):
+            return np.sqrt(np.where(diff > 0, diff, np.nan))
+    if correction == "linear":
+        diff = fwhm - fwhm_inst
+        return np.where(diff > 0, diff, np.nan)
+
+    raise ValueError(f"Unknown correction: {correction}")
+
+
+def _linear_fit(x, y):
+    """
+    Ordinary least squares y = slope * x + intercept along the last axis,
+    skipping NaN entries (ragged peak lists padded with NaN).
+    """
+    w = np.isfinite(x) & np.isfinite(y)
+    x = np.where(w, x, 0.0)
+    y = np.where(w, y, 0.0)
+
+    n = w.sum(axis=-1)
+    sx, sy = x.sum(axis=-1), y.sum(axis=-1)
+    sxx, sxy, syy = (x * x).sum(axis=-1), (x * y).sum(axis=-1), (y * y).sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+        intercept = (sy - slope * sx) / n
+        r2 = (n * sxy - sx * sy) ** 2 / ((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+
+    slope[n < 2] = np.nan
+    intercept[n < 2] = np.nan
+    return slope, intercept, r2, n
+
+
+def size_strain(twotheta, fwhm, wavelength=0.15406, K=0.9, standard=None,
+                correction="quadratic", method="wh"):
+    """
+    Crystallite size and microstrain of one or many scans.
+
+    Parameters
+    ----------
+    twotheta, fwhm : array (P,) or (M, P)
+        Peak positions and observed FWHMs in degrees; one row per scan.
+        Rows with fewer peaks are padded with NaN.
+    wavelength : float
+        X-ray wavelength; the size comes out in the same units (nm default).
+    K : float
+        Scherrer shape factor.
+    standard : None, float, (U, V, W) or (twotheta_std, fwhm_std)
+        Instrumental broadening to remove, see instrument_fwhm.
+    correction : "quadratic" or "linear"
+        See sample_broadening.
+    method : "wh" or "ssp"
+        "wh"  Williamson–Hall:   β cosθ = Kλ/D + 4ε sinθ
+        "ssp" size–strain plot: (d β cosθ)² = (K/D) d² β cosθ + (ε/2)²
+
+    Returns
+    -------
+    SizeStrainResult
+        All scans are fitted at once as one vectorized linear regression.
+    """
+    tt = np.atleast_2d(np.asarray(twotheta, dtype=float))
+    B = np.atleast_2d(np.asarray(fwhm, dtype=float))
+
+    if standard is not None:
+        B = sample_broadening(B, instrument_fwhm(tt, standard), correction)
+
+    theta = np.radians(tt / 2)
+    beta = np.radians(B)
+
+    if method == "wh":
+        slope, intercept, r2, n = _linear_fit(4 * np.sin(theta), beta * np.cos(theta))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            size = K * wavelength / intercept
+        strain = slope
+
+    elif method == "ssp":
+        d = wavelength / (2 * np.sin(theta))
+        slope, intercept, r2, n = _linear_fit(d ** 2 * beta * np.cos(theta),
+                                              (d * beta * np.cos(theta)) ** 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            size = K / slope
+        strain = 2 * np.sqrt(np.clip(intercept, 0.0, None))
+
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    return SizeStrainResult(method, size, strain, slope, intercept, r2, n)
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class XraySource:
+    """
+    Multi-line X-ray source: emission wavelengths (Å) with intensity ratios.
+
+    The first line is the primary line; reflection lists are generated
+    for it and every other line's peak positions are derived from the same
+    d-spacings.
+
+    Example:
+
+        source = XraySource.cu_ka12()          # Kα1 + Kα2 (ratio 0.5)
+        model = PhaseModel(lattice=CubicLattice(a=4.0), wavelength=source)
+    """
+
+    # Bearden (1967) Kα1 / Kα2 wavelengths in Å
+    K_ALPHA = {
+        "Cr": (2.289700, 2.293606),
+        "Fe": (1.936042, 1.939980),
+        "Co": (1.788965, 1.792850),
+        "Cu": (1.540562, 1.544390),
+        "Mo": (0.709300, 0.713590),
+    }
+
+    def __init__(self, wavelengths, ratios=None, name=None):
+
+        self.wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+
+        if ratios is None:
+            ratios = np.ones_like(self.wavelengths)
+        self.ratios = np.atleast_1d(np.asarray(ratios, dtype=float))
+
+        if self.ratios.shape != self.wavelengths.shape:
+            raise ValueError("wavelengths and ratios must have the same length.")
+
+        self.name = name
+
+    @classmethod
+    def k_alpha12(cls, anode="Cu", ratio=0.5):
+        """
+        Kα1/Kα2 doublet of a standard anode with I(Kα2)/I(Kα1) = ratio.
+        """
+        if anode not in cls.K_ALPHA:
+            raise ValueError(f"Unknown anode: {anode}")
+        return cls(cls.K_ALPHA[anode], [1.0, ratio], name=f"{anode} Ka1/Ka2")
+
+    @classmethod
+    def cu_ka12(cls, ratio=0.5):
+        return cls.k_alpha12("Cu", ratio)
+
+    @property
+    def primary(self):
+        return float(self.wavelengths[0])
+
+    def key(self):
+        return (tuple(self.wavelengths), tuple(self.ratios))
+
+    def line_twothetas(self, d_hkls):
+        """
+        2θ (deg) of every line for every d-spacing, as an (n_lines, R)
+        array. Reflections a line cannot reach (λ > 2d) are NaN.
+        """
+        d = np.asarray(d_hkls, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            arg = self.wavelengths[:, None] / (2 * d[None, :])
+            return np.degrees(2 * np.arcsin(np.where(arg <= 1, arg, np.nan)))
+
+    def __repr__(self):
+        lines = ", ".join(f"{w:.6f}:{r:g}" for w, r in zip(self.wavelengths, self.ratios))
+        return f"XraySource({self.name or ''} [{lines}])"
@@ -0,0 +1,251 @@
+import os
+import tempfile
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.ndimage import maximum_filter1d
+
+from .chart import Chart
+from .data import Data
+from .grid import Grid
+
+
+def local_maxima(block, rel_height=0.2, order=5):
+    """
+    Peak-maxima mask of a (rows, n_points) block: maxima within ±order
+    points above rel_height times the row maximum.
+    """
+    block = np.atleast_2d(block)
+    local = maximum_filter1d(block, size=2 * order + 1, axis=1, mode="nearest")
+    threshold = rel_height * block.max(axis=1, keepdims=True)
+    return (block == local) & (block > threshold)
+
+
+class ScanStack:
+    """
+    Stack of 1D patterns sharing one 2θ axis, processed in row blocks.
+
+    Intensities are an (n_scans, n_points) array, usually a memory-mapped
+    .npy file, so stacks of 10⁴–10⁵ scans need not fit in RAM. A stack
+    on disk is a directory holding x.npy (the shared axis) and y.npy.
+
+    Operations (`mav`, `backsub`, `peak_mask`) read blocks of rows, whose
+    size follows from `max_bytes`, run the Chart algorithm vectorized
+    over the block and write into an output stack: a new directory when
+    `out` is a path (memory-mapped), otherwise an in-memory array, or an
+    unnamed temporary file (memory-mapped, in TMPDIR) when the result
+    would exceed `max_bytes`.
+    Anything depending only on the axis (window positions, partner
+    indices) is computed once for the whole stack.
+
+    Example:
+
+        stack = ScanStack.from_files(files, "raw")
+        smooth = stack.mav(5, out="smooth")
+        peaks = smooth.backsub(out="backsub").peak_mask(out="peaks")
+
+    Parameters
+    ----------
+    x : array-like
+        Shared 2θ axis (n_points,).
+    y : array-like
+        Intensities (n_scans, n_points), e.g. a np.memmap.
+    max_bytes : int
+        Memory ceiling for the working set of one block.
+    """
+
+    # float64 temporaries per point held by the block kernels
+    TEMPORARIES = 8
+
+    def __init__(self, x, y, max_bytes=256 * 2**20, path=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = y
+        self.max_bytes = max_bytes
+        self.path = path
+
+        if self.y.ndim != 2 or self.y.shape[1] != self.x.size:
+            raise ValueError("y must be (n_scans, n_points) with n_points = len(x).")
+
+    # ---------------------------------
+    # Storage
+    # ---------------------------------
+    @classmethod
+    def create(cls, path, x, n_scans, dtype=np.float32, max_bytes=256 * 2**20):
+        """
+        New zero-filled stack in directory `path`, memory-mapped read/write.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "x.npy"), x)
+        y = open_memmap(os.path.join(path, "y.npy"), mode="w+", dtype=dtype, shape=(n_scans, x.size))
+        return cls(x, y, max_bytes=max_bytes, path=path)
+
+    @classmethod
+    def open(cls, path, mode="r", max_bytes=256 * 2**20):
+        x = np.load(os.path.join(path, "x.npy"))
+        y = np.load(os.path.join(path, "y.npy"), mmap_mode=mode)
+        return cls(x, y, max_bytes=max_bytes, path=path)
+
+    @classmethod
+    def from_files(cls, files, path, x=None, dtype=np.float32, max_bytes=256 * 2**20):
+        """
+        Stream .xy/.csv scans into a new stack at `path`, one file in
+        memory at a time. Scans whose axis differs from `x` (default: the
+        first file's axis) are linearly interpolated onto it.
+        """
+        files = list(files)
+        if x is None:
+            x, _ = Data(files[0]).importfile()
+
+        stack = cls.create(path, x, len(files), dtype=dtype, max_bytes=max_bytes)
+        for i, file in enumerate(files):
+            xi, yi = Data(file).importfile()
+            if xi.shape != stack.x.shape or not np.allclose(xi, stack.x):
+                order = np.argsort(xi)
+                yi = np.interp(stack.x, xi[order], yi[order])
+            stack.y[i] = yi
+
+        stack.flush()
+        return stack
+
+    def flush(self):
+        if isinstance(self.y, np.memmap):
+            self.y.flush()
+
+    # ---------------------------------
+    # Access
+    # ---------------------------------
+    @property
+    def shape(self):
+        return self.y.shape
+
+    def __len__(self):
+        return self.y.shape[0]
+
+    def chart(self, i, **kwargs):
+        """
+        Chart of scan i (a float64 copy of the row).
+        """
+        return Chart(self.x.copy(), np.asarray(self.y[i], dtype=np.float64), **kwargs)
+
+    def rows_per_block(self, n_points=None):
+        n_points = self.x.size if n_points is None else n_points
+        return max(1, int(self.max_bytes // (8 * self.TEMPORARIES * max(n_points, 1))))
+
+    def blocks(self):
+        """
+        Row slices covering the stack, sized to the memory ceiling.
+        """
+        step = self.rows_per_block()
+        for r0 in range(0, len(self), step):
+            yield slice(r0, min(r0 + step, len(self)))
+
+    def map(self, kernel, x_out=None, out=None, dtype=None):
+        """
+        Apply `kernel(block) -> block_out` to every row block.
+
+        kernel receives a float64 (rows, n_points) array and returns
+        (rows, len(x_out)) values (x_out defaults to the stack's axis).
+        Results go to a new stack at path `out`; without one they are
+        kept in memory up to `max_bytes` and in a temporary file beyond.
+        """
+        x_out = self.x if x_out is None else np.asarray(x_out, dtype=np.float64)
+        dtype = self.y.dtype if dtype is None else dtype
+        shape = (len(self), x_out.size)
+
+        if out is not None:
+            result = ScanStack.create(out, x_out, len(self), dtype=dtype, max_bytes=self.max_bytes)
+        elif np.prod(shape) * np.dtype(dtype).itemsize > self.max_bytes:
+            # Unlinked on creation; the space is freed with the last view
+            y = np.memmap(tempfile.TemporaryFile(), mode="w+", dtype=dtype, shape=shape)
+            result = ScanStack(x_out, y, max_bytes=self.max_bytes)
+        else:
+            result = ScanStack(x_out, np.zeros(shape, dtype=dtype), max_bytes=self.max_bytes)
+
+        for rows in self.blocks():
+            result.y[rows] = kernel(np.asarray(self.y[rows], dtype=np.float64))
+
+        result.flush()
+        return result
+
+    # ---------------------------------
+    # Block kernels (Chart operations on every row)
+    # ---------------------------------
+    def mav(self, n=1, out=None):
+        """
+        n-point moving average of every scan (see Chart.mav); the axis
+        shrinks to the window mean positions.
+        """
+        if n < 1:
+            raise ValueError("n must be >= 1 for a moving average.")
+
+        kernel = np.ones(n) / n
+        x_out = np.convolve(self.x, kernel, mode="valid")
+
+        def smooth(block):
+            c = np.cumsum(block, axis=1)
+            c = np.concatenate([np.zeros((len(block), 1)), c], axis=1)
+            return (c[:, n:] - c[:, :-n]) / n
+
+        return self.map(smooth, x_out=x_out, out=out)
+
+    def backsub(self, tol=1, out=None):
+        """
+        Tolerance-based background subtraction of every scan (see
+        Chart.backsub). Partner indices are computed once from the axis.
+        """
+        x = self.x
+        L = x.size
+        lmda = int(0.50 * L / (x[0] - x[L - 1]))
+
+        i = np.arange(L)
+        j = (i + lmda) % L
+        grid = Grid(x)
+        if grid.is_sorted and not grid.is_uniform:
+            target = grid.x + 0.5 * np.sign(lmda) * grid.sign
+            inside = (target >= grid.x.min()) & (target <= grid.x.max())
+            j = np.where(inside, np.minimum(grid.nearest(target), L - 1), j)
+
+        # Sources grouped by partner, ascending index within a group: the
+        # last writing source of a group wins, as in Chart.backsub
+        order = np.lexsort((i, j))
+        j_sorted = j[order]
+        starts = np.flatnonzero(np.r_[True, j_sorted[1:] != j_sorted[:-1]])
+        ends = np.r_[starts[1:], L] - 1
+        targets = j_sorted[starts]
+        position = np.arange(L)
+
+        def subtract(block):
+            y = block[:, order]
+            partner = block[:, j_sorted]
+
+            rise = partner > tol * y
+            write = rise | (partner < y)
+            value = np.where(rise, partner - y, 0.0)
+
+            last = np.maximum.accumulate(np.where(write, position, -1), axis=1)[:, ends]
+            won = last >= starts
+            picked = np.take_along_axis(value, np.maximum(last, 0), axis=1)
+
+            result = np.zeros_like(block)
+            result[:, targets] = np.where(won, picked, 0.0)
+            return result
+
+        return self.map(subtract, out=out)
+
+    def peak_mask(self, rel_height=0.2, order=5, out=None):
+        """
+        Boolean (n_scans, n_points) mask of peak maxima: points that are
+        the maximum within ±`order` points and exceed `rel_height` times
+        their scan's maximum (as the allpeaks height threshold).
+        """
+        return self.map(lambda block: local_maxima(block, rel_height, order), out=out, dtype=np.bool_)
+
+    def peak_positions(self, mask=None, **kwargs):
+        """
+        2θ of the peaks of every scan, as a list of arrays (from
+        `peak_mask`, computed here if not given, under the same memory
+        ceiling).
+        """
+        mask = self.peak_mask(**kwargs) if mask is None else mask
+        return [self.x[np.flatnonzero(mask.y[i])] for i in range(len(self))]
@@ -0,0 +1,121 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+
+@dataclass
+class RefinementStage:
+    """
+    One stage of a refinement plan.
+
+    Parameters
+    ----------
+    keys : list of str
+        Parameter names refined in this stage.
+    name : str
+        Label used in logs (defaults to the joined keys).
+    set_params : dict
+        Parameter values assigned before the stage runs,
+        e.g. {"a": 3.93} to restart the lattice constant.
+    ftol, xtol : float
+        Convergence tolerances passed to least_squares.
+    max_nfev : int
+        Evaluation budget per run of the stage (None = solver default).
+    skip_if_rwp_below : float
+        Skip the stage when the current Rwp (%) is already below this.
+    repeat : int
+        Maximum number of runs of the stage.
+    repeat_tol : float
+        Run the stage again only while the last run improved Rwp by more
+        than this many percentage points.
+    loss : str
+        least_squares loss, "linear" or robust ("soft_l1", "huber",
+        "cauchy", "arctan"); see powerxrd.refine.refine.
+    f_scale : float or "auto"
+        Residual scale of a robust loss.
+    """
+    keys: list
+    name: Optional[str] = None
+    set_params: dict = field(default_factory=dict)
+    ftol: float = 1e-8
+    xtol: float = 1e-8
+    max_nfev: Optional[int] = None
+    skip_if_rwp_below: Optional[float] = None
+    repeat: int = 1
+    repeat_tol: float = 0.0
+    loss: str = "linear"
+    f_scale: object = "auto"
+
+    def __post_init__(self):
+        if self.name is None:
+            self.name = "+".join(self.keys)
+
+    def solver_options(self):
+        return {"ftol": self.ftol, "xtol": self.xtol, "max_nfev": self.max_nfev,
+                "loss": self.loss, "f_scale": self.f_scale}
+
+
+@dataclass
+class RefinementPlan:
+    """
+    Ordered refinement stages with early stopping.
+
+    The plan stops once `patience` consecutive stage runs have each improved
+    Rwp by less than `stall_tol` percentage points. With `mask_spikes`,
+    spikes are excluded from the data before the first stage (see
+    RefinementWorkflow.mask_spikes).
+
+    Example:
+
+        plan = RefinementPlan([
+            RefinementStage(["scale"]),
+            RefinementStage(["bkg_intercept", "bkg_slope"]),
+            RefinementStage(["a"], repeat=3, repeat_tol=0.1),
+            RefinementStage(["U", "W"], skip_if_rwp_below=1.0),
+        ])
+        plan.to_json("plan.json")
+    """
+    stages: list
+    stall_tol: float = 0.01
+    patience: int = 2
+    mask_spikes: bool = False
+
+    def __post_init__(self):
+        self.stages = [
+            s if isinstance(s, RefinementStage) else RefinementStage(**s)
+            for s in self.stages
+        ]
+
+    # ---------------------------------
+    # Serialization
+    # ---------------------------------
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+    def to_json(self, path=None):
+        """
+        Return the plan as a JSON string, also writing it to `path` if given.
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    @classmethod
+    def from_json(cls, source):
+        """
+        Load a plan from a JSON file path (str or os.PathLike) or a JSON
+        string.
+        """
+        if isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        elif not os.path.isfile(source) and source.lstrip().startswith("{"):
+            return cls.from_dict(json.loads(source))
+        with open(source) as f:
+            return cls.from_dict(json.load(f))
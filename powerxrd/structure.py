@@ -1,6 +1,13 @@
+from collections import OrderedDict
+from collections.abc import MutableSequence
 from dataclasses import dataclass
+
 import numpy as np
 
+from powerxrd import formfactors, kernels
+from powerxrd.symmetry import as_space_group
+
+
 @dataclass
 class Atom:
     element: str
@@ -14,54 +21,381 @@ class Atom:
         return np.array([self.x, self.y, self.z])
 
 
+def _atom_field(name, column=None):
+    # Property reading/writing one entry of a CrystalStructure array
+    def get(view):
+        array = getattr(view._structure, name)
+        return float(array[view._index] if column is None else array[view._index, column])
+
+    def set(view, value):
+        array = getattr(view._structure, name)
+        if column is None:
+            array[view._index] = value
+        else:
+            array[view._index, column] = value
+        view._structure.touch()
+
+    return property(get, set)
+
+
+class _AtomView:
+    """
+    One atom of a CrystalStructure, read from and written to its arrays.
+    Setting a field calls the structure's touch().
+    """
+
+    __slots__ = ("_structure", "_index")
+
+    x = _atom_field("positions", 0)
+    y = _atom_field("positions", 1)
+    z = _atom_field("positions", 2)
+    occupancy = _atom_field("occupancies")
+    B_iso = _atom_field("B_iso")
+
+    def __init__(self, structure, index):
+        self._structure = structure
+        self._index = index
+
+    @property
+    def element(self):
+        return self._structure.elements[self._structure.element_ids[self._index]]
+
+    @element.setter
+    def element(self, value):
+        atoms = self._structure.atoms.copy()
+        atoms[self._index].element = value
+        self._structure.atoms = atoms
+
+    def position(self):
+        return self._structure.positions[self._index].copy()
+
+    def copy(self):
+        return Atom(self.element, self.x, self.y, self.z, self.occupancy, self.B_iso)
+
+    def __eq__(self, other):
+        if isinstance(other, _AtomView):
+            other = other.copy()
+        if isinstance(other, Atom):
+            return self.copy() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class _AtomsView(MutableSequence):
+    """
+    List-like view of a CrystalStructure's atoms. Items write through to
+    the arrays; inserting, replacing or deleting atoms rebuilds them.
+    """
+
+    def __init__(self, structure):
+        self._structure = structure
+
+    def __len__(self):
+        return len(self._structure)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if not -len(self) <= i < len(self):
+            raise IndexError("atom index out of range")
+        return _AtomView(self._structure, i % len(self))
+
+    def copy(self):
+        """
+        Atoms as a list of independent Atom objects.
+        """
+        return [a.copy() for a in self]
+
+    def _rebuild(self, edit):
+        atoms = self.copy()
+        edit(atoms)
+        self._structure.atoms = atoms
+
+    def __setitem__(self, i, atom):
+        self._rebuild(lambda atoms: atoms.__setitem__(i, atom))
+
+    def __delitem__(self, i):
+        self._rebuild(lambda atoms: atoms.__delitem__(i))
+
+    def insert(self, i, atom):
+        self._rebuild(lambda atoms: atoms.insert(i, atom))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, _AtomsView)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
 class CrystalStructure:
     """
     Handles atomic basis and structure factor calculation.
+
+    Atoms are stored as a structure of arrays:
+
+        positions    (N, 3) fractional coordinates
+        occupancies  (N,)
+        B_iso        (N,)
+        element_ids  (N,)   index into `elements`
+
+    Each distinct element (or ion, e.g. "O2-") appears once in
+    `elements`, with its scattering-factor data interned in a
+    per-element table, so a cell with hundreds of atoms costs a few
+    arrays and structure factors for all reflections are evaluated in
+    bulk (`structure_factors`).
+
+    form_factors selects the atomic scattering model:
+
+        "waasmaier" (default) Waasmaier–Kirfel f0(s), plus anomalous
+                    f' + i f'' when a wavelength is given
+                    (see powerxrd.formfactors)
+        "z"         constant f = Z (the former approximation)
+
+    Form factors are evaluated once per distinct element over all
+    reflections' s values and memoized per reflection set.
+
+    With a space_group (symbol such as "Fm-3m", number, list of xyz
+    operators or powerxrd.symmetry.SpaceGroup) the atoms are the
+    asymmetric unit. Equivalent positions are generated on demand
+    (`expanded()`), and structure factors are summed over the asymmetric
+    unit and the symmetry operators with the lattice centering factored
+    out (and cosines only for centrosymmetric groups), instead of over
+    every atom of the cell. Sites on special positions, whose few
+    distinct images are cheaper than the operator sum, are summed over
+    their cached orbit.
+
+    The arrays may be edited in place; call `touch()` afterwards (or
+    PhaseModel.invalidate_cache()) so cached intensities are rebuilt.
+    Edits through the `atoms` view (`structure.atoms[0].x = 0.25`,
+    `structure.atoms.append(atom)`) do this automatically.
     """
 
-    def __init__(self, lattice, atoms):
+    # Reflections per block in structure_factors, bounding the
+    # (reflections × atoms) temporaries
+    BLOCK = 256
+
+    # Reflection sets whose form factors are kept
+    FF_CACHE_SIZE = 8
+
+    def __init__(self, lattice, atoms, form_factors="waasmaier", space_group=None):
         self.lattice = lattice
+        self.form_factors = form_factors
+        self.space_group = as_space_group(space_group)
         self.atoms = atoms
 
+    @classmethod
+    def from_arrays(cls, lattice, elements, positions, occupancies=None, B_iso=None,
+                    form_factors="waasmaier", space_group=None):
+        """
+        Build a structure directly from per-atom arrays
+        (elements: sequence of N symbols, positions: (N, 3)).
+        """
+        structure = cls(lattice, [], form_factors=form_factors, space_group=space_group)
+        structure.set_arrays(elements, positions, occupancies, B_iso)
+        return structure
+
     # -----------------------------
-    # Simple atomic scattering factor
-    # (placeholder — upgrade later)
+    # Array-backed atom storage
     # -----------------------------
-    def atomic_scattering_factor(self, element, s):
+    def set_arrays(self, elements, positions, occupancies=None, B_iso=None):
+
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        n = len(positions)
+
+        self.elements, element_ids = np.unique(np.asarray(elements, dtype=str), return_inverse=True)
+        self.elements = list(self.elements)
+        self.element_ids = element_ids.reshape(n).astype(np.intp)
+
+        self.positions = positions
+        self.occupancies = np.ones(n) if occupancies is None else np.asarray(occupancies, dtype=float)
+        self.B_iso = np.zeros(n) if B_iso is None else np.asarray(B_iso, dtype=float)
+
+        self._element_Z = np.array([formfactors.atomic_number(e) for e in self.elements], dtype=float)
+        self._ff_cache = OrderedDict()
+        self.touch()
+
+    @property
+    def atoms(self):
+        """
+        List-like view of the atoms. Editing an atom
+        (`structure.atoms[0].x = 0.25`) writes to the arrays, and
+        append/insert/del rebuild them; both mark the structure changed.
+        `atoms.copy()` gives independent Atom objects.
+        """
+        return _AtomsView(self)
+
+    @atoms.setter
+    def atoms(self, atoms):
+        atoms = [a.copy() if isinstance(a, _AtomView) else a for a in atoms]
+        self.set_arrays(
+            [a.element for a in atoms],
+            [(a.x, a.y, a.z) for a in atoms],
+            [a.occupancy for a in atoms],
+            [a.B_iso for a in atoms],
+        )
+
+    def touch(self):
+        """
+        Mark the structure as changed (see PhaseModel.reflections).
+        """
+        self.version = getattr(self, "version", -1) + 1
+
+    def __len__(self):
+        return len(self.positions)
+
+    # -----------------------------
+    # Symmetry
+    # -----------------------------
+    def _orbits(self):
+        """
+        (multiplicities (N,), positions (M, 3), site (M,)) of the distinct
+        equivalent positions of every site, cached per version.
+        """
+        cached = getattr(self, "_orbit_cache", None)
+        if cached is None or cached[0] != self.version:
+            positions, site = self.space_group.expand(self.positions)
+            multiplicities = np.bincount(site, minlength=len(self))
+
+            # Sites with fewer distinct images than operator terms are
+            # cheaper to sum over their orbit (special positions)
+            orbit = multiplicities <= len(self.space_group.sum_operators[0])
+            on_orbit = orbit[site]
+            orbit_atoms = (positions[on_orbit], self.element_ids[site[on_orbit]],
+                           self.occupancies[site[on_orbit]], self.B_iso[site[on_orbit]])
+
+            self._orbit_cache = cached = (self.version, multiplicities, positions, site, orbit, orbit_atoms)
+        return cached[1:]
+
+    def site_weights(self):
+        """
+        Fraction of the group's operators giving distinct positions for
+        each site (1 for general positions), cached per version.
+        """
+        return self._orbits()[0] / len(self.space_group)
+
+    def expanded(self):
+        """
+        Equivalent P1 structure with every atom of the cell listed.
+        """
+        if self.space_group is None:
+            return self
+
+        _, positions, site, _, _ = self._orbits()
+        return CrystalStructure.from_arrays(
+            self.lattice,
+            np.asarray(self.elements)[self.element_ids][site],
+            positions.copy(),
+            self.occupancies[site],
+            self.B_iso[site],
+            form_factors=self.form_factors,
+        )
+
+    # -----------------------------
+    # Atomic scattering factors
+    # -----------------------------
+    def element_form_factors(self, s, wavelength=None):
         """
-        Very simple Z-based approximation.
+        (n_elements, len(s)) scattering factors of the interned elements,
+        complex when anomalous terms are included.
         s = sin(theta) / lambda
+
+        Memoized per (reflection set, wavelength, model): repeated calls
+        with the same s values return the cached table.
         """
-        Z_TABLE = {
-            "Sr": 38,
-            "Ti": 22,
-            "O": 8,
-            "Fe": 26,
-            "C": 6,
-        }
-        return Z_TABLE.get(element, 10)
+        s = np.atleast_1d(np.asarray(s, dtype=float))
+        key = (s.tobytes(), wavelength, self.form_factors)
+
+        cache = self._ff_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        if self.form_factors == "z":
+            f = np.repeat(self._element_Z[:, None], s.size, axis=1)
+        elif self.form_factors == "waasmaier":
+            f = formfactors.form_factors(self.elements, s, wavelength)
+        else:
+            raise ValueError(f"Unknown form_factors: {self.form_factors}")
+
+        cache[key] = f
+        while len(cache) > self.FF_CACHE_SIZE:
+            cache.popitem(last=False)
+        return f
+
+    def atomic_scattering_factor(self, element, s, wavelength=None):
+        """
+        Scattering factor of one element (or ion) at
+        s = sin(theta) / lambda.
+        """
+        if self.form_factors == "z":
+            return float(formfactors.atomic_number(element))
+        f = formfactors.form_factors([element], np.atleast_1d(s), wavelength)[0]
+        return f if np.ndim(s) else f[0]
 
     # -----------------------------
     # Structure Factor
     # -----------------------------
-    def structure_factor(self, hkl, s=0.0):
+    def structure_factors(self, hkls, s=0.0, wavelength=None):
         """
-        Computes complex structure factor F(hkl)
+        Complex structure factors F(hkl) for many reflections at once.
+
+        hkls: (R, 3) Miller indices; s: scalar or (R,) sin(theta)/lambda;
+        wavelength (Å) enables anomalous dispersion.
+        Reflections are processed in blocks of BLOCK rows (NumPy
+        backend) or in parallel (Numba backend, see powerxrd.kernels).
         """
-        h, k, l = hkl
-        F = 0.0 + 0.0j
+        hkls = np.asarray(hkls, dtype=float).reshape(-1, 3)
+        s = np.broadcast_to(np.asarray(s, dtype=float), (len(hkls),))
 
-        for atom in self.atoms:
-            f_j = self.atomic_scattering_factor(atom.element, s)
+        F = np.zeros(len(hkls), dtype=complex)
+        if len(self) == 0:
+            return F
 
-            phase = 2j * np.pi * (
-                h * atom.x +
-                k * atom.y +
-                l * atom.z
-            )
+        # One evaluation per distinct element for the whole reflection set
+        f_elem = self.element_form_factors(s, wavelength)                               # (E, R)
 
-            DW = np.exp(-atom.B_iso * (s ** 2))
+        if self.space_group is not None:
+            return self._symmetric_structure_factors(hkls, s, f_elem)
 
-            F += atom.occupancy * f_j * np.exp(phase) * DW
+        return kernels.structure_factors_p1(hkls, s, self.positions, self.element_ids,
+                                            self.occupancies, self.B_iso, f_elem, self.BLOCK)
 
-        return F
\ No newline at end of file
+    def _symmetric_structure_factors(self, hkls, s, f_elem):
+        """
+        F(h) = C(h) Σ_j w_j occ_j f_j DW_j Σ_ops exp(2πi h·(R x_j + t))
+
+        with C(h) = Σ_c exp(2πi h·c) the centering factor and w_j the
+        site weights correcting for special positions.
+
+        A site with fewer distinct images than operator terms (a special
+        position, e.g. every site of NaCl in Fm-3m) is summed over its
+        cached orbit instead, as in P1.
+        """
+        group = self.space_group
+        rotations, translations, centric = group.sum_operators
+        multiplicities, _, _, orbit, orbit_atoms = self._orbits()
+
+        F = np.zeros(len(hkls), dtype=complex)
+
+        if not orbit.all():
+            general = ~orbit
+            C = np.exp(2j * np.pi * (hkls @ group.centering.T)).sum(axis=1)           # (R,)
+            site = self.occupancies * multiplicities / len(group)                      # (N,)
+            F += C * kernels.structure_factors_sym(hkls, s, self.positions[general], self.element_ids[general],
+                                                   site[general], self.B_iso[general], f_elem,
+                                                   rotations, translations, centric, self.BLOCK)
+
+        if orbit.any():
+            F += kernels.structure_factors_p1(hkls, s, *orbit_atoms, f_elem, self.BLOCK)
+
+        return F
+
+    def structure_factor(self, hkl, s=0.0, wavelength=None):
+        """
+        Computes complex structure factor F(hkl)
+        """
+        return self.structure_factors([hkl], s, wavelength)[0]
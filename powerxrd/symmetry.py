@@ -0,0 +1,287 @@
+import re
+from fractions import Fraction
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+# -----------------------------
+# Space-group symmetry
+#
+# An operator (R, t) maps fractional coordinates x → R x + t.
+# A SpaceGroup stores its operators modulo the centering lattice:
+# `rotations`/`translations` are the coset representatives and
+# `centering` the lattice-centering vectors, so the full set of
+# operators is {(R, t + c)}. Structure factors factor the centering
+# out as a per-reflection sum (see CrystalStructure.structure_factors).
+# -----------------------------
+
+# Translations are canonicalized on a 1/24 grid (covers 1/2, 1/3, 1/4, 1/6, 1/8)
+_DENOM = 24
+
+# Position tolerance when merging equivalent positions
+POSITION_TOL = 1e-4
+
+CENTERING = {
+    "P": [(0, 0, 0)],
+    "I": [(0, 0, 0), (0.5, 0.5, 0.5)],
+    "F": [(0, 0, 0), (0, 0.5, 0.5), (0.5, 0, 0.5), (0.5, 0.5, 0)],
+    "A": [(0, 0, 0), (0, 0.5, 0.5)],
+    "B": [(0, 0, 0), (0.5, 0, 0.5)],
+    "C": [(0, 0, 0), (0.5, 0.5, 0)],
+    "R": [(0, 0, 0), (2 / 3, 1 / 3, 1 / 3), (1 / 3, 2 / 3, 2 / 3)],
+}
+
+_TERM = re.compile(r"([+-]?)(\d*\.?\d*(?:/\d+)?)\*?([xyz]?)")
+
+
+def parse_operator(text):
+    """
+    Parse a Jones-faithful operator such as "-y+1/2, x, z+3/4" into
+    (R, t): a (3, 3) integer rotation and a (3,) translation.
+    """
+    rows = [r.strip().lower().replace(" ", "") for r in text.split(",")]
+    if len(rows) != 3:
+        raise ValueError(f"Operator needs three components: {text!r}")
+
+    R = np.zeros((3, 3), dtype=int)
+    t = np.zeros(3)
+    for i, row in enumerate(rows):
+        pos = 0
+        while pos < len(row):
+            m = _TERM.match(row, pos)
+            if m is None or m.end() == pos:
+                raise ValueError(f"Cannot parse operator {text!r}")
+            sign, number, axis = m.groups()
+            value = float(Fraction(number)) if number else 1.0
+            value = -value if sign == "-" else value
+            if axis:
+                R[i, "xyz".index(axis)] += int(round(value))
+            else:
+                t[i] += value
+            pos = m.end()
+    return R, t % 1.0
+
+
+def format_operator(R, t):
+    """
+    Inverse of parse_operator, e.g. "-y+1/2,x,z+3/4".
+    """
+    rows = []
+    for i in range(3):
+        row = "".join(
+            ("-" if R[i, j] < 0 else "+") + (str(abs(R[i, j])) if abs(R[i, j]) != 1 else "") + "xyz"[j]
+            for j in range(3) if R[i, j]
+        )
+        frac = Fraction(float(t[i])).limit_denominator(_DENOM)
+        if frac:
+            row += f"+{frac}"
+        rows.append(row.lstrip("+"))
+    return ",".join(rows)
+
+
+class SpaceGroup:
+    """
+    Space group given by generator operators and a lattice centering.
+
+    The group is closed from the generators once at construction
+    (products taken modulo lattice and centering translations), so only
+    a few operators need to be listed, e.g. for Fm-3m:
+
+        SpaceGroup("Fm-3m", ["-y,x,z", "z,x,y", "-x,-y,-z"], centering="F")
+
+    Built-in groups are available by symbol or number via space_group().
+
+    Attributes
+    ----------
+    rotations : (n_ops, 3, 3) int array
+    translations : (n_ops, 3) array
+        Coset representatives of the group modulo centering.
+    centering : (n_c, 3) array
+        Centering vectors, including (0, 0, 0).
+    """
+
+    def __init__(self, name, generators, centering="P", number=None):
+        self.name = name
+        self.number = number
+
+        if isinstance(centering, str):
+            centering = CENTERING[centering.upper()]
+        self.centering = np.asarray(centering, dtype=float).reshape(-1, 3) % 1.0
+
+        ops = [parse_operator(g) if isinstance(g, str) else (np.asarray(g[0], dtype=int), np.asarray(g[1], dtype=float) % 1.0)
+               for g in generators]
+        self.rotations, self.translations = self._close(ops)
+
+    # -----------------------------
+    # Group closure
+    # -----------------------------
+    def _canonical(self, t):
+        # Smallest representative of t modulo the centering lattice
+        candidates = np.rint(((t + self.centering) % 1.0) * _DENOM).astype(int) % _DENOM
+        return min(map(tuple, candidates))
+
+    def _close(self, generators):
+        identity = (np.eye(3, dtype=int), np.zeros(3))
+        ops = {}
+
+        def add(R, t):
+            key = (tuple(R.ravel()), self._canonical(t))
+            if key in ops:
+                return False
+            ops[key] = (R, np.array(key[1], dtype=float) / _DENOM)
+            return True
+
+        add(*identity)
+        frontier = [identity]
+        while frontier:
+            new = []
+            for R1, t1 in frontier:
+                for R2, t2 in generators:
+                    R = R2 @ R1
+                    t = (R2 @ t1 + t2) % 1.0
+                    if add(R, t):
+                        new.append((R, t))
+            frontier = new
+
+            if len(ops) > 192:
+                raise ValueError(f"Generators of {self.name} do not close to a space group.")
+
+        rotations = np.array([op[0] for op in ops.values()], dtype=int)
+        translations = np.array([op[1] for op in ops.values()], dtype=float)
+        return rotations, translations
+
+    # -----------------------------
+    # Properties
+    # -----------------------------
+    def __len__(self):
+        """
+        Number of operators including centering translations.
+        """
+        return len(self.rotations) * len(self.centering)
+
+    @cached_property
+    def centrosymmetric_at_origin(self):
+        """
+        True if inversion through the origin (-x,-y,-z) is an operator.
+        """
+        inversion = (tuple((-np.eye(3, dtype=int)).ravel()), self._canonical(np.zeros(3)))
+        return any(
+            (tuple(R.ravel()), self._canonical(t)) == inversion
+            for R, t in zip(self.rotations, self.translations)
+        )
+
+    @cached_property
+    def sum_operators(self):
+        """
+        (rotations, translations, centric) summed in structure factors:
+        for a group with inversion at the origin, which pairs (R, t) with
+        (-R, -t), only the proper rotations, each contributing 2 cos(...)
+        instead of two exponentials.
+        """
+        if not self.centrosymmetric_at_origin:
+            return self.rotations, self.translations, False
+        proper = np.linalg.det(self.rotations) > 0
+        return self.rotations[proper], self.translations[proper], True
+
+    def operators(self):
+        """
+        All operators as xyz strings (centering included).
+        """
+        return [
+            format_operator(R, (t + c) % 1.0)
+            for c in self.centering
+            for R, t in zip(self.rotations, self.translations)
+        ]
+
+    def __repr__(self):
+        return f"SpaceGroup({self.name!r}, n_ops={len(self)})"
+
+    # -----------------------------
+    # Positions
+    # -----------------------------
+    def orbit_positions(self, positions):
+        """
+        (N, n_ops·n_c, 3) images of N fractional positions under every
+        operator, wrapped into [0, 1).
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        images = np.einsum("oij,nj->noi", self.rotations, positions) + self.translations[None]
+        images = images[:, None, :, :] + self.centering[None, :, None, :]
+        return images.reshape(len(positions), -1, 3) % 1.0
+
+    def multiplicities(self, positions):
+        """
+        Number of distinct equivalent positions of each site.
+        """
+        keys = _position_keys(self.orbit_positions(positions))
+        return np.array([len(np.unique(k, axis=0)) for k in keys], dtype=int)
+
+    def expand(self, positions):
+        """
+        Equivalent positions of each site: (all_positions (M, 3), site (M,))
+        with site[i] the index of the generating position.
+        """
+        images = self.orbit_positions(positions)
+        keys = _position_keys(images)
+
+        out, sites = [], []
+        for n, (img, key) in enumerate(zip(images, keys)):
+            _, first = np.unique(key, axis=0, return_index=True)
+            first = np.sort(first)
+            out.append(img[first])
+            sites.append(np.full(len(first), n))
+
+        if not out:
+            return np.zeros((0, 3)), np.zeros(0, dtype=int)
+        return np.concatenate(out), np.concatenate(sites)
+
+
+def _position_keys(images):
+    # Integer keys on the POSITION_TOL grid, with 1.0 wrapped onto 0.0
+    scale = 1.0 / POSITION_TOL
+    return np.rint(images * scale).astype(np.int64) % int(round(scale))
+
+
+# -----------------------------
+# Built-in groups (generators from the International Tables;
+# Fd-3m in origin choice 2)
+# -----------------------------
+SPACE_GROUPS = {
+    "P1": (1, [], "P"),
+    "P-1": (2, ["-x,-y,-z"], "P"),
+    "Pa-3": (205, ["-x+1/2,-y,z+1/2", "-x,y+1/2,-z+1/2", "z,x,y", "-x,-y,-z"], "P"),
+    "F-43m": (216, ["-x,-y,z", "z,x,y", "y,x,z"], "F"),
+    "Pm-3m": (221, ["-y,x,z", "z,x,y", "-x,-y,-z"], "P"),
+    "Fm-3m": (225, ["-y,x,z", "z,x,y", "-x,-y,-z"], "F"),
+    "Fd-3m": (227, ["-x+3/4,-y+1/4,z+1/2", "-x+1/4,y+1/2,-z+3/4", "z,x,y",
+                    "y+3/4,x+1/4,-z+1/2", "-x,-y,-z"], "F"),
+    "Im-3m": (229, ["-y,x,z", "z,x,y", "-x,-y,-z"], "I"),
+}
+
+
+def space_group(symbol):
+    """
+    Built-in SpaceGroup by Hermann–Mauguin symbol ("Fm-3m") or number
+    (225). Groups are built once and cached.
+    """
+    for name, (number, _, _) in SPACE_GROUPS.items():
+        if symbol in (name, number, str(number)) or str(symbol).replace(" ", "") == name:
+            return _build(name)
+    raise ValueError(f"Unknown space group: {symbol}")
+
+
+@lru_cache(maxsize=None)
+def _build(name):
+    number, generators, centering = SPACE_GROUPS[name]
+    return SpaceGroup(name, generators, centering, number=number)
+
+
+def as_space_group(value):
+    """
+    SpaceGroup from a symbol, number, list of xyz operators or SpaceGroup.
+    """
+    if value is None or isinstance(value, SpaceGroup):
+        return value
+    if isinstance(value, (list, tuple)):
+        return SpaceGroup("custom", value)
+    return space_group(value)
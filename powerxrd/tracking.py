@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from .grid import Grid
+from .stack import ScanStack, local_maxima
+
+FWHM_PER_SIGMA = 2 * np.sqrt(2 * np.log(2))
+
+
+@dataclass
+class PeakTracks:
+    """
+    Peaks followed through a scan series.
+
+    Every field is a dense (n_scans, n_peaks) array; entries of scans
+    where a peak could not be fitted are NaN. Peak columns keep the
+    order of the seeds.
+    """
+    center: np.ndarray      # 2θ (deg)
+    height: np.ndarray      # peak height above background
+    area: np.ndarray        # integrated intensity (the `a` of funcgauss)
+    fwhm: np.ndarray        # deg
+    background: np.ndarray  # constant background under the peak
+    matched: np.ndarray     # bool, a detected maximum was assigned
+
+    def to_dict(self):
+        """
+        Long-format columns (one row per scan and peak), e.g. for
+        `pandas.DataFrame(tracks.to_dict())`.
+        """
+        n_scans, n_peaks = self.center.shape
+        scan, peak = np.meshgrid(np.arange(n_scans), np.arange(n_peaks), indexing="ij")
+        d = {"scan": scan.ravel(), "peak": peak.ravel()}
+        for name in ("center", "height", "area", "fwhm", "background", "matched"):
+            d[name] = getattr(self, name).ravel()
+        return d
+
+
+# ---------------------------------
+# Batched Gaussian fits
+# ---------------------------------
+def _windows(grid, centers, window):
+    """
+    (index (k, w), valid (k, w)) of the points within ±window/2 of each
+    center, padded to a common width.
+    """
+    lo, hi = grid.index_range(centers - window / 2, centers + window / 2)
+    width = max(int(np.max(hi - lo, initial=1)), 1)
+    index = lo[:, None] + np.arange(width)[None, :]
+    valid = index < hi[:, None]
+    return np.minimum(index, len(grid) - 1), valid
+
+
+def fit_gaussians(x, y, p0, window, n_iter=30, tol=1e-8):
+    """
+    Fit y0 + a/(σ√2π) exp(-(x-mean)²/2σ²) (utilities.funcgauss) to all
+    peaks of one scan at once with a damped Gauss–Newton (Levenberg–
+    Marquardt) iteration batched over peaks.
+
+    Parameters
+    ----------
+    x, y : array
+        Scan.
+    p0 : (k, 4) array
+        Starting (y0, a, mean, sigma) per peak, e.g. the previous scan's
+        solution (warm start).
+    window : float
+        Width (deg) of the fitted range around each starting mean.
+
+    Returns
+    -------
+    (params (k, 4), ok (k,)) where ok is False for fits that diverged or
+    whose mean left the window.
+    """
+    grid = Grid.of(x)
+    y = np.asarray(y, dtype=float)
+    p = np.array(p0, dtype=float).reshape(-1, 4)
+    k = len(p)
+    if k == 0:
+        return p, np.zeros(0, dtype=bool)
+
+    start = p[:, 2].copy()
+    index, valid = _windows(grid, start, window)
+    X = grid.x[index]
+    Y = y[index]
+    W = valid.astype(float)
+
+    def residuals(p):
+        y0, a, mean, sigma = (p[:, i:i + 1] for i in range(4))
+        g = np.exp(-(X - mean) ** 2 / (2 * sigma ** 2)) / (sigma * np.sqrt(2 * np.pi))
+        return (y0 + a * g - Y) * W, g
+
+    r, g = residuals(p)
+    cost = (r ** 2).sum(axis=1)
+    lam = np.full(k, 1e-3)
+
+    for _ in range(n_iter):
+        y0, a, mean, sigma = (p[:, i:i + 1] for i in range(4))
+        dx = X - mean
+        J = np.stack([
+            np.ones_like(X),
+            g,
+            a * g * dx / sigma ** 2,
+            a * g * (dx ** 2 / sigma ** 3 - 1 / sigma),
+        ], axis=-1) * W[..., None]                                     # (k, w, 4)
+
+        JTJ = np.einsum("kwi,kwj->kij", J, J)
+        JTr = np.einsum("kwi,kw->ki", J, r)
+        A = JTJ + lam[:, None, None] * np.einsum("kii->ki", JTJ)[:, :, None] * np.eye(4)
+        A += 1e-12 * np.eye(4)
+        step = np.linalg.solve(A, -JTr[..., None])[..., 0]
+
+        trial = p + step
+        trial[:, 3] = np.abs(trial[:, 3])
+        r_trial, g_trial = residuals(trial)
+        cost_trial = (r_trial ** 2).sum(axis=1)
+
+        better = np.isfinite(cost_trial) & (cost_trial < cost)
+        p = np.where(better[:, None], trial, p)
+        r = np.where(better[:, None], r_trial, r)
+        g = np.where(better[:, None], g_trial, g)
+        converged = better & (cost - cost_trial <= tol * np.maximum(cost, 1e-300))
+        cost = np.where(better, cost_trial, cost)
+        lam = np.where(better, lam / 3, lam * 10)
+
+        if np.all(converged | (lam > 1e10)):
+            break
+
+    ok = np.all(np.isfinite(p), axis=1) & (p[:, 1] > 0) & (p[:, 3] > 0) \
+        & (np.abs(p[:, 2] - start) <= window / 2)
+    return p, ok
+
+
+def _initial_params(grid, y, centers, window):
+    index, valid = _windows(grid, centers, window)
+    Y = np.where(valid, y[index], np.nan)
+    y0 = np.nanmin(Y, axis=1)
+    height = np.nanmax(Y, axis=1) - y0
+    sigma = np.full(len(centers), window / 6)
+    return np.column_stack([y0, height * sigma * np.sqrt(2 * np.pi), centers, sigma])
+
+
+# ---------------------------------
+# Correspondences
+# ---------------------------------
+def assign(previous, candidates, max_shift, method="hungarian"):
+    """
+    Candidate index for each previous peak position, or -1.
+
+    "hungarian" solves the one-to-one assignment minimizing the total
+    |shift| (scipy linear_sum_assignment); "nearest" takes each peak's
+    nearest candidate independently. Pairs farther apart than max_shift
+    are left unassigned.
+    """
+    previous = np.asarray(previous, dtype=float)
+    candidates = np.asarray(candidates, dtype=float)
+    result = np.full(len(previous), -1)
+    if len(previous) == 0 or len(candidates) == 0:
+        return result
+
+    cost = np.abs(previous[:, None] - candidates[None, :])
+
+    if method == "hungarian":
+        big = max_shift * 1e3 + 1.0
+        rows, cols = linear_sum_assignment(np.where(cost <= max_shift, cost, big))
+    elif method == "nearest":
+        rows, cols = np.arange(len(previous)), np.argmin(cost, axis=1)
+    else:
+        raise ValueError(f"Unknown assignment method: {method}")
+
+    near = cost[rows, cols] <= max_shift
+    result[rows[near]] = cols[near]
+    return result
+
+
+def seed_peaks(x, y, rel_height=0.2, order=5, max_peaks=None):
+    """
+    Seed positions from the maxima of one scan, strongest first up to
+    max_peaks, returned in 2θ order. Chart.allpeaks output (first column)
+    can be used as seeds instead.
+    """
+    y = np.asarray(y, dtype=float)
+    idx = np.flatnonzero(local_maxima(y, rel_height, order)[0])
+    if max_peaks is not None:
+        idx = idx[np.argsort(-y[idx])[:max_peaks]]
+    return np.sort(np.asarray(x, dtype=float)[idx])
+
+
+# ---------------------------------
+# Tracking
+# ---------------------------------
+def track_peaks(x, scans, seeds, window=0.6, max_shift=None, method="hungarian",
+                rel_height=0.05, order=5):
+    """
+    Follow peaks through a series of scans.
+
+    Peaks are seeded on the first scan and every later scan is processed
+    in two vectorized steps: the scan's maxima are matched to the current
+    peak positions (`assign`), and all peaks are refitted together
+    (`fit_gaussians`) starting from the previous scan's parameters, moved
+    to the matched maximum. A peak that cannot be fitted gives NaN for
+    that scan and keeps its last parameters as the next warm start.
+
+    Parameters
+    ----------
+    x : array
+        Shared 2θ axis (ignored when `scans` is a ScanStack).
+    scans : (n_scans, n_points) array or ScanStack
+        Scan series; a ScanStack is read in row blocks.
+    seeds : array
+        Seed 2θ positions, or an allpeaks-style array (first column used).
+    window : float
+        Fitted width (deg) around each peak.
+    max_shift : float
+        Largest move (deg) between consecutive scans accepted as the same
+        peak (default window / 2).
+    method : {"hungarian", "nearest"}
+        Correspondence solver, see assign.
+    rel_height, order : float, int
+        Maxima detection, see stack.local_maxima.
+
+    Returns
+    -------
+    PeakTracks
+    """
+    if isinstance(scans, ScanStack):
+        x, blocks = scans.x, (np.asarray(scans.y[rows], dtype=float) for rows in scans.blocks())
+        n_scans = len(scans)
+    else:
+        scans = np.atleast_2d(np.asarray(scans, dtype=float))
+        blocks, n_scans = [scans], len(scans)
+
+    grid = Grid.of(x)
+    max_shift = window / 2 if max_shift is None else max_shift
+
+    seeds = np.asarray(seeds, dtype=float)
+    centers = np.sort(seeds[:, 0] if seeds.ndim == 2 else seeds)
+    n_peaks = len(centers)
+
+    params = np.full((n_scans, n_peaks, 4), np.nan)
+    matched = np.zeros((n_scans, n_peaks), dtype=bool)
+    current = None
+
+    scan = 0
+    for block in blocks:
+        maxima = local_maxima(block, rel_height, order)
+
+        for y, mask in zip(block, maxima):
+            if current is None:
+                current = _initial_params(grid, y, centers, window)
+
+            candidates = grid.x[np.flatnonzero(mask)]
+            match = assign(current[:, 2], candidates, max_shift, method)
+
+            p0 = current.copy()
+            p0[match >= 0, 2] = candidates[match[match >= 0]]
+
+            p, ok = fit_gaussians(grid, y, p0, window)
+
+            params[scan, ok] = p[ok]
+            matched[scan] = match >= 0
+            current[ok] = p[ok]
+            scan += 1
+
+    y0, a, mean, sigma = (params[..., i] for i in range(4))
+    return PeakTracks(
+        center=mean,
+        height=a / (sigma * np.sqrt(2 * np.pi)),
+        area=a,
+        fwhm=sigma * FWHM_PER_SIGMA,
+        background=y0,
+        matched=matched,
+    )
@@ -39,3 +39,14 @@ def funcgauss(x,y0,a,mean,sigma):
     '''Gaussian equation'''
     return y0+(a/(sigma*np.sqrt(2*np.pi)))*np.exp(-(x-mean)**2/(2*sigma*sigma))
 
+
+def emission_twotheta(twotheta, lmda_from, lmda_to):
+    '''
+    2-theta (deg) of the same reflections seen with another wavelength.
+    - twotheta: Angles in degrees measured with lmda_from (scalar or array).
+    - lmda_from, lmda_to: Wavelengths in the same units; broadcast against twotheta.
+    Returns NaN where the new wavelength cannot reach the reflection.
+    '''
+    arg = (np.asarray(lmda_to) / np.asarray(lmda_from)) * np.sin(np.radians(twotheta) / 2)
+    with np.errstate(invalid="ignore"):
+        return np.degrees(2 * np.arcsin(np.where(np.abs(arg) <= 1, arg, np.nan)))
@@ -1,6 +1,13 @@
+import hashlib
 import json
+import os
 
-from .refine import plot_fit, refine
+import numpy as np
+
+from .checkpoint import Checkpoint
+from .globalsearch import global_refine
+from .refine import fit_statistics, plot_fit, refine, spike_mask
+from .strategy import RefinementPlan
 
 
 class RefinementWorkflow:
@@ -28,9 +35,12 @@ class RefinementWorkflow:
         rw.plot_fit()
 
         rw.save_log('refinement_log.json')
+
+    Staged refinements can also be described declaratively with a
+    RefinementPlan (see powerxrd.strategy) and run with `run_plan`.
     """
 
-    def __init__(self, model, x_exp, y_exp):
+    def __init__(self, model, x_exp, y_exp, setup=None):
         """
         Parameters
         ----------
@@ -42,13 +52,40 @@ class RefinementWorkflow:
 
         x_exp, y_exp : numpy arrays
             Experimental 2θ and intensity data.
+
+        setup : JSON-serializable, optional
+            How the model and data were built (e.g. the model recipe and
+            preprocessing spec of a batch run). Its hash is stored in plan
+            checkpoints, see setup_hash.
         """
         self.model = model
         self.x_exp = x_exp
         self.y_exp = y_exp
+        self.setup = setup
         self.history = []
 
-    def refine(self, keys, print_stage=True):
+        # Points left out of fits and Rwp (see mask_spikes)
+        self.exclude = None
+
+    def mask_spikes(self, size=5, threshold=6.0, rel=0.5):
+        """
+        Exclude spikes (zingers, hot/dead pixels) from all following
+        refinements, using the running-median test of
+        powerxrd.refine.spike_mask. Returns the number of masked points.
+        """
+        self.exclude = spike_mask(self.y_exp, size=size, threshold=threshold, rel=rel)
+        return int(self.exclude.sum())
+
+    def fitted_data(self):
+        """
+        (x, y) of the points entering fits, i.e. without excluded points.
+        """
+        if self.exclude is None:
+            return self.x_exp, self.y_exp
+        keep = ~self.exclude
+        return np.asarray(self.x_exp)[keep], np.asarray(self.y_exp)[keep]
+
+    def refine(self, keys, print_stage=True, corr_threshold=0.9, **refine_kwargs):
         """
         Run a least-squares refinement for selected parameters.
 
@@ -64,21 +101,272 @@ class RefinementWorkflow:
         print_stage : bool
             If True, print refinement diagnostics.
 
+        corr_threshold : float
+            Absolute correlation above which a parameter pair is flagged.
+
+        **refine_kwargs
+            Forwarded to powerxrd.refine.refine (bounds, ties, x_scale,
+            loss, f_scale and least_squares options).
+
         Returns
         -------
         OptimizeResult
-            Result object from scipy.optimize.least_squares.
+            Result object from scipy.optimize.least_squares, extended with
+            `esd`, `correlation` and `correlated_pairs`.
         """
         result = refine(
             self.model,
-            self.x_exp,
-            self.y_exp,
+            *self.fitted_data(),
             keys,
             print_stage,
-            self.history
+            self.history,
+            corr_threshold,
+            **refine_kwargs
         )
         return result
 
+    def global_refine(self, keys, ranges, print_stage=True, **kwargs):
+        """
+        Multi-start / differential-evolution refinement over parameter ranges.
+
+        Parameters
+        ----------
+        keys : list of str
+            Parameter names refined locally from every start.
+
+        ranges : dict
+            {name: (low, high)} sampling ranges.
+
+        **kwargs
+            Forwarded to powerxrd.globalsearch.global_refine
+            (n_starts, method, workers, executor, seed, ...).
+
+        Returns
+        -------
+        GlobalResult
+            Best fit and ranked list of distinct local minima.
+        """
+        result = global_refine(
+            self.model,
+            *self.fitted_data(),
+            keys,
+            ranges,
+            print_stage=print_stage,
+            **kwargs
+        )
+        snapshot = self.model.param_dict()
+        snapshot["stage"] = "global:" + "+".join(keys)
+        snapshot["Rwp"] = result.Rwp
+        self.history.append(snapshot)
+        return result
+
+    def rwp(self):
+        """
+        Current weighted-profile R-factor (%) of the model against the
+        fitted (non-excluded) data.
+        """
+        x, y = self.fitted_data()
+        return fit_statistics(y, self.model.pattern(x))[0]
+
+    def run_plan(self, plan, print_stage=True, corr_threshold=0.9, checkpoint=None,
+                 resume=True):
+        """
+        Run a declarative refinement plan.
+
+        Stages are run in order. A stage is skipped when its
+        `skip_if_rwp_below` condition holds, repeated while each run still
+        improves Rwp by more than `repeat_tol`, and the whole plan stops
+        early once Rwp improvement has stalled for `plan.patience` runs.
+
+        Parameters
+        ----------
+        plan : RefinementPlan, dict, str or os.PathLike
+            Plan object, its dict form, or a JSON path/string.
+
+        print_stage : bool
+            If True, print refinement diagnostics.
+
+        corr_threshold : float
+            Absolute correlation above which a parameter pair is flagged.
+
+        checkpoint : str, optional
+            Checkpoint file (.npz) written atomically after every stage
+            run or skip (see powerxrd.checkpoint).
+
+        resume : bool
+            If the checkpoint exists, restore model, history and plan
+            position from it and continue after the last finished run
+            instead of starting over.
+
+        Returns
+        -------
+        list of dict
+            One record per stage run or skip with the stage name,
+            Rwp before/after and the number of pattern evaluations.
+        """
+        plan = _as_plan(plan)
+
+        if checkpoint is not None and resume and os.path.exists(checkpoint):
+            state = self.load_checkpoint(checkpoint, plan=plan)
+            if print_stage:
+                print(f"\nResuming at stage {state['stage']} run {state['run']} "
+                      f"(Rwp = {state['rwp']:.2f}%)")
+        else:
+            state = self.plan_state(plan)
+
+        while True:
+            record, result = self.plan_step(plan, state, print_stage, corr_threshold)
+            if record is None:
+                break
+            if checkpoint is not None:
+                self.save_checkpoint(checkpoint, state=state, result=result)
+
+        return state["records"]
+
+    def plan_state(self, plan):
+        """
+        Fresh position/statistics for running `plan` step by step with
+        plan_step. The state is JSON-serializable, so it can be stored in
+        a checkpoint or shipped to another process.
+        """
+        return {"plan": _as_plan(plan).to_json(), "setup": self.setup_hash(), "stage": 0, "run": 0,
+                "rwp": self.rwp(), "stalled": 0, "done": False, "records": []}
+
+    def setup_hash(self):
+        """
+        Hash of what a plan runs on: the model type, lattice system,
+        wavelength/source, precision and profile settings, and `setup`.
+        Parameter values are left out, since refining changes them.
+        """
+        model = self.model
+        desc = {
+            "model": type(model).__name__,
+            "lattice": type(model.lattice).__name__,
+            "wavelength": model.wavelength,
+            "source": None if model.source is None else model.source.key(),
+            "precision": model.precision,
+            "peak_cutoff": model.peak_cutoff,
+            "profile": None if model.profile is None else model.profile.key(),
+            "params": sorted(model.param_dict()),
+            "setup": self.setup,
+        }
+        blob = json.dumps(desc, sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode()).hexdigest()
+
+    def plan_step(self, plan, state, print_stage=True, corr_threshold=0.9):
+        """
+        Advance a plan by one stage run or skip, updating `state` in place.
+
+        Returns
+        -------
+        (record, result)
+            The new record (also appended to state["records"]) and the
+            least_squares result (None for a skip), or (None, None) once
+            the plan has finished or stopped early.
+        """
+        plan = _as_plan(plan)
+
+        if state["done"] or state["stage"] >= len(plan.stages):
+            state["done"] = True
+            return None, None
+
+        # Recomputed from the data, so resumed and per-stage workers agree
+        if plan.mask_spikes and self.exclude is None:
+            self.mask_spikes()
+
+        i = state["stage"]
+        stage = plan.stages[i]
+        rwp = state["rwp"]
+
+        if state["run"] == 0:
+            for key, value in stage.set_params.items():
+                self.model.set_param(key, value)
+            if stage.set_params:
+                rwp = state["rwp"] = self.rwp()
+
+            if stage.skip_if_rwp_below is not None and rwp < stage.skip_if_rwp_below:
+                record = {"stage": stage.name, "skipped": True, "Rwp": rwp}
+                state["records"].append(record)
+                state.update(stage=i + 1, run=0)
+                if print_stage:
+                    print(f"\nSkipping stage {stage.name} (Rwp = {rwp:.2f}%)")
+                return record, None
+
+        run = state["run"]
+
+        x_fit, y_fit = self.fitted_data()
+        result = refine(
+            self.model,
+            x_fit,
+            y_fit,
+            stage.keys,
+            print_stage,
+            self.history,
+            corr_threshold,
+            **stage.solver_options()
+        )
+
+        # result.fun holds y_exp - y_calc at the solution
+        new_rwp = fit_statistics(y_fit, y_fit - result.fun)[0]
+        improvement = rwp - new_rwp
+
+        self.history[-1]["stage"] = stage.name
+        self.history[-1]["Rwp"] = new_rwp
+
+        record = {
+            "stage": stage.name,
+            "run": run,
+            "skipped": False,
+            "Rwp_before": rwp,
+            "Rwp": new_rwp,
+            "nfev": result.nfev,
+        }
+        state["records"].append(record)
+
+        stalled = state["stalled"] + 1 if improvement < plan.stall_tol else 0
+        stop = stalled >= plan.patience
+        finished = stop or improvement <= stage.repeat_tol or run + 1 == stage.repeat
+
+        state.update(rwp=new_rwp, stalled=stalled, done=stop,
+                     stage=i + 1 if finished else i, run=0 if finished else run + 1)
+
+        if stop and print_stage:
+            print(f"\nStopping early: Rwp stalled at {new_rwp:.2f}%")
+
+        return record, result
+
+    def save_checkpoint(self, path, state=None, result=None):
+        """
+        Atomically write model parameters, ESDs, refinement history and
+        `state` (plan position, statistics) to a compressed checkpoint.
+        """
+        state = dict(state or {})
+        state["history"] = self.history
+        Checkpoint.from_model(self.model, state=state, result=result).save(path)
+
+    def load_checkpoint(self, path, plan=None):
+        """
+        Restore model parameters, ESDs and history from a checkpoint and
+        return its saved state. With `plan`, the checkpoint must have been
+        written by the same plan and for the same model and setup (see
+        setup_hash).
+        """
+        ckpt = Checkpoint.load(path)
+        state = ckpt.state
+
+        saved = state.get("plan")
+        if plan is not None and saved is not None \
+                and RefinementPlan.from_json(saved).to_json() != plan.to_json():
+            raise ValueError(f"Checkpoint {path} was written by a different refinement plan.")
+
+        saved = state.get("setup")
+        if plan is not None and saved is not None and saved != self.setup_hash():
+            raise ValueError(f"Checkpoint {path} was written for a different model or preprocessing setup.")
+
+        ckpt.apply(self.model)
+        self.history = state.pop("history", [])
+        return state
+
     def plot_fit(self):
         """
         Plot current model fit vs experimental data and print fit statistics.
@@ -88,7 +376,8 @@ class RefinementWorkflow:
 
     def save_log(self, path):
         """
-        Save refinement history (parameter snapshots per stage) to JSON.
+        Save refinement history (parameter snapshots, ESDs and flagged
+        correlations per stage) to JSON.
 
         Parameters
         ----------
@@ -96,4 +385,15 @@ class RefinementWorkflow:
             Output file path.
         """
         with open(path, 'w') as f:
-            json.dump(self.history, f, indent=2)
\ No newline at end of file
+            json.dump(self.history, f, indent=2)
+
+
+def _as_plan(plan):
+    """
+    RefinementPlan from a plan object, its dict form, or a JSON path/string.
+    """
+    if isinstance(plan, (str, os.PathLike)):
+        return RefinementPlan.from_json(plan)
+    if isinstance(plan, dict):
+        return RefinementPlan.from_dict(plan)
+    return plan
@@ -0,0 +1,122 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas
+import pytest
+
+from powerxrd.batch import find_scans, load_recipe, process_file, run_batch
+from powerxrd.cli import main
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+
+PLAN = {
+    "model": {"lattice_params": {"a": 3.98}, "params": {"bkg_intercept": 0.0}},
+    "plan": {"stages": [{"keys": ["scale"]}, {"keys": ["a", "scale"]}]},
+}
+
+
+@pytest.fixture
+def scan_dir(tmp_path):
+    x = np.linspace(20, 80, 1500)
+    for i, a in enumerate([3.99, 4.0, 4.01]):
+        model = PhaseModel(lattice=CubicLattice(a=a))
+        model.params["bkg_intercept"] = 0.0
+        np.savetxt(tmp_path / f"scan{i}.xy", np.column_stack([x, model.pattern(x)]))
+    (tmp_path / "notes.txt").write_text("not a scan")
+    return tmp_path
+
+
+def test_find_scans_and_recipes(scan_dir):
+    assert len(find_scans(str(scan_dir))) == 3
+    assert len(find_scans([str(scan_dir / "scan*.xy"), str(scan_dir)])) == 3
+
+    assert "plan" in load_recipe(json.dumps(PLAN["plan"]))
+    (scan_dir / "recipe.json").write_text(json.dumps(PLAN))
+    assert load_recipe(scan_dir / "recipe.json") == PLAN
+    with pytest.raises(ValueError):
+        load_recipe({"model": {}})
+
+
+def test_run_batch_refines_and_resumes(scan_dir, tmp_path):
+    out = str(tmp_path / "summary.csv")
+    seen = []
+
+    df = run_batch(str(scan_dir), PLAN, output=out, progress=seen.append)
+    assert len(seen) == 3
+    assert (df["status"] == "ok").all()
+    assert np.allclose(df["a"], [3.99, 4.0, 4.01], atol=1e-4)
+
+    # Interrupted run: drop one journal line, only that file is redone
+    with open(out + ".jsonl") as f:
+        lines = f.readlines()
+    with open(out + ".jsonl", "w") as f:
+        f.writelines(lines[:2])
+
+    seen.clear()
+    df = run_batch(str(scan_dir), PLAN, output=out, progress=seen.append)
+    assert len(seen) == 1
+    assert len(pandas.read_csv(out)) == 3
+    assert not os.path.exists(out + ".ckpt")   # checkpoints of journaled scans are removed
+
+
+def test_checkpoint_of_changed_recipe_is_rejected(scan_dir, tmp_path):
+    scan = str(scan_dir / "scan0.xy")
+    ckpt = tmp_path / "ckpt"
+    ckpt.mkdir()
+    assert process_file(scan, PLAN, str(ckpt))["status"] == "ok"
+
+    changed = dict(PLAN, preprocess={"mav": {"n": 3}})
+    row = process_file(scan, changed, str(ckpt))
+    assert row["status"] == "error" and "different model or preprocessing" in row["error"]
+
+    assert process_file(scan, PLAN, str(ckpt))["status"] == "ok"
+
+
+def test_bad_file_is_reported_not_raised(scan_dir, tmp_path):
+    (scan_dir / "broken.xy").write_text("1 2 3\nfoo\n")
+    out = str(tmp_path / "s.csv")
+    df = run_batch(str(scan_dir), PLAN, output=out)
+
+    broken = df[df["file"].str.endswith("broken.xy")]
+    assert list(broken["status"]) == ["error"]
+    assert (df["status"] == "ok").sum() == 3
+
+    # Failed files are retried on resume and replace their error row
+    x = np.linspace(20, 80, 1500)
+    np.savetxt(scan_dir / "broken.xy", np.column_stack([x, PhaseModel(lattice=CubicLattice(a=4.0)).pattern(x)]))
+    seen = []
+    df = run_batch(str(scan_dir), PLAN, output=out, progress=seen.append)
+    assert [row["file"] for row in seen] == [str(scan_dir / "broken.xy")]
+    assert len(df) == 4 and (df["status"] == "ok").all()
+
+
+def test_process_file_prints_nothing(tmp_path, capsys):
+    x, y = np.loadtxt(Path(__file__).parent.parent / "synthetic-data" / "sample1.xy", unpack=True)
+    np.savetxt(tmp_path / "sample.xy", np.column_stack([x, y]))
+
+    recipe = {"chart": {"allpeaks": {"tols": [0.2, 0.8], "verbose": True}, "size_strain": {}}}
+    row = process_file(str(tmp_path / "sample.xy"), recipe)
+
+    assert row["status"] == "ok" and row["n_peaks"] > 0
+    assert capsys.readouterr().out == ""
+
+
+def test_cli_runs_chart_recipe_in_parallel(tmp_path, capsys):
+    scan_dir = tmp_path / "scans"
+    scan_dir.mkdir()
+    x, y = np.loadtxt(Path(__file__).parent.parent / "synthetic-data" / "sample1.xy", unpack=True)
+    for i in range(3):
+        np.savetxt(scan_dir / f"sample{i}.xy", np.column_stack([x, y * (1 + 0.1 * i)]))
+
+    recipe = json.dumps({"chart": {"allpeaks": {"tols": [0.2, 0.8]}, "size_strain": {}}})
+    out = str(tmp_path / "chart.csv")
+
+    code = main([str(scan_dir), "-r", recipe, "-o", out, "-j", "2", "-q"])
+
+    df = pandas.read_csv(out)
+    assert code == 0
+    assert len(df) == 3
+    assert (df["n_peaks"] > 0).all()
+    assert "3 scans" in capsys.readouterr().out
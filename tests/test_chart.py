@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 
 import powerxrd as xrd
@@ -56,3 +57,11 @@ def test_allpeaks_outputs_expected_format():
             raise
 
     assert isinstance(schpeaks, list)
+
+def test_emission_lines_batch_matches_single_peak(dummy_chart):
+    kb = dummy_chart.emission_lines(xrange_Ka=[10, 20], show=False)
+    ka, _ = dummy_chart.local_max(xrange=[10, 20])
+    batch = dummy_chart.emission_lines_batch([ka, 170.0], lambdas=[dummy_chart.lambdaKi, 0.2])
+    assert batch.shape == (2, 2)
+    assert batch[0, 0] == pytest.approx(kb)
+    assert np.isnan(batch[1, 1])  # 0.2 nm cannot reach this reflection
@@ -1,5 +1,9 @@
 
+import shutil
+from pathlib import Path
+
 import numpy as np
+import pytest
 
 import powerxrd as xrd
 
@@ -15,3 +19,13 @@ def test_importfile_xy():
     x, y = d.importfile()
     assert len(x) == len(y)
     assert x[0] < x[-1]
+
+
+def test_importfile_extension_is_case_insensitive(tmp_path):
+    upper = tmp_path / "S.XY"
+    shutil.copy(Path(__file__).parent.parent / 'synthetic-data' / 'sample1.xy', upper)
+    x, y = xrd.Data(str(upper)).importfile()
+    assert len(x) == len(y) > 0
+
+    with pytest.raises(ValueError, match="Unsupported file extension"):
+        xrd.Data(str(tmp_path / "scan.dat")).importfile()
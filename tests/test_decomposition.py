@@ -0,0 +1,91 @@
+import numpy as np
+
+from powerxrd.decomposition import DecompositionModel, le_bail, pawley
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.refine import fit_statistics
+
+
+def make_data():
+    truth = PhaseModel(lattice=CubicLattice(a=4.0))
+    truth.peak_cutoff = 50.0
+    truth.params["bkg_intercept"] = 0.0
+    x = np.linspace(10, 80, 2000)
+    return x, truth.pattern(x)
+
+
+def make_model(a=4.003):
+    model = DecompositionModel(lattice=CubicLattice(a=a))
+    model.params["bkg_intercept"] = 0.0
+    return model
+
+
+def test_reflections_grouped_by_d_spacing():
+    model = make_model()
+    hkls, d, twotheta, intensities = model.reflections()
+
+    assert len(hkls) == len(model.intensity_keys()) == len(model.hkl_groups)
+    assert np.all(np.diff(twotheta) > 0)
+    assert model.multiplicity[0] == 3   # (001), (010), (100)
+
+
+def test_intensity_change_reuses_cached_profiles(monkeypatch):
+    x, _ = make_data()
+    model = make_model()
+    y0 = model.pattern(x)
+
+    calls = []
+    build = model.profile_matrix
+    monkeypatch.setattr(model, "profile_matrix", lambda x: calls.append(1) or build(x))
+
+    model.set_param("I_2", 5.0)
+    y = model.pattern(x)
+    assert not calls
+    assert np.allclose(y - y0, 4.0 * build(x)[2].toarray().ravel())
+
+    model.set_param("U", model.get_param("U") * 1.1)
+    model.pattern(x)
+    assert len(calls) == 1
+
+
+def test_pattern_batch_uses_peak_intensities():
+    x, _ = make_data()
+    model = make_model()
+    model.intensities = np.linspace(10.0, 500.0, len(model.intensities))
+
+    P = np.tile(model.get_param_array(), (3, 1))
+    P[1, 0] = 4.01      # a
+    P[2, -3] = 2.0      # scale
+    Y = model.pattern_batch(x, P)
+
+    for row, y in zip(P, Y):
+        single = make_model()
+        single.intensities = model.intensities.copy()
+        single.set_param_array(row)
+        assert np.allclose(y, single.pattern(x))
+    assert np.array_equal(model.get_param_array(), P[0])
+
+
+def test_le_bail_recovers_lattice_constant():
+    x, y = make_data()
+    model = make_model()
+
+    le_bail(model, x, y, ["a"], n_cycles=3, print_stage=False)
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-5)
+    assert fit_statistics(y, model.pattern(x))[0] < 1.0
+
+
+def test_pawley_uses_sparse_jacobian():
+    x, y = make_data()
+    model = make_model()
+
+    S = model.jac_sparsity(x, model.intensity_keys())
+    assert S.nnz < 0.5 * S.shape[0] * S.shape[1]
+
+    result = pawley(model, x, y, ["a"], print_stage=False)
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-5)
+    assert fit_statistics(y, model.pattern(x))[0] < 0.5
+    assert "I_0" in result.esd
+    assert "I_0" in model.param_dict()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from powerxrd.globalsearch import global_refine
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+
+
+def make_data():
+    x = np.linspace(10, 80, 400)
+    y = PhaseModel(lattice=CubicLattice(a=4.0)).pattern(x)
+    return x, y
+
+
+@pytest.mark.parametrize("method", ["lhs", "de"])
+def test_global_refine_finds_lattice_constant(method):
+    x, y = make_data()
+    model = PhaseModel(lattice=CubicLattice(a=3.7))
+
+    result = global_refine(model, x, y, ["a"], {"a": (3.6, 4.2)},
+                           n_starts=8, method=method, seed=0, print_stage=False)
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-4)
+    assert np.isclose(result.best["a"], model.lattice.a)
+    costs = [m["cost"] for m in result.minima]
+    assert costs == sorted(costs)
+
+
+def test_global_refine_thread_pool_matches_serial():
+    x, y = make_data()
+
+    serial = global_refine(PhaseModel(lattice=CubicLattice(a=3.7)), x, y, ["a"],
+                           {"a": (3.6, 4.2)}, n_starts=6, seed=1, print_stage=False)
+    threaded = global_refine(PhaseModel(lattice=CubicLattice(a=3.7)), x, y, ["a"],
+                             {"a": (3.6, 4.2)}, n_starts=6, seed=1, workers=3,
+                             executor="thread", print_stage=False)
+
+    assert np.isclose(serial.best["a"], threaded.best["a"])
+    assert serial.n_starts == threaded.n_starts == 6
+
+
+def test_global_refine_tuple_keys_shares_cache_and_sets_esd():
+    x, y = make_data()
+    model = PhaseModel(lattice=CubicLattice(a=3.7))
+    model.pattern(x)
+
+    # Starts copy only the parameters; cached reflections are shared
+    copy = model.param_copy()
+    assert copy._cache["reflections"] is model._cache["reflections"]
+    copy.set_param("a", 3.8)
+    assert model.lattice.a == 3.7
+
+    global_refine(model, x, y, ("a", "scale"), {"a": (3.6, 4.2)},
+                  n_starts=4, seed=0, print_stage=False)
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-4)
+    assert set(model.esd) >= {"a", "scale"}
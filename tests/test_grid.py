@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import powerxrd as xrd
+from powerxrd.grid import Grid
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+
+
+def variable_step_x(n=800):
+    # Denser sampling at high angle, as in variable-counting-time scans
+    u = np.linspace(0, 1, n)
+    return 10 + 70 * u ** 0.7
+
+
+def test_uniform_grid_arithmetic_matches_searchsorted():
+    x = np.linspace(10, 80, 701)
+    grid = Grid(x)
+    assert grid.is_uniform and np.isclose(grid.step, 0.1)
+
+    values = np.concatenate([x, x + 1e-9, x - 1e-9, [0.0, 100.0], np.random.uniform(5, 85, 200)])
+    for side in ("left", "right"):
+        assert np.array_equal(grid.searchsorted(values, side), np.searchsorted(x, values, side))
+
+
+def test_variable_step_grid():
+    x = variable_step_x()
+    grid = Grid(x)
+
+    assert grid.is_sorted and not grid.is_uniform and grid.step is None
+    assert grid.select(20, 30) == slice(*np.searchsorted(x, [20, 30], side="left"))
+    assert np.all(np.abs(x[grid.nearest([15.3, 42.0])] - [15.3, 42.0]) < 0.2)
+
+
+def test_descending_grid_selects_window():
+    x = np.linspace(80, 10, 701)
+    seg = Grid(x).select(20, 30)
+    assert x[seg].min() >= 20 and x[seg].max() <= 30
+    assert len(x[seg]) == 101
+
+
+def test_unsorted_grid_falls_back_to_mask():
+    grid = Grid([3.0, 1.0, 2.0])
+    assert not grid.is_sorted
+    assert np.array_equal(grid.select(1.5, 3.0), [True, False, True])
+    with pytest.raises(ValueError):
+        grid.searchsorted(2.0)
+
+
+def test_chart_on_variable_step_grid():
+    x = variable_step_x()
+    y = 100 + 1000 * np.exp(-((x - 40) ** 2) / 0.5)
+    chart = xrd.Chart(x, y)
+
+    max_x, max_y = chart.local_max([35, 45])
+    assert abs(max_x - 40) < 0.2
+
+    newx, newy = chart.mav(n=5)
+    assert np.allclose(newx, [x[i:i + 5].mean() for i in range(len(newy))])
+
+    bx, by = chart.backsub(tol=1.0)
+    assert len(by) == len(x)
+
+
+def test_peak_windows_on_variable_step_grid():
+    x = variable_step_x(3000)
+
+    model = PhaseModel(lattice=CubicLattice(a=4.0))
+    full = model.pattern(x)
+
+    model.peak_cutoff = 50.0
+    assert np.max(np.abs(model.pattern(x) - full)) < 1e-2 * full.max()
@@ -0,0 +1,123 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from powerxrd import kernels
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.source import XraySource
+from powerxrd.structure import Atom, CrystalStructure
+
+
+def test_backend_selection():
+    before = kernels.get_backend()
+    assert before in kernels.available_backends()
+
+    with kernels.backend("numpy"):
+        assert kernels.get_backend() == "numpy"
+    assert kernels.get_backend() == before
+
+    with pytest.raises(ValueError):
+        kernels.set_backend("fortran")
+
+
+@pytest.mark.skipif(kernels.numba is not None, reason="numba is installed")
+def test_numba_backend_needs_numba():
+    with pytest.raises(ImportError):
+        kernels.set_backend("numba")
+    assert kernels.get_backend() == "numpy"
+
+
+def test_fork_fallback_only_for_auto_backend():
+    # Forked children drop to NumPy only when the backend was not chosen explicitly
+    with kernels.backend("auto"):
+        kernels._after_fork()
+        assert kernels.get_backend() == "numpy"
+
+    for name in kernels.available_backends():
+        with kernels.backend(name):
+            kernels._after_fork()
+            assert kernels.get_backend() == name
+
+
+@pytest.mark.skipif(kernels.numba is None, reason="numba not installed")
+def test_pool_context_avoids_fork_with_running_thread_pool():
+    with kernels.backend("numba"):
+        PhaseModel(lattice=CubicLattice(a=4.0)).pattern(np.linspace(20, 80, 2000))
+
+    context = kernels.pool_context()
+    if "fork" == (multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]):
+        assert context.get_start_method() == "forkserver"
+    else:
+        assert context is None
+
+
+@pytest.mark.parametrize("name", kernels.available_backends())
+def test_overridden_profile_is_used_on_every_backend(name):
+
+    class GaussianModel(PhaseModel):
+        def pseudo_voigt(self, x, center, fwhm, eta=0.5, dtype=np.float64):
+            return super().pseudo_voigt(x, center, fwhm, 0.0, dtype=dtype)
+
+    x = np.linspace(20, 80, 2000)
+    with kernels.backend(name):
+        y = GaussianModel(lattice=CubicLattice(a=4.0)).pattern(x)
+    with kernels.backend("numpy"):
+        expected = GaussianModel(lattice=CubicLattice(a=4.0)).pattern(x)
+        default = PhaseModel(lattice=CubicLattice(a=4.0)).pattern(x)
+
+    assert np.allclose(y, expected)
+    assert not np.allclose(y, default)
+
+
+# ---------------------------------
+# Numba vs NumPy equivalence
+# ---------------------------------
+needs_numba = pytest.mark.skipif(kernels.numba is None, reason="numba not installed")
+
+
+def both_backends(fn):
+    with kernels.backend("numpy"):
+        expected = fn()
+    with kernels.backend("numba"):
+        result = fn()
+    return expected, result
+
+
+@needs_numba
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+@pytest.mark.parametrize("cutoff", [None, 6.0])
+def test_numba_pattern_matches_numpy(precision, cutoff):
+    x = np.linspace(10, 120, 20_000)
+
+    def pattern():
+        model = PhaseModel(lattice=CubicLattice(a=5.43), precision=precision,
+                           wavelength=XraySource.cu_ka12())
+        model.peak_cutoff = cutoff
+        return model.pattern(x)
+
+    expected, result = both_backends(pattern)
+    rtol = 1e-12 if precision == "float64" else 1e-6
+    assert np.max(np.abs(result - expected)) <= rtol * np.max(expected)
+
+
+@needs_numba
+@pytest.mark.parametrize("space_group", [None, "Fd-3m", "F-43m"])
+def test_numba_structure_factors_match_numpy(space_group):
+    rng = np.random.default_rng(0)
+    if space_group is None:
+        n = 300
+        structure = CrystalStructure.from_arrays(
+            CubicLattice(a=12.0), rng.choice(["O", "Fe", "Sr"], size=n), rng.random((n, 3)),
+            occupancies=rng.random(n), B_iso=rng.random(n))
+    else:
+        structure = CrystalStructure(CubicLattice(a=5.43), [
+            Atom("Zn", 0.1, 0.2, 0.3, B_iso=0.3), Atom("S", 0.25, 0.25, 0.25, occupancy=0.8),
+        ], space_group=space_group)
+
+    hkls = rng.integers(-6, 7, size=(500, 3))
+    s = rng.random(500) * 0.7
+
+    expected, result = both_backends(lambda: structure.structure_factors(hkls, s, 1.5406))
+    assert np.allclose(result, expected, rtol=1e-10, atol=1e-9)
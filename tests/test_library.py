@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.library import PhaseLibrary, merge_reflections
+from powerxrd.model import PhaseModel
+from powerxrd.structure import Atom, CrystalStructure
+
+
+def candidate_models(n=200):
+    rng = np.random.default_rng(0)
+    models = {}
+    for i, a in enumerate(rng.uniform(3.0, 7.0, size=n)):
+        models[f"cubic-{i}"] = PhaseModel(lattice=CubicLattice(a=a))
+
+    si = CrystalStructure(CubicLattice(a=5.431), [Atom("Si", 1 / 8, 1 / 8, 1 / 8)], space_group="Fd-3m")
+    models["Si"] = PhaseModel(lattice=si.lattice, structure=si)
+    return models
+
+
+def test_merge_reflections_sums_equivalent_hkls():
+    d, I = merge_reflections([2.0, 1.0, 2.0, 1.5], [1.0, 2.0, 3.0, 4.0])
+    assert np.allclose(d, [2.0, 1.5, 1.0])
+    assert np.allclose(I, [4.0, 4.0, 2.0])
+
+
+def test_search_ranks_the_true_phase_first(tmp_path):
+    library = PhaseLibrary.from_models(candidate_models())
+    library.save(tmp_path / "phases")
+
+    loaded = PhaseLibrary.load(tmp_path / "phases")
+    assert isinstance(loaded.twotheta, np.memmap)
+    assert loaded.names == library.names
+    loaded.BLOCK = 100   # several blocks
+
+    tt, I = library.sticks("Si")
+    strong = (I > 5) & (tt > 20) & (tt < 80)
+    peaks = np.column_stack([tt[strong] + 0.03, I[strong]])
+
+    matches = loaded.search(peaks, tol=0.1, top=5)
+    assert matches[0].name == "Si"
+    assert matches[0].fom_observed == pytest.approx(1.0)
+    assert matches[0].shift == pytest.approx(0.03, abs=1e-4)
+    assert matches[0].score > matches[1].score
+
+    # Unblocked search gives the same ranking
+    assert [m.name for m in library.search(peaks, tol=0.1, top=5)] == [m.name for m in matches]
+
+
+def test_search_at_another_wavelength():
+    library = PhaseLibrary.from_models(candidate_models(50))
+    tt, I = library.sticks("Si", wavelength=1.7890)
+    peaks = (tt[I > 5], I[I > 5])
+
+    assert library.search(peaks, tol=0.05, top=1, wavelength=1.7890)[0].name == "Si"
@@ -0,0 +1,181 @@
+import numpy as np
+import pytest
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+
+
+def make_model(**kwargs):
+    return PhaseModel(lattice=CubicLattice(a=4.0), **kwargs)
+
+
+@pytest.mark.parametrize("U, W", [(0.01, 0.01), (0.0, 0.0004)])
+def test_float32_pattern_within_documented_bound(U, W):
+    x = np.linspace(10, 80, 5000)
+
+    m64 = make_model()
+    m32 = make_model(precision="float32")
+    for m in (m64, m32):
+        m.params.update({"U": U, "W": W})
+
+    y64 = m64.pattern(x)
+    y32 = m32.pattern(x)
+
+    assert y32.dtype == np.float64
+    peak_max = np.max(y64 - m64.params["bkg_intercept"])
+    assert np.max(np.abs(y32 - y64)) <= 1e-6 * peak_max
+
+
+def test_unknown_precision_raises():
+    with pytest.raises(ValueError):
+        make_model(precision="float16").pattern(np.linspace(10, 80, 10))
+
+
+def test_pattern_batch_matches_single_patterns():
+    model = make_model()
+    x = np.linspace(10, 80, 600)
+
+    P = np.tile(model.get_param_array(), (6, 1))
+    P[:3, 0] = [3.9, 4.0, 4.1]          # lattice constant
+    P[3:, 3] = [500.0, 1500.0, 2500.0]  # scale only
+
+    Y = model.pattern_batch(x, P)
+
+    expected = []
+    for row in P:
+        m = make_model()
+        m.set_param_array(row)
+        expected.append(m.pattern(x))
+
+    assert Y.shape == (6, x.size)
+    assert np.allclose(Y, expected)
+
+
+def test_pattern_batch_chunking_is_transparent():
+    model = make_model()
+    x = np.linspace(10, 80, 400)
+
+    P = np.tile(model.get_param_array(), (4, 1))
+    P[:, 0] = np.linspace(3.95, 4.05, 4)
+
+    assert np.allclose(model.pattern_batch(x, P),
+                       model.pattern_batch(x, P, max_bytes=4096))
+
+
+def count_calls(monkeypatch, obj, name):
+    calls = []
+    original = getattr(obj, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(obj, name, wrapper)
+    return calls
+
+
+def test_pattern_recomputes_only_changed_components(monkeypatch):
+    model = make_model()
+    x = np.linspace(10, 80, 500)
+    model.pattern(x)
+
+    profiles = count_calls(monkeypatch, model, "pseudo_voigt")
+    hkl_lists = count_calls(monkeypatch, model.lattice, "generate_hkl_list")
+
+    model.params["bkg_intercept"] = 10.0
+    model.params["scale"] = 900.0
+    y = model.pattern(x)
+    assert profiles == [] and hkl_lists == []
+
+    model.params["U"] = 0.02
+    model.pattern(x)
+    assert profiles and hkl_lists == []
+
+    model.lattice.a = 4.01
+    model.pattern(x)
+    assert hkl_lists == [1]
+
+    fresh = make_model()
+    fresh.lattice.a = 4.01
+    fresh.params.update(model.params)
+    assert np.allclose(model.pattern(x), fresh.pattern(x))
+    assert not np.allclose(y, model.pattern(x))
+
+
+def test_pattern_cache_follows_grid():
+    model = make_model()
+    x1 = np.linspace(10, 80, 300)
+    x2 = np.linspace(20, 60, 200)
+
+    model.pattern(x1)
+    assert np.allclose(model.pattern(x2), make_model().pattern(x2))
+
+
+def test_peak_cutoff_truncates_profiles():
+    x = np.linspace(10, 80, 2000)
+    full = make_model()
+    cut = make_model()
+    cut.peak_cutoff = 50.0
+
+    peak_max = np.max(full.pattern(x))
+    assert np.max(np.abs(cut.pattern(x) - full.pattern(x))) < 1e-2 * peak_max
+
+    P = np.tile(cut.get_param_array(), (2, 1))
+    assert np.allclose(cut.pattern_batch(x, P)[0], cut.pattern(x))
+
+
+def test_jac_sparsity_from_peak_windows():
+    model = make_model()
+    model.params.update({"U": 0.0, "W": 0.001})
+    x = np.linspace(10, 80, 2000)
+
+    assert model.jac_sparsity(x, ["a", "bkg_intercept"]) is None
+
+    model.peak_cutoff = 5.0
+    S = model.jac_sparsity(x, ["a", "bkg_intercept"]).toarray()
+
+    assert S.shape == (x.size, 2)
+    assert S[:, 1].all()
+    assert 0 < S[:, 0].sum() < x.size
+
+
+def test_doublet_with_zero_ratio_matches_single_line():
+    from powerxrd.source import XraySource
+
+    x = np.linspace(10, 80, 2000)
+    single = make_model()
+    doublet = make_model(wavelength=XraySource([1.5406, 1.5444], [1.0, 0.0]))
+
+    assert np.allclose(doublet.pattern(x), single.pattern(x))
+
+
+def test_doublet_places_ka2_from_shared_d_spacings():
+    from powerxrd.source import XraySource
+
+    source = XraySource.cu_ka12()
+    model = make_model(wavelength=source)
+    _, d_hkls, twothetas, _ = model.reflections()
+
+    centers, weights, index = model.line_peaks()
+    ka2 = centers[len(twothetas):]
+    expected = np.degrees(2 * np.arcsin(source.wavelengths[1] / (2 * d_hkls)))
+
+    assert np.allclose(centers[:len(twothetas)], twothetas)
+    assert np.allclose(ka2, expected)
+    assert np.allclose(weights[len(twothetas):], 0.5)
+
+
+def test_pattern_batch_with_doublet():
+    from powerxrd.source import XraySource
+
+    model = make_model(wavelength=XraySource.cu_ka12())
+    x = np.linspace(10, 80, 600)
+
+    P = np.tile(model.get_param_array(), (3, 1))
+    P[:, 0] = [3.9, 4.0, 4.1]
+
+    Y = model.pattern_batch(x, P)
+    for row, y in zip(P, Y):
+        m = make_model(wavelength=XraySource.cu_ka12())
+        m.set_param_array(row)
+        assert np.allclose(y, m.pattern(x))
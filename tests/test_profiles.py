@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from powerxrd.grid import Grid
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.profiles import FundamentalParameters
+
+
+def sample_only(**kwargs):
+    return FundamentalParameters(source_width=0.0, receiving_slit=0.0,
+                                 emission_fwhm=0.0, **kwargs)
+
+
+def single_peak(fp, size, strain, center=45.0):
+    grid = Grid(np.arange(center - 5, center + 5, 0.001))
+    y = fp.peaks(grid, np.array([center]), np.array([1.0]), np.array([1.5406]), size, strain)
+    return y, 0.001
+
+
+def test_strain_profile_is_unit_area_gaussian():
+    y, step = single_peak(sample_only(), np.inf, 2e-3)
+
+    area = y.sum() * step
+    beta = np.degrees(4 * 2e-3 * np.tan(np.radians(22.5)))
+
+    assert area == pytest.approx(1.0, rel=1e-6)
+    assert area / y.max() == pytest.approx(beta, rel=1e-4)
+
+
+def test_size_breadth_follows_scherrer():
+    y, step = single_peak(sample_only(window=4.0), 50.0, 0.0)
+
+    beta = np.degrees(0.9 * 0.15406 / (50.0 * np.cos(np.radians(22.5))))
+    assert y.sum() * step / y.max() == pytest.approx(beta, rel=0.02)
+
+
+def test_instrument_transform_is_cached_per_configuration():
+    fp = FundamentalParameters()
+    first = fp.instrument_ft()
+
+    fp.profiles(np.array([30.0, 60.0]), np.array([1.5406, 1.5406]), 40.0, 1e-3)
+    assert fp.instrument_ft() is first
+
+    fp.receiving_slit = 0.05
+    assert fp.instrument_ft() is not first
+
+
+def test_model_with_fft_profile():
+    model = PhaseModel(lattice=CubicLattice(a=4.0), profile=FundamentalParameters())
+    x = np.linspace(20, 80, 3000)
+
+    y_large = model.pattern(x).copy()
+    model.set_param("size", 25.0)
+    y_small = model.pattern(x)
+
+    # Smaller crystallites: lower, broader peaks of about the same area
+    assert y_small.max() < y_large.max()
+    assert np.trapezoid(y_small, x) == pytest.approx(np.trapezoid(y_large, x), rel=0.05)
+
+    sparsity = model.jac_sparsity(x, ["a", "size", "bkg_intercept"]).toarray()
+    assert sparsity[:, 2].all()
+    assert not sparsity[:, 1].all()
+
+    Y = model.pattern_batch(x, model.get_param_array()[None, :])
+    assert np.allclose(Y[0], y_small)
@@ -1,8 +1,9 @@
 import numpy as np
+import pytest
 
 import powerxrd.refine as rr
-from powerxrd.model import PhaseModel
 from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
 
 
 def make_model():
@@ -52,4 +53,193 @@ def test_multiple_stage_refinement():
     rr.refine(model, x, y_exp, ["a"], save_params=saved)
 
     assert len(saved) == 2
-    assert "a" in saved[1]
\ No newline at end of file
+    assert "a" in saved[1]
+
+def test_refine_reports_uncertainties():
+    model = make_model()
+
+    x = np.linspace(10, 80, 400)
+    rng = np.random.default_rng(0)
+    y_exp = model.pattern(x) + rng.normal(0, 5.0, size=x.size)
+
+    saved = []
+    result = rr.refine(model, x, y_exp, ["scale", "a"],
+                       print_stage=False, save_params=saved)
+
+    assert set(result.esd) == {"scale", "a"}
+    assert all(v > 0 for v in result.esd.values())
+    assert result.correlation.shape == (2, 2)
+    assert np.allclose(np.diag(result.correlation), 1.0)
+
+    assert model.esd_dict() == result.esd
+    assert saved[0]["esd"] == result.esd
+
+
+def test_refine_flags_correlated_pairs():
+    model = make_model()
+
+    x = np.linspace(10, 80, 400)
+    rng = np.random.default_rng(1)
+    y_exp = model.pattern(x) + rng.normal(0, 5.0, size=x.size)
+
+    result = rr.refine(model, x, y_exp, ["scale", "a"],
+                       print_stage=False, corr_threshold=0.0)
+
+    assert len(result.correlated_pairs) == 1
+    assert result.correlated_pairs[0][:2] == ("scale", "a")
+
+
+def test_refine_respects_bounds():
+    model = make_model()
+
+    x = np.linspace(10, 80, 200)
+    y_exp = model.pattern(x)
+
+    # Data that wants a negative scale cannot drive the model below zero
+    rr.refine(model, x, -y_exp, ["scale"], print_stage=False)
+
+    assert model.params["scale"] >= 0.0
+
+
+def test_refine_ties_parameters():
+    model = make_model()
+
+    x = np.linspace(10, 80, 300)
+    y_exp = model.pattern(x)
+
+    model.params["U"] = 0.02
+    result = rr.refine(model, x, y_exp, ["U", "W"], print_stage=False,
+                       ties={"W": "U"})
+
+    assert result.x.shape == (1,)
+    assert model.params["W"] == model.params["U"]
+    assert "W" in result.esd
+
+
+def test_refine_all_tied_raises():
+    model = make_model()
+    x = np.linspace(10, 80, 50)
+
+    with pytest.raises(ValueError):
+        rr.refine(model, x, model.pattern(x), ["W"], print_stage=False,
+                  ties={"W": ("U", 2.0)})
+
+
+def test_refine_with_truncated_peaks():
+    model = make_model()
+    model.peak_cutoff = 10.0
+
+    x = np.linspace(10, 80, 400)
+    y_exp = model.pattern(x)
+
+    model.params["scale"] = 1000.0
+    model.lattice.a = 4.001
+    result = rr.refine(model, x, y_exp, ["scale", "a"], print_stage=False)
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-4)
+    assert set(result.esd) == {"scale", "a"}
+
+
+def test_jac_sparsity_covers_shifted_peaks():
+    model = make_model()
+    model.peak_cutoff = 3.0
+    x = np.linspace(10, 80, 2000)
+
+    model.lattice.a = 4.0
+    final = model.param_support("a", x)
+
+    model.lattice.a = 4.01
+    start = model.param_support("a", x)
+    padded = model.param_support("a", x, rr.SPARSITY_PAD)
+
+    assert (final & ~start).any()
+    assert not (final & ~padded).any()
+
+
+def test_refine_lm_with_truncated_peaks():
+    model = make_model()
+    model.peak_cutoff = 10.0
+
+    x = np.linspace(10, 80, 400)
+    y_exp = model.pattern(x)
+
+    model.params["scale"] = 1000.0
+    model.lattice.a = 4.001
+    rr.refine(model, x, y_exp, ["a", "scale", "U"], print_stage=False, method="lm")
+
+    assert np.isclose(model.lattice.a, 4.0, atol=1e-4)
+    assert np.isclose(model.params["scale"], 1500.0, rtol=1e-3)
+
+    with pytest.raises(ValueError, match="does not support bounds"):
+        rr.refine(model, x, y_exp, ["a", "scale"], print_stage=False, method="lm",
+                  bounds={"scale": (0.0, 2000.0)})
+
+
+def contaminated_scan():
+    rng = np.random.default_rng(0)
+    x = np.linspace(10, 80, 3000)
+    y = make_model().pattern(x) + rng.normal(0, 5, x.size)
+
+    zingers = rng.choice(x.size, 25, replace=False)
+    y[zingers] += rng.uniform(2000, 8000, zingers.size)
+    y += 600 * np.exp(-0.5 * ((x - 33.0) / 0.1) ** 2)      # impurity peak
+    return x, y, zingers
+
+
+def test_spike_mask_finds_zingers_but_keeps_peaks():
+    x, y, zingers = contaminated_scan()
+    mask = rr.spike_mask(y)
+
+    assert set(np.flatnonzero(mask)) <= set(zingers)
+    assert mask.sum() >= 0.8 * len(zingers)
+    assert not rr.spike_mask(make_model().pattern(x)).any()
+
+    # Row-wise on a stack
+    assert np.array_equal(rr.spike_mask(np.stack([y, y]))[1], mask)
+
+
+@pytest.mark.parametrize("loss", ["soft_l1", "huber", "cauchy"])
+def test_robust_refine_resists_outliers(loss):
+    x, y, _ = contaminated_scan()
+    keys = ["a", "scale", "U", "W", "bkg_intercept"]
+
+    def start():
+        model = PhaseModel(lattice=CubicLattice(a=3.999))
+        model.params.update(scale=1300.0, U=0.012, bkg_intercept=80.0)
+        return model
+
+    plain = start()
+    rr.refine(plain, x, y, keys, print_stage=False)
+    assert plain.params["bkg_intercept"] > 120          # pulled up by the outliers
+
+    robust = start()
+    result = rr.refine(robust, x, y, keys, print_stage=False, loss=loss, exclude=rr.spike_mask(y))
+
+    assert robust.params["bkg_intercept"] == pytest.approx(100.0, abs=1.0)
+    assert robust.params["scale"] == pytest.approx(1500.0, rel=1e-3)
+    assert robust.lattice.a == pytest.approx(4.0, abs=1e-5)
+    assert len(result.fun) < len(x)
+
+
+def test_unknown_loss_is_rejected():
+    model = make_model()
+    x = np.linspace(10, 80, 100)
+    with pytest.raises(ValueError):
+        rr.refine(model, x, model.pattern(x), ["scale"], print_stage=False, loss="l3")
+
+
+def test_robust_refine_esd_uses_raw_residuals():
+    rng = np.random.default_rng(1)
+    x = np.linspace(10, 80, 3000)
+    y = make_model().pattern(x) + rng.normal(0, 5, x.size)
+    keys = ["a", "scale", "bkg_intercept"]
+
+    plain = make_model()
+    rr.refine(plain, x, y, keys, print_stage=False)
+
+    # Most residuals exceed f_scale, so the loss-weighted Jacobian differs
+    robust = make_model()
+    result = rr.refine(robust, x, y, keys, print_stage=False, loss="cauchy", f_scale=2.0)
+
+    for key in keys:
+        assert result.esd[key] == pytest.approx(plain.esd[key], rel=0.05)
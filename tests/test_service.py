@@ -0,0 +1,194 @@
+import asyncio
+import sys
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.service import InlineExecutor, RefinementService
+
+RECIPE = {
+    "model": {"lattice_params": {"a": 3.98}, "params": {"bkg_intercept": 0.0}},
+    "plan": {"stages": [{"keys": ["scale"]}, {"keys": ["a", "scale"]}], "patience": 5},
+}
+
+
+def make_scan(a):
+    x = np.linspace(20, 80, 800)
+    model = PhaseModel(lattice=CubicLattice(a=a))
+    model.params["bkg_intercept"] = 0.0
+    return x, model.pattern(x)
+
+
+async def collect(service):
+    return [event async for event in service.events()]
+
+
+def test_service_streams_stage_events_and_results():
+    stdout = sys.stdout
+
+    async def main():
+        service = RefinementService(RECIPE, workers=2, executor=ThreadPoolExecutor(2))
+        async with service:
+            consumer = asyncio.create_task(collect(service))
+            jobs = [await service.submit(*make_scan(a)) for a in (3.99, 4.01)]
+        return jobs, await consumer, service.results
+
+    jobs, events, results = asyncio.run(main())
+    # Threaded tasks must leave the process-wide stdout alone
+    assert sys.stdout is stdout
+
+    for job in jobs:
+        kinds = [e.kind for e in events if e.job_id == job]
+        assert kinds == ["queued", "started", "stage", "stage", "done"]
+    assert results[jobs[0]]["a"] == pytest.approx(3.99, abs=1e-4)
+    assert results[jobs[1]]["a"] == pytest.approx(4.01, abs=1e-4)
+
+
+class GatedExecutor(Executor):
+    """
+    Thread pool whose tasks wait for `gate` to be set before running.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.pool = ThreadPoolExecutor(1)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        self.gate.wait()
+        return fn(*args, **kwargs)
+
+    def shutdown(self, wait=True, **kwargs):
+        self.gate.set()
+        self.pool.shutdown(wait=wait, **kwargs)
+
+
+def test_submit_applies_backpressure():
+    executor = GatedExecutor()
+
+    async def main():
+        service = await RefinementService(RECIPE, workers=1, max_pending=1,
+                                          executor=executor).start()
+        scan = make_scan(3.99)
+        events = service.events()
+
+        # The worker takes the first job and blocks on the closed gate
+        first = await service.submit(*scan)
+        async for event in events:
+            if event.job_id == first and event.kind == "started":
+                break
+
+        # One job fills the queue; the third submit waits for room
+        await service.submit(*scan)
+        third = asyncio.create_task(service.submit(*scan))
+        done, _ = await asyncio.wait({third}, timeout=0.05)
+        assert not done
+        assert service.pending() == 1
+
+        executor.gate.set()
+        await third
+        await service.close()
+        return service.results
+
+    assert len(asyncio.run(main())) == 3
+    executor.shutdown()
+
+
+def test_cancel_queued_and_running_jobs():
+    recipe = dict(RECIPE, plan={"stages": [{"keys": ["scale"]}, {"keys": ["a"]},
+                                           {"keys": ["a", "scale"]}], "patience": 5})
+
+    async def main():
+        service = await RefinementService(recipe, workers=1,
+                                          executor=ThreadPoolExecutor(1)).start()
+        scan = make_scan(4.0)
+        first = await service.submit(*scan)
+        second = await service.submit(*scan)
+        service.cancel(second)
+
+        events, finished = [], set()
+        async for event in service.events():
+            events.append(event)
+            # Stop the first job after its first stage
+            if event.job_id == first and event.kind == "stage":
+                service.cancel(first)
+            if event.kind in ("done", "cancelled", "failed"):
+                finished.add(event.job_id)
+            if finished == {first, second}:
+                break
+
+        await service.close()
+        return first, second, events
+
+    first, second, events = asyncio.run(main())
+
+    kinds = [e.kind for e in events if e.job_id == first]
+    assert kinds[-1] == "cancelled"
+    assert 1 <= kinds.count("stage") < 3
+    assert [e.kind for e in events if e.job_id == second] == ["queued", "cancelled"]
+
+
+def test_inline_executor_runs_in_process():
+
+    async def main():
+        async with RefinementService(RECIPE, workers=1, executor=InlineExecutor()) as service:
+            consumer = asyncio.create_task(collect(service))
+            job = await service.submit(*make_scan(3.99))
+        return job, await consumer, service.results
+
+    job, events, results = asyncio.run(main())
+    assert [e.kind for e in events] == ["queued", "started", "stage", "stage", "done"]
+    assert results[job]["a"] == pytest.approx(3.99, abs=1e-4)
+
+
+def test_stages_reuse_resident_workflow(monkeypatch):
+    from collections import OrderedDict
+
+    import powerxrd.service as service_module
+
+    monkeypatch.setattr(service_module, "_RESIDENT", OrderedDict())
+    built = []
+    real = service_module._workflow
+    monkeypatch.setattr(service_module, "_workflow", lambda *args: built.append(1) or real(*args))
+
+    async def main():
+        async with RefinementService(RECIPE, workers=1, executor=InlineExecutor()) as service:
+            job = await service.submit(*make_scan(3.99))
+        return service.results[job]
+
+    assert asyncio.run(main())["a"] == pytest.approx(3.99, abs=1e-4)
+    assert len(built) == 1              # scan preprocessed and model built once
+    assert not service_module._RESIDENT   # dropped when the plan finished
+
+
+def test_close_before_start_and_bounded_events():
+
+    async def main():
+        await RefinementService(RECIPE, executor=InlineExecutor()).close()
+
+        service = RefinementService(RECIPE, workers=1, executor=InlineExecutor(), max_events=3)
+        async with service:
+            job = await service.submit(*make_scan(3.99))
+        return job, await collect(service)
+
+    job, events = asyncio.run(main())
+    assert [e.kind for e in events] == ["stage", "done"]
+
+
+def test_service_with_process_pool():
+
+    async def main():
+        async with RefinementService(RECIPE, workers=2) as service:
+            consumer = asyncio.create_task(collect(service))
+            job = await service.submit(*make_scan(3.99))
+        return job, await consumer, service.results
+
+    job, events, results = asyncio.run(main())
+    assert events[-1].kind == "done"
+    assert results[job]["a"] == pytest.approx(3.99, abs=1e-4)
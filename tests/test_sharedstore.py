@@ -0,0 +1,115 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import powerxrd as xrd
+from powerxrd import sharedstore
+from powerxrd.batch import run_batch
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.service import RefinementService
+from powerxrd.sharedstore import SharedDatasetStore, attach
+
+PLAN = {
+    "model": {"lattice_params": {"a": 3.98}, "params": {"bkg_intercept": 0.0}},
+    "plan": {"stages": [{"keys": ["scale"]}, {"keys": ["a", "scale"]}], "patience": 5},
+}
+
+
+def make_scan(a):
+    x = np.linspace(20, 80, 800)
+    model = PhaseModel(lattice=CubicLattice(a=a))
+    model.params["bkg_intercept"] = 0.0
+    return x, model.pattern(x)
+
+
+def test_put_attach_and_refcounted_cleanup():
+    store = SharedDatasetStore()
+    x, y = make_scan(4.0)
+
+    handle = store.put(x, y, key="scan")
+    xv, yv = attach(handle)
+    assert np.array_equal(xv, x) and np.array_equal(yv, y)
+    assert not yv.flags.writeable
+    assert store.put(x, y, key="scan") == handle
+
+    assert store.refcount(handle) == 2
+    store.release(handle)
+    assert "scan" in store
+    store.release("scan")
+    assert "scan" not in store
+
+    # Block is unlinked, existing views stay valid
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle.name)
+    assert np.array_equal(yv, y)
+
+
+def test_spawned_worker_maps_by_handle():
+    x, y = make_scan(4.0)
+
+    with SharedDatasetStore() as store:
+        handle = store.put(x, y)
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+            xw, yw = pool.submit(attach, handle).result()
+
+        # The exited worker neither unlinked nor closed the owner's block
+        block = shared_memory.SharedMemory(name=handle.name)
+        block.close()
+        assert np.array_equal(store.get(handle)[1], y)
+
+    assert np.array_equal(xw, x) and np.array_equal(yw, y)
+    assert len(store) == 0
+
+
+def test_worker_mappings_dropped_after_owner_releases(monkeypatch):
+    monkeypatch.setattr(sharedstore, "_MAPPED", sharedstore.OrderedDict())
+    x, y = make_scan(4.0)
+
+    with SharedDatasetStore() as store:
+        first = store.put(x, y)
+        second = store.put(x, 2 * y)
+
+        # A worker process maps blocks by name
+        for handle in (first, second):
+            sharedstore._MAPPED[handle.name] = sharedstore._Mapping(sharedstore._attach_block(handle.name))
+        view = sharedstore._MAPPED[first.name].array((2, first.n_points), first.dtype)
+
+        store.release(first)
+        assert np.array_equal(attach(second)[1], 2 * y)
+
+        assert list(sharedstore._MAPPED) == [second.name]
+        assert np.array_equal(view[1], y)   # views keep their mapping
+
+
+def test_batch_and_service_accept_handles(tmp_path):
+    path = tmp_path / "scan.xy"
+    np.savetxt(path, np.column_stack(make_scan(3.99)))
+
+    with SharedDatasetStore() as store:
+        handle = xrd.Data(str(path)).load_into(store)
+        assert handle.key == str(path)
+
+        df = run_batch([handle], PLAN, output=str(tmp_path / "s.csv"), workers=2)
+        assert list(df["file"]) == [handle.key]
+        assert df["a"].iloc[0] == pytest.approx(3.99, abs=1e-4)
+
+        chart_df = run_batch(handle, {"chart": {"backsub": {"tol": 1.0}}},
+                             output=str(tmp_path / "c.csv"))
+        assert list(chart_df["status"]) == ["ok"]
+
+        async def main():
+            service = RefinementService(PLAN, workers=1, executor=ThreadPoolExecutor(1),
+                                        store=store)
+            async with service:
+                job = await service.submit(handle)
+                assert store.refcount(handle) == 2
+            return service.results[job]
+
+        assert asyncio.run(main())["a"] == pytest.approx(3.99, abs=1e-4)
+        assert store.refcount(handle) == 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import powerxrd as xrd
+from powerxrd.sizestrain import caglioti_fit, instrument_fwhm, size_strain
+
+LAMBDA = 0.15406
+
+
+def broadened_widths(twotheta, size, strain, inst=None):
+    '''Integral breadths (deg) of peaks with size and strain broadening added linearly'''
+    theta = np.radians(np.asarray(twotheta) / 2)
+    beta = 0.9 * LAMBDA / (size * np.cos(theta)) + 4 * strain * np.tan(theta)
+    B = np.degrees(beta)
+    if inst is not None:
+        B = np.sqrt(B ** 2 + inst ** 2)
+    return B
+
+
+def test_williamson_hall_recovers_size_and_strain():
+    tt = np.array([28.4, 47.3, 56.1, 69.1, 76.4, 88.0])
+    res = size_strain(tt, broadened_widths(tt, 40.0, 2e-3))
+
+    assert res.size[0] == pytest.approx(40.0, rel=1e-6)
+    assert res.strain[0] == pytest.approx(2e-3, rel=1e-6)
+    assert res.r2[0] == pytest.approx(1.0)
+    assert res.n_peaks[0] == 6
+
+
+def test_batch_rows_match_single_scans_with_padding():
+    tt = np.array([[28.4, 47.3, 56.1, 69.1],
+                   [30.0, 50.0, 70.0, np.nan]])
+    fwhm = np.vstack([broadened_widths(tt[0], 25.0, 1e-3),
+                      broadened_widths(tt[1], 60.0, 3e-3)])
+
+    batch = size_strain(tt, fwhm, method="ssp")
+    for i in range(2):
+        ok = np.isfinite(tt[i])
+        single = size_strain(tt[i, ok], fwhm[i, ok], method="ssp")
+        assert batch.size[i] == pytest.approx(single.size[0])
+        assert batch.strain[i] == pytest.approx(single.strain[0])
+
+    assert list(batch.n_peaks) == [4, 3]
+    assert set(batch.to_dict()) >= {"method", "size", "strain", "r2"}
+
+
+def test_instrumental_correction_from_standard():
+    tt = np.array([28.4, 47.3, 56.1, 69.1, 76.4, 88.0])
+    U, V, W = 0.004, -0.002, 0.003
+    std_tt = np.linspace(20, 100, 12)
+    std_fwhm = instrument_fwhm(std_tt, (U, V, W))
+
+    assert np.allclose(caglioti_fit(std_tt, std_fwhm), [U, V, W])
+
+    observed = broadened_widths(tt, 40.0, 2e-3, inst=instrument_fwhm(tt, (U, V, W)))
+    res = size_strain(tt, observed, standard=(std_tt, std_fwhm))
+    assert res.size[0] == pytest.approx(40.0, rel=1e-6)
+
+
+def test_chart_size_strain_uses_chart_constants():
+    tt = np.array([28.4, 47.3, 56.1, 69.1])
+    peaks = np.column_stack([tt, np.ones(4), np.ones(4), broadened_widths(tt, 40.0, 0.0)])
+
+    chart = xrd.Chart(np.linspace(10, 90, 10), np.zeros(10))
+    res = chart.size_strain(peaks)
+
+    assert res.size[0] == pytest.approx(40.0, rel=1e-6)
+    assert res.strain[0] == pytest.approx(0.0, abs=1e-9)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from powerxrd.chart import Chart
+from powerxrd.stack import ScanStack
+
+
+def make_scans(x, n=23, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(25, 65, size=(n, 3))
+    y = 50 + 5 * rng.random((n, x.size))
+    y += (1000 * np.exp(-0.5 * ((x[None, None, :] - centers[:, :, None]) / 0.2) ** 2)).sum(axis=1)
+    return y
+
+
+@pytest.mark.parametrize("uniform", [True, False])
+def test_block_kernels_match_chart(tmp_path, uniform):
+    x = np.linspace(20, 70, 1500) if uniform else np.sort(np.random.default_rng(1).uniform(20, 70, 1500))
+    stack = ScanStack.create(tmp_path / "raw", x, 23, dtype=np.float64, max_bytes=5 * 8 * 8 * 1500)
+    stack.y[:] = make_scans(x)
+    assert stack.rows_per_block() == 5
+
+    smooth = stack.mav(4, out=tmp_path / "smooth")
+    back = smooth.backsub(tol=1)
+
+    for i in (0, 7, 22):
+        cx, cy = stack.chart(i).mav(4)
+        assert np.allclose(smooth.x, cx) and np.allclose(smooth.y[i], cy)
+
+        bx, by = Chart(cx, cy.copy()).backsub(tol=1)
+        assert np.allclose(back.y[i], by)
+
+    reopened = ScanStack.open(tmp_path / "smooth")
+    assert isinstance(reopened.y, np.memmap)
+    assert np.array_equal(reopened.y, smooth.y)
+
+
+def test_from_files_and_peak_mask(tmp_path):
+    x = np.linspace(20, 70, 2000)
+    y = make_scans(x, n=4)
+    files = []
+    for i, row in enumerate(y):
+        # Second file on a coarser axis: interpolated onto the first
+        xi = x if i != 1 else x[::2]
+        yi = row if i != 1 else row[::2]
+        files.append(tmp_path / f"scan{i}.xy")
+        np.savetxt(files[-1], np.column_stack([xi, yi]))
+
+    stack = ScanStack.from_files(files, tmp_path / "stack", max_bytes=1)
+    assert stack.shape == (4, 2000)
+    assert np.allclose(stack.y[0], y[0], rtol=1e-6)
+
+    mask = stack.peak_mask(rel_height=0.5, order=20, out=tmp_path / "peaks")
+    assert mask.y.dtype == np.bool_
+    positions = stack.peak_positions(mask)
+    assert all(1 <= len(p) <= 3 for p in positions)
+
+    # Without `out`, results beyond max_bytes go to a temporary memmap
+    assert isinstance(stack.peak_mask(rel_height=0.5, order=20).y, np.memmap)
+    computed = stack.peak_positions(rel_height=0.5, order=20)
+    assert all(np.array_equal(p, q) for p, q in zip(positions, computed))
@@ -0,0 +1,213 @@
+import numpy as np
+import pytest
+
+from powerxrd import formfactors, kernels
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.structure import Atom, CrystalStructure
+from powerxrd.symmetry import SpaceGroup, parse_operator, space_group
+
+ATOMS = [
+    Atom("Sr", 0.0, 0.0, 0.0),
+    Atom("Ti", 0.5, 0.5, 0.5, B_iso=0.4),
+    Atom("O", 0.5, 0.5, 0.0, occupancy=0.9),
+    Atom("O", 0.5, 0.0, 0.5),
+    Atom("O", 0.0, 0.5, 0.5),
+]
+
+
+def reference_F(structure, hkl, s, wavelength=None):
+    h, k, l = hkl
+    return sum(
+        a.occupancy * structure.atomic_scattering_factor(a.element, s, wavelength)
+        * np.exp(2j * np.pi * (h * a.x + k * a.y + l * a.z))
+        * np.exp(-a.B_iso * s ** 2)
+        for a in structure.atoms
+    )
+
+
+def test_arrays_and_atom_roundtrip():
+    structure = CrystalStructure(CubicLattice(a=3.9), ATOMS)
+
+    assert structure.positions.shape == (5, 3)
+    assert structure.elements == ["O", "Sr", "Ti"]
+    assert [structure.elements[i] for i in structure.element_ids] == [a.element for a in ATOMS]
+    assert structure.atoms == ATOMS
+
+
+def test_atoms_view_writes_through():
+    structure = CrystalStructure(CubicLattice(a=3.9), ATOMS)
+    model = PhaseModel(lattice=structure.lattice, structure=structure)
+    before = model.reflections()[3].copy()
+    version = structure.version
+
+    # Baseline-style in-place edits reach the arrays and invalidate caches
+    structure.atoms[2].occupancy = 0.5
+    structure.atoms[0].x = 0.25
+    assert structure.occupancies[2] == 0.5 and structure.positions[0, 0] == 0.25
+    assert structure.version > version
+    assert not np.allclose(model.reflections()[3], before)
+
+    structure.atoms.append(Atom("Ba", 0.5, 0.0, 0.0))
+    structure.atoms[1].element = "Zr"
+    assert len(structure) == 6
+    assert [a.element for a in structure.atoms] == ["Sr", "Zr", "O", "O", "O", "Ba"]
+
+    del structure.atoms[-1]
+    assert structure.atoms == structure.atoms.copy() and len(structure) == 5
+
+    # copy() gives detached Atom objects
+    atom = structure.atoms.copy()[0]
+    atom.x = 0.0
+    assert structure.positions[0, 0] == 0.25
+    assert ATOMS[0].x == 0.0
+
+
+@pytest.mark.parametrize("form_factors, wavelength", [("z", None), ("waasmaier", None), ("waasmaier", 1.5406)])
+def test_bulk_structure_factors_match_per_atom_sum(form_factors, wavelength):
+    structure = CrystalStructure(CubicLattice(a=3.9), ATOMS, form_factors=form_factors)
+    hkls = np.array([[1, 0, 0], [1, 1, 0], [1, 1, 1], [2, 1, 0], [3, 2, 1]])
+    s = np.linspace(0.1, 0.5, len(hkls))
+
+    F = structure.structure_factors(hkls, s, wavelength)
+    expected = [reference_F(structure, hkl, si, wavelength) for hkl, si in zip(hkls, s)]
+
+    assert np.allclose(F, expected)
+    assert structure.structure_factor((1, 1, 0), s[1], wavelength) == pytest.approx(expected[1])
+
+
+def test_single_and_bulk_intensities_agree_with_anomalous_dispersion():
+    structure = CrystalStructure(CubicLattice(a=2.87), [Atom("Fe", 0, 0, 0), Atom("Fe", 0.5, 0.5, 0.5)])
+    model = PhaseModel(lattice=structure.lattice, structure=structure, wavelength=1.5406)
+    hkls = [(1, 1, 0), (2, 0, 0), (2, 1, 1)]
+    twothetas = np.array([44.7, 65.0, 82.3])
+
+    bulk = model.reflection_intensities(hkls, twothetas)
+    single = [model.f_squared(np.array(hkl), tt) for hkl, tt in zip(hkls, twothetas)]
+    assert np.allclose(single, bulk)
+
+
+def test_form_factor_values():
+    # f0(0) is the electron count; it falls off with s
+    f = formfactors.f0(["Fe", "O", "O2-", "Sr"], [0.0, 0.5])
+    assert f[:, 0] == pytest.approx([26, 8, 10, 38], abs=0.02)
+    assert np.all(f[:, 1] < f[:, 0])
+
+    # Fe near its K edge under Cu Kα: f' ≈ -1.1, f'' ≈ 3.2
+    f_Fe = formfactors.form_factors(["Fe"], [0.0], wavelength=1.5406)[0, 0]
+    assert f_Fe.real == pytest.approx(26 - 1.1, abs=0.2)
+    assert f_Fe.imag == pytest.approx(3.2, abs=0.3)
+
+    with pytest.raises(ValueError):
+        formfactors.coefficients("Xx")
+
+
+def test_form_factors_evaluated_once_per_element_and_reflection_set(monkeypatch):
+    calls = []
+    original = formfactors.form_factors
+
+    def counting(symbols, s, wavelength=None):
+        calls.append(list(symbols))
+        return original(symbols, s, wavelength)
+
+    monkeypatch.setattr(formfactors, "form_factors", counting)
+
+    structure = CrystalStructure(CubicLattice(a=3.9), ATOMS)
+    model = PhaseModel(lattice=structure.lattice, structure=structure)
+    model.reflections()
+    model.invalidate_cache()
+    model.reflections()
+
+    assert calls == [["O", "Sr", "Ti"]]
+
+
+def test_large_cell_is_blocked_and_cached_by_version():
+    rng = np.random.default_rng(0)
+    n = 600
+    elements = rng.choice(["O", "Ti", "Fe", "C"], size=n)
+    structure = CrystalStructure.from_arrays(CubicLattice(a=12.0), elements, rng.random((n, 3)))
+    structure.BLOCK = 7
+
+    hkls = rng.integers(-4, 5, size=(20, 3))
+    assert np.allclose(structure.structure_factors(hkls, 0.2),
+                       [reference_F(structure, hkl, 0.2) for hkl in hkls])
+
+    model = PhaseModel(lattice=structure.lattice, structure=structure)
+    before = model.reflections()[3].copy()
+
+    structure.occupancies[:] = 0.5
+    assert np.array_equal(model.reflections()[3], before)   # in-place edit not seen yet
+    structure.touch()
+    assert np.allclose(model.reflections()[3], before * 0.25)
+
+
+def test_space_group_closure_and_site_multiplicities():
+    assert len(space_group("Fm-3m")) == 192
+    assert space_group(227) is space_group("Fd-3m")
+
+    R, t = parse_operator("-y+1/2, x, z+3/4")
+    assert np.array_equal(R, [[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+    assert np.allclose(t, [0.5, 0, 0.75])
+
+    # Fd-3m (origin 2): 8a, 16c, 32e, general 192i
+    positions = [[1 / 8, 1 / 8, 1 / 8], [0, 0, 0], [0.3, 0.3, 0.3], [0.1, 0.2, 0.3]]
+    assert list(space_group("Fd-3m").multiplicities(positions)) == [8, 16, 32, 192]
+
+    # Generators given as xyz strings close to the full group
+    assert len(SpaceGroup("P4/mmm", ["-y,x,z", "x,-y,-z", "-x,-y,-z"]).rotations) == 16
+
+
+@pytest.mark.parametrize("symbol, atoms", [
+    ("Pm-3m", [Atom("Sr", 0, 0, 0), Atom("Ti", 0.5, 0.5, 0.5, B_iso=0.4), Atom("O", 0.5, 0.5, 0.0, occupancy=0.9)]),
+    ("Fd-3m", [Atom("Si", 1 / 8, 1 / 8, 1 / 8, B_iso=0.5)]),
+    ("F-43m", [Atom("Zn", 0, 0, 0), Atom("S", 0.25, 0.25, 0.25)]),
+    ("Pa-3", [Atom("Fe", 0, 0, 0), Atom("S", 0.385, 0.385, 0.385)]),
+    # special and general positions together
+    ("Fm-3m", [Atom("Na", 0, 0, 0), Atom("Cl", 0.5, 0.5, 0.5), Atom("O", 0.1, 0.2, 0.3, occupancy=0.1)]),
+    ("Fd-3m", [Atom("Si", 0.1, 0.2, 0.3, B_iso=0.5)]),
+])
+def test_symmetric_structure_factors_match_expanded_cell(symbol, atoms):
+    structure = CrystalStructure(CubicLattice(a=5.43), atoms, space_group=symbol)
+    full = structure.expanded()
+    assert full.space_group is None and len(full) > len(structure)
+
+    rng = np.random.default_rng(1)
+    hkls = rng.integers(-5, 6, size=(40, 3))
+    s = rng.random(40) * 0.6
+
+    assert np.allclose(structure.structure_factors(hkls, s, 1.5406),
+                       full.structure_factors(hkls, s, 1.5406))
+
+
+def test_special_positions_summed_over_their_orbit(monkeypatch):
+    calls = {"sym": 0, "p1": []}
+    sym, p1 = kernels.structure_factors_sym, kernels.structure_factors_p1
+
+    def count_sym(*args, **kwargs):
+        calls["sym"] += 1
+        return sym(*args, **kwargs)
+
+    def count_p1(hkls, s, positions, *args, **kwargs):
+        calls["p1"].append(len(positions))
+        return p1(hkls, s, positions, *args, **kwargs)
+
+    monkeypatch.setattr(kernels, "structure_factors_sym", count_sym)
+    monkeypatch.setattr(kernels, "structure_factors_p1", count_p1)
+
+    # NaCl: 4a and 4b give 8 atoms, far fewer than the 24 operator terms of Fm-3m
+    nacl = CrystalStructure(CubicLattice(a=5.64), [Atom("Na", 0, 0, 0), Atom("Cl", 0.5, 0.5, 0.5)],
+                            space_group="Fm-3m")
+    nacl.structure_factors([[1, 1, 1], [2, 0, 0]], 0.1)
+    assert calls == {"sym": 0, "p1": [8]}
+
+    # A general position (192 images) keeps the operator sum
+    general = CrystalStructure(CubicLattice(a=5.64), [Atom("O", 0.13, 0.27, 0.41)], space_group="Fm-3m")
+    general.structure_factors([[1, 1, 1], [2, 0, 0]], 0.1)
+    assert calls == {"sym": 1, "p1": [8]}
+
+
+def test_diamond_extinctions():
+    structure = CrystalStructure(CubicLattice(a=5.43), [Atom("Si", 1 / 8, 1 / 8, 1 / 8)], space_group="Fd-3m")
+    F = structure.structure_factors([[1, 1, 1], [2, 0, 0], [2, 2, 0], [2, 2, 2]], 0.0)
+    assert np.allclose(np.abs(F[[1, 3]]), 0, atol=1e-9)
+    assert np.abs(F[2]) == pytest.approx(8 * 14, rel=1e-3)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from powerxrd.stack import ScanStack
+from powerxrd.tracking import assign, seed_peaks, track_peaks
+
+
+def drifting_series(n_scans=120, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(20, 60, 4000)
+    t = np.arange(n_scans)[:, None]
+    centers = np.array([28.0, 35.0, 35.8, 50.0]) + np.array([0.004, -0.003, 0.002, 0.0]) * t
+    heights = np.array([800.0, 500.0, 300.0, 600.0]) * (1 + 0.3 * np.sin(t / 20))
+    sigma = 0.08
+
+    y = 40 + rng.normal(0, 3, (n_scans, x.size))
+    y += (heights[..., None] * np.exp(-0.5 * ((x - centers[..., None]) / sigma) ** 2)).sum(axis=1)
+    return x, y, centers, heights, sigma
+
+
+def test_assignment_is_one_to_one():
+    assert list(assign([10.0, 10.2], [10.15, 10.35], 0.3)) == [0, 1]
+    assert list(assign([10.0, 10.2], [10.15, 10.35], 0.3, method="nearest")) == [0, 0]
+    assert list(assign([10.0, 12.0], [10.05], 0.1)) == [0, -1]
+
+
+@pytest.mark.parametrize("as_stack", [False, True])
+def test_track_drifting_peaks(tmp_path, as_stack):
+    x, y, centers, heights, sigma = drifting_series()
+    seeds = seed_peaks(x, y[0], rel_height=0.2, order=10)
+    assert len(seeds) == 4
+
+    scans = y
+    if as_stack:
+        scans = ScanStack.create(tmp_path / "series", x, len(y), dtype=np.float64, max_bytes=7 * 8 * 8 * x.size)
+        scans.y[:] = y
+
+    tracks = track_peaks(x, scans, seeds, window=0.5)
+
+    assert tracks.center.shape == (len(y), 4)
+    assert np.all(tracks.matched)
+    assert np.allclose(tracks.center, centers, atol=0.01)
+    assert np.allclose(tracks.height, heights, rtol=0.05)
+    assert np.allclose(tracks.fwhm, sigma * 2 * np.sqrt(2 * np.log(2)), rtol=0.05)
+    assert len(tracks.to_dict()["scan"]) == len(y) * 4
@@ -0,0 +1,193 @@
+import json
+
+import numpy as np
+import pytest
+
+from powerxrd.lattice import CubicLattice
+from powerxrd.model import PhaseModel
+from powerxrd.strategy import RefinementPlan, RefinementStage
+from powerxrd.workflow import RefinementWorkflow
+
+
+def make_workflow():
+    truth = PhaseModel(lattice=CubicLattice(a=4.0))
+    x = np.linspace(10, 80, 400)
+    y = truth.pattern(x)
+
+    model = PhaseModel(lattice=CubicLattice(a=4.0))
+    model.params["scale"] = 1000.0
+    model.params["bkg_intercept"] = 50.0
+    return RefinementWorkflow(model, x, y)
+
+
+def test_plan_json_roundtrip(tmp_path):
+    plan = RefinementPlan([
+        RefinementStage(["scale"]),
+        RefinementStage(["a"], set_params={"a": 3.99}, repeat=3, max_nfev=50),
+    ], stall_tol=0.05)
+
+    path = tmp_path / "plan.json"
+    plan.to_json(path)
+
+    loaded = RefinementPlan.from_json(path)
+    assert loaded == plan
+    assert RefinementPlan.from_json(str(path)) == plan
+    assert make_workflow().run_plan(path, print_stage=False)
+    assert RefinementPlan.from_json(plan.to_json()) == plan
+    assert json.loads(path.read_text())["stages"][1]["set_params"] == {"a": 3.99}
+
+
+def test_run_plan_improves_fit_and_records_stages():
+    rw = make_workflow()
+    rwp0 = rw.rwp()
+
+    plan = RefinementPlan([
+        RefinementStage(["scale"]),
+        RefinementStage(["bkg_intercept"]),
+    ], patience=5)
+
+    records = rw.run_plan(plan, print_stage=False)
+
+    assert [r["stage"] for r in records] == ["scale", "bkg_intercept"]
+    assert records[-1]["Rwp"] < rwp0
+    assert np.isclose(records[-1]["Rwp"], rw.rwp())
+    assert rw.history[-1]["stage"] == "bkg_intercept"
+
+
+def test_run_plan_skips_and_stops_early():
+    rw = make_workflow()
+
+    plan = RefinementPlan([
+        RefinementStage(["scale"], skip_if_rwp_below=1e-6),
+        RefinementStage(["scale", "bkg_intercept"]),
+        RefinementStage(["scale"], skip_if_rwp_below=100.0),
+        RefinementStage(["U"]),
+        RefinementStage(["W"]),
+        RefinementStage(["a"]),
+    ], stall_tol=0.01, patience=2)
+
+    records = rw.run_plan(plan, print_stage=False)
+
+    assert records[2]["skipped"]
+    # The fit is exact after stage 2, so U and W stall and "a" never runs
+    assert records[-1]["stage"] == "W"
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    from powerxrd.checkpoint import Checkpoint
+
+    rw = make_workflow()
+    result = rw.refine(["scale", "bkg_intercept"], print_stage=False)
+
+    path = tmp_path / "run.ckpt.npz"
+    rw.save_checkpoint(path, state={"stage": 1}, result=result)
+    assert [p.name for p in tmp_path.iterdir()] == ["run.ckpt.npz"]
+
+    ckpt = Checkpoint.load(path)
+    assert ckpt.params == rw.model.param_dict()
+    assert np.allclose(ckpt.solver["x"], result.x)
+    assert ckpt.solver["nfev"] == result.nfev
+
+    fresh = make_workflow()
+    assert fresh.load_checkpoint(path) == {"stage": 1}
+    assert fresh.model.param_dict() == rw.model.param_dict()
+    assert fresh.model.esd == rw.model.esd
+    assert len(fresh.history) == 1
+
+
+def test_run_plan_resumes_from_checkpoint(tmp_path, monkeypatch):
+    import powerxrd.workflow as workflow
+
+    plan = RefinementPlan([
+        RefinementStage(["scale"]),
+        RefinementStage(["bkg_intercept"]),
+        RefinementStage(["scale", "bkg_intercept"]),
+    ], patience=5)
+    path = str(tmp_path / "run.ckpt.npz")
+
+    reference = make_workflow()
+    expected = reference.run_plan(plan, print_stage=False)
+
+    # Crash during the third stage
+    calls = []
+    real_refine = workflow.refine
+
+    def crashing_refine(*args, **kwargs):
+        calls.append(args[3])
+        if len(calls) == 3:
+            raise RuntimeError("worker lost")
+        return real_refine(*args, **kwargs)
+
+    monkeypatch.setattr(workflow, "refine", crashing_refine)
+    try:
+        make_workflow().run_plan(plan, print_stage=False, checkpoint=path)
+    except RuntimeError:
+        pass
+
+    # A new worker picks up after the two finished stages
+    calls.clear()
+    rw = make_workflow()
+    records = rw.run_plan(plan, print_stage=False, checkpoint=path)
+
+    assert calls == [["scale", "bkg_intercept"]]
+    assert [r["stage"] for r in records] == [r["stage"] for r in expected]
+    assert np.isclose(rw.rwp(), reference.rwp())
+    assert len(rw.history) == 3
+
+    # A finished plan resumes to the same records without refining
+    calls.clear()
+    assert make_workflow().run_plan(plan, print_stage=False, checkpoint=path) == records
+    assert calls == []
+
+
+def test_checkpoint_of_different_setup_is_rejected(tmp_path):
+    plan = RefinementPlan([RefinementStage(["scale"])])
+    path = str(tmp_path / "run.ckpt.npz")
+
+    rw = make_workflow()
+    rw.setup = {"preprocess": {"mav": {"n": 3}}}
+    rw.run_plan(plan, print_stage=False, checkpoint=path)
+
+    with pytest.raises(ValueError, match="different model or preprocessing"):
+        make_workflow().run_plan(plan, print_stage=False, checkpoint=path)
+
+    other = make_workflow()
+    other.setup = rw.setup
+    other.model.precision = "float32"
+    with pytest.raises(ValueError, match="different model or preprocessing"):
+        other.load_checkpoint(path, plan=plan)
+
+    same = make_workflow()
+    same.setup = rw.setup
+    assert same.load_checkpoint(path, plan=plan)["stage"] == 1
+
+
+def test_plan_masks_spikes_and_uses_robust_loss(tmp_path):
+    x = np.linspace(10, 80, 3000)
+    y = PhaseModel(lattice=CubicLattice(a=4.0)).pattern(x) + np.random.default_rng(0).normal(0, 5, x.size)
+    y[[500, 501, 2000]] += 5e4
+
+    model = PhaseModel(lattice=CubicLattice(a=4.0))
+    model.params.update(scale=1000.0, bkg_intercept=50.0)
+    rw = RefinementWorkflow(model, x, y)
+
+    plan = RefinementPlan([
+        RefinementStage(["scale", "bkg_intercept"], loss="soft_l1"),
+    ], mask_spikes=True)
+    assert RefinementPlan.from_json(plan.to_json()) == plan
+
+    ckpt = str(tmp_path / "run.npz")
+    records = rw.run_plan(plan, print_stage=False, checkpoint=ckpt)
+
+    assert np.flatnonzero(rw.exclude).tolist() == [500, 501, 2000]
+    assert np.isclose(records[-1]["Rwp"], rw.rwp())
+    assert np.isclose(rw.model.params["scale"], 1500.0, rtol=1e-3)
+
+    # Checkpoints of plans saved before the new fields still match
+    old = json.loads(plan.to_json())
+    old.pop("mask_spikes")
+    for stage in old["stages"]:
+        stage.pop("loss"), stage.pop("f_scale")
+    rw.save_checkpoint(ckpt, state={"plan": json.dumps(old)})
+    RefinementWorkflow(make_workflow().model, rw.x_exp, rw.y_exp).load_checkpoint(
+        ckpt, plan=RefinementPlan.from_dict(old))